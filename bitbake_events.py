@@ -0,0 +1,251 @@
+import os
+import json
+import shlex
+import collections
+
+import filesync
+
+# Runs inside the user's oe-init-build-env shell and talks to the bitbake
+# server through tinfoil. Every event is written to stdout as one JSON object.
+HELPER_SCRIPT = r'''
+import json
+import logging
+import os
+import shutil
+import sys
+
+def emit(kind, **data):
+    data["type"] = kind
+    sys.stdout.write(json.dumps(data) + "\n")
+    sys.stdout.flush()
+
+bitbake_bin = shutil.which("bitbake")
+if not bitbake_bin:
+    emit("error", msg="bitbake not found in PATH (was oe-init-build-env sourced?)")
+    sys.exit(1)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(bitbake_bin))), "lib"))
+
+import bb.tinfoil
+import bb.event
+import bb.build
+import bb.command
+import bb.runqueue
+
+EVENT_MASK = [
+    "logging.LogRecord",
+    "bb.event.BuildStarted",
+    "bb.event.BuildCompleted",
+    "bb.event.NoProvider",
+    "bb.event.CacheLoadStarted",
+    "bb.event.CacheLoadProgress",
+    "bb.event.CacheLoadCompleted",
+    "bb.event.ParseStarted",
+    "bb.event.ParseProgress",
+    "bb.event.ParseCompleted",
+    "bb.event.ProcessStarted",
+    "bb.event.ProcessProgress",
+    "bb.event.ProcessFinished",
+    "bb.command.CommandCompleted",
+    "bb.command.CommandFailed",
+    "bb.command.CommandExit",
+    "bb.build.TaskStarted",
+    "bb.build.TaskSucceeded",
+    "bb.build.TaskFailed",
+    "bb.build.TaskFailedSilent",
+    "bb.runqueue.runQueueTaskStarted",
+    "bb.runqueue.runQueueTaskFailed",
+    "bb.runqueue.sceneQueueTaskStarted",
+    "bb.runqueue.sceneQueueTaskCompleted",
+    "bb.runqueue.sceneQueueTaskFailed",
+]
+
+def level_name(levelno):
+    if levelno >= logging.ERROR: return "ERROR"
+    if levelno >= logging.WARNING: return "WARNING"
+    return "NOTE"
+
+def stats_of(event):
+    stats = getattr(event, "stats", None)
+    if stats is None: return {}
+    return {"completed": stats.completed + stats.failed + stats.skipped, "total": stats.total, "active": stats.active}
+
+def main():
+    task = sys.argv[1] or None
+    targets = sys.argv[2:]
+    started = {}
+    exitcode = 1
+
+    with bb.tinfoil.Tinfoil(setup_logging=False) as tinfoil:
+        tinfoil.prepare(config_only=True)
+        tinfoil.set_event_mask(EVENT_MASK)
+        if not task:
+            task = tinfoil.config_data.getVar("BB_DEFAULT_TASK")
+        tinfoil.run_command("buildTargets", targets, task)
+        shutdown = 0
+
+        while True:
+            try:
+                event = tinfoil.wait_event(0.25)
+                if event is None:
+                    continue
+
+                if isinstance(event, logging.LogRecord):
+                    if event.levelno >= logging.INFO:
+                        emit("log", level=level_name(event.levelno), msg=event.getMessage())
+                elif isinstance(event, bb.event.CacheLoadStarted):
+                    emit("cache", current=0, total=event.total)
+                elif isinstance(event, bb.event.CacheLoadProgress):
+                    emit("cache", current=event.current, total=event.total)
+                elif isinstance(event, bb.event.CacheLoadCompleted):
+                    emit("cache", current=event.total, total=event.total)
+                elif isinstance(event, bb.event.ParseStarted):
+                    emit("parse", current=0, total=event.total)
+                elif isinstance(event, bb.event.ParseProgress):
+                    emit("parse", current=event.current, total=event.total)
+                elif isinstance(event, bb.event.ParseCompleted):
+                    emit("parse", current=event.total, total=event.total, cached=event.cached, parsed=event.parsed)
+                elif isinstance(event, bb.event.ProcessStarted):
+                    emit("process", name=event.processname, current=0, total=event.total)
+                elif isinstance(event, bb.event.ProcessProgress):
+                    emit("process", name=event.processname, current=event.progress)
+                elif isinstance(event, bb.event.ProcessFinished):
+                    emit("process", name=event.processname, finished=True)
+                elif isinstance(event, bb.runqueue.sceneQueueTaskStarted):
+                    emit("setscene", task=event.taskstring, **stats_of(event))
+                elif isinstance(event, bb.runqueue.sceneQueueTaskCompleted):
+                    emit("setscene_done", task=event.taskstring, taskhash=getattr(event, "taskhash", None))
+                elif isinstance(event, bb.runqueue.runQueueTaskStarted):
+                    emit("runqueue", task=event.taskstring, noexec=bool(event.noexec), **stats_of(event))
+                elif isinstance(event, bb.build.TaskStarted):
+                    started[(event._package, event._task)] = event.time
+                    emit("task_started", recipe=event._package, task=event._task, pid=event.pid, time=event.time)
+                elif isinstance(event, (bb.build.TaskSucceeded, bb.build.TaskFailed, bb.build.TaskFailedSilent)):
+                    begin = started.pop((event._package, event._task), event.time)
+                    failed = not isinstance(event, bb.build.TaskSucceeded)
+                    emit("task_finished", recipe=event._package, task=event._task, pid=event.pid,
+                         time=event.time, duration=round(event.time - begin, 3), failed=failed,
+                         logfile=getattr(event, "logfile", None))
+                elif isinstance(event, (bb.runqueue.runQueueTaskFailed, bb.runqueue.sceneQueueTaskFailed)):
+                    emit("error", msg=f"Task {event.taskstring} failed with exit code {event.exitcode}")
+                elif isinstance(event, bb.event.NoProvider):
+                    emit("error", msg=str(event))
+                elif isinstance(event, bb.event.BuildCompleted):
+                    emit("build_completed", total=event.total, failures=event._failures)
+                elif isinstance(event, bb.command.CommandCompleted):
+                    exitcode = 0
+                    break
+                elif isinstance(event, bb.command.CommandFailed):
+                    emit("error", msg=event.error)
+                    exitcode = event.exitcode or 1
+                    break
+                elif isinstance(event, bb.command.CommandExit):
+                    exitcode = event.exitcode
+                    break
+            except KeyboardInterrupt:
+                # First interrupt lets running tasks finish, second one forces it.
+                shutdown += 1
+                emit("log", level="WARNING", msg="Interrupt received, shutting down bitbake" + (" (forced)" if shutdown > 1 else ""))
+                tinfoil.run_command("stateForceShutdown" if shutdown > 1 else "stateShutdown")
+
+    emit("exit", code=exitcode)
+    return exitcode
+
+sys.exit(main())
+'''
+
+BuildEvent = collections.namedtuple("BuildEvent", ["kind", "data"])
+
+# Weight of each phase in the overall progress bar (start, span).
+PHASES = {
+    "cache": (0, 10, "Loading cache"),
+    "parse": (0, 10, "Parsing recipes"),
+    "process": (10, 10, "Checking sstate"),
+    "setscene": (20, 15, "Setscene tasks"),
+    "runqueue": (35, 65, "Running tasks"),
+}
+
+HELPER_NAME = "bb-events-helper.py"
+
+def install_helper(directory):
+    # One copy in the user's cache directory, rewritten only when the script
+    # changes, rather than a new temporary file per run.
+    path = os.path.join(directory, HELPER_NAME)
+    filesync.sync_file(path, HELPER_SCRIPT)
+    return path
+
+def build_helper_cmd(helper, targets, task=None):
+    if isinstance(targets, str):
+        targets = targets.split()
+    return " ".join(["python3", shlex.quote(helper), task or '""'] + list(targets))
+
+def build_env_cmd(poky, build_dir, user, cmd):
+    # Shell command running `cmd` in the oe-init-build-env environment, as
+    # `user` when given (the app itself runs as root).
+    inner = f"cd {shlex.quote(poky)} && source oe-init-build-env {shlex.quote(build_dir)} && {cmd}"
+    if not user:
+        return f"bash -lc {shlex.quote(inner)}"
+    return f"sudo -H -u {shlex.quote(user)} bash -lc {shlex.quote(inner)}"
+
+def parse_event(line):
+    if not line.startswith("{"):
+        return None
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    kind = data.pop("type", None)
+    if not kind: return None
+    return BuildEvent(kind, data)
+
+def format_event(event):
+    d = event.data
+    if event.kind == "log":
+        return f"{d.get('level', 'NOTE')}: {d.get('msg', '')}"
+    if event.kind == "error":
+        return f"ERROR: {d.get('msg', '')}"
+    if event.kind == "task_started":
+        return f"NOTE: recipe {d['recipe']}: task {d['task']}: Started (pid {d.get('pid')})"
+    if event.kind == "task_finished":
+        status = "Failed" if d.get("failed") else "Succeeded"
+        return f"NOTE: recipe {d['recipe']}: task {d['task']}: {status} ({d.get('duration', 0):.1f}s)"
+    if event.kind == "process" and d.get("total") is not None and not d.get("current"):
+        return f"NOTE: {d.get('name')}"
+    if event.kind == "build_completed":
+        return f"NOTE: Build completed: {d.get('total')} tasks, {d.get('failures')} failures"
+    return None
+
+class ProgressTracker:
+    def __init__(self):
+        self.percent = 0.0
+        self.text = "0%"
+        self.process_total = {}
+
+    def update(self, event):
+        phase = PHASES.get(event.kind)
+        if not phase: return False
+        d = event.data
+        start, span, label = phase
+
+        if event.kind == "process":
+            name = d.get("name", "")
+            if "total" in d: self.process_total[name] = d["total"]
+            total = self.process_total.get(name) or 0
+            current = total if d.get("finished") else d.get("current", 0)
+            label = name or label
+        else:
+            total = d.get("total") or 0
+            current = d.get("completed", d.get("current", 0))
+
+        fraction = min(1.0, current / total) if total else 0.0
+        percent = start + span * fraction
+        if event.kind in ("setscene", "runqueue"):
+            text = f"{label} {current}/{total} ({int(percent)}%)"
+        else:
+            text = f"{label} {int(fraction * 100)}% ({int(percent)}%)"
+
+        # Phases can overlap (cache vs. parse); never let the bar run backwards.
+        percent = max(self.percent, percent)
+        changed = int(percent) != int(self.percent) or text != self.text
+        self.percent = percent
+        self.text = text
+        return changed
@@ -0,0 +1,197 @@
+import os
+import glob
+import fcntl
+import hashlib
+import subprocess
+import threading
+
+import bitbake_events
+
+# With BB_SERVER_TIMEOUT set, the bitbake server outlives the client and the
+# next bitbake run in the same build directory attaches to it, skipping
+# server startup, configuration parsing and the recipe cache load.
+IDLE_TIMEOUT = 1800
+STOP_TIMEOUT = 60
+
+CONF_FILES = ("local.conf", "bblayers.conf", "auto.conf", "site.conf")
+
+def lock_path(build_path):
+    return os.path.join(build_path, "bitbake.lock")
+
+def is_running(build_path):
+    # The server holds a lock on bitbake.lock for as long as it runs.
+    try:
+        fd = os.open(lock_path(build_path), os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return False
+    finally:
+        os.close(fd)
+
+def server_pid(build_path):
+    try:
+        with open(lock_path(build_path), "r") as f:
+            first = f.readline().split()
+        return int(first[0]) if first else None
+    except (OSError, ValueError):
+        return None
+
+def config_digest(build_path):
+    conf = os.path.join(build_path, "conf")
+    paths = [os.path.join(conf, name) for name in CONF_FILES]
+    paths += sorted(glob.glob(os.path.join(conf, "multiconfig", "*.conf")))
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode() + b"\0")
+        try:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"-")
+    return h.hexdigest()
+
+class ResidentServer:
+    def __init__(self, user, log, timeout=IDLE_TIMEOUT):
+        self.user = user
+        self.log = log
+        self.timeout = timeout
+        # build path -> (poky, build dir, digest of the config it was started with)
+        self.servers = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, poky, build_dir, cmd):
+        # Returns `cmd` set up to start or reuse the resident server,
+        # restarting it first when the configuration it loaded is stale.
+        build_path = os.path.join(poky, build_dir)
+        with self.lock:
+            digest = config_digest(build_path)
+            known = self.servers.get(build_path, (None, None, None))[2]
+            if is_running(build_path) and known != digest:
+                reason = "configuration changed" if known else "started outside this session"
+                self.log(f"Restarting bitbake server ({reason})...")
+                self._stop(poky, build_dir)
+            elif is_running(build_path):
+                self.log(f"Reusing bitbake server (pid {server_pid(build_path)}).")
+            self.servers[build_path] = (poky, build_dir, digest)
+        return f"export BB_SERVER_TIMEOUT={int(self.timeout)} && {cmd}"
+
+    def _stop(self, poky, build_dir):
+        build_path = os.path.join(poky, build_dir)
+        if not is_running(build_path): return True
+        cmd = bitbake_events.build_env_cmd(poky, build_dir, self.user, "bitbake -m")
+        try:
+            subprocess.run(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.log("Warning: bitbake server did not shut down in time.")
+        return not is_running(build_path)
+
+    def stop(self, poky, build_dir):
+        with self.lock:
+            self.servers.pop(os.path.join(poky, build_dir), None)
+            return self._stop(poky, build_dir)
+
+    def stop_all(self):
+        # Used when the window closes: `bitbake -m` can take a while, so it is
+        # handed to a detached process instead of waited for. A server whose
+        # stop fails still exits after BB_SERVER_TIMEOUT.
+        with self.lock:
+            for build_path, (poky, build_dir, _) in self.servers.items():
+                if not is_running(build_path): continue
+                self.log(f"Stopping bitbake server in {build_path}...")
+                cmd = bitbake_events.build_env_cmd(poky, build_dir, self.user, "bitbake -m")
+                try:
+                    subprocess.Popen(f"timeout {STOP_TIMEOUT} {cmd}", shell=True, stdin=subprocess.DEVNULL,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+                except OSError as e:
+                    self.log(f"Could not stop bitbake server in {build_path}: {e}")
+            self.servers.clear()
+
+def process_tree(pid):
+    # pid and all its descendants, from the ppid field of /proc/*/stat.
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit(): continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = []
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(children.get(p, []))
+    return tree
+
+def set_priority(pids, background):
+    # Background: nice 19 and idle I/O class; otherwise back to nice 0 and
+    # the default I/O class. Lowering nice again needs root, which we are.
+    niceness = 19 if background else 0
+    io_class = "3" if background else "0"
+    tids = []
+    for pid in pids:
+        try:
+            tids.extend(int(t) for t in os.listdir(f"/proc/{pid}/task"))
+        except OSError:
+            continue
+    for tid in tids:
+        try: os.setpriority(os.PRIO_PROCESS, tid, niceness)
+        except OSError: pass
+    if tids:
+        subprocess.run(["ionice", "-c", io_class, "-p"] + [str(t) for t in tids],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def client_pids(pids):
+    # The bitbake client(s) among the processes of a `sudo ... bash -lc`
+    # wrapper: the Python ones (bitbake itself or the event helper).
+    clients = []
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/cmdline", "rb") as f:
+                argv = f.read().split(b"\0")
+        except OSError:
+            continue
+        if argv and os.path.basename(argv[0]).startswith(b"python"):
+            clients.append(p)
+    return clients
+
+def signal_pids(pids, sig):
+    for p in pids:
+        try: os.kill(p, sig)
+        except OSError: pass
+
+def clear_stale_lock(build_path):
+    # After a killed server the lock is free but bitbake.lock/bitbake.sock
+    # are left behind; only remove them when no server holds the lock.
+    if is_running(build_path): return []
+    removed = []
+    for name in ("bitbake.lock", "bitbake.sock"):
+        path = os.path.join(build_path, name)
+        if os.path.lexists(path):
+            try:
+                os.remove(path)
+                removed.append(name)
+            except OSError:
+                pass
+    return removed
+
+def alive(pids):
+    running = []
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        if stat[stat.rindex(")") + 2:].split()[0] != "Z":
+            running.append(p)
+    return running
@@ -0,0 +1,231 @@
+import os
+import re
+import pwd
+import time
+import subprocess
+
+import bitbake_events
+import bitbake_server
+import buildstats
+import confgen
+import git_layers
+import hashserv
+import host_deps
+import ownership
+import scratch
+import task_failures
+
+# Build orchestration shared by the GUI (manager_build, manager_prefetch) and
+# the headless CLI, without tkinter: host dependencies, layers, ownership,
+# the hash equivalence and bitbake servers, fast scratch, running bitbake and
+# reading its output. Front ends pass the profile in and get callbacks out.
+
+RUNNING_TASK_RE = re.compile(r'Running task (\d+) of (\d+)')
+
+class BuildOutput:
+    # Reads bitbake's output line by line: knotty text, or the JSON lines of
+    # the event helper when `events` is set.
+    def __init__(self, events, on_line, on_progress=None):
+        self.on_line = on_line
+        self.on_progress = on_progress or (lambda percent, text: None)
+        self.tracker = bitbake_events.ProgressTracker() if events else None
+        self.summary = hashserv.SstateSummary()
+        self.failures = task_failures.FailureCollector()
+        self.percent = -1
+
+    def feed(self, line):
+        if self.tracker:
+            event = bitbake_events.parse_event(line)
+            if event is None:
+                self.on_line(line)
+                return
+            self.failures.feed_event(event)
+            self.summary.feed_event(event)
+            text = bitbake_events.format_event(event)
+            if text:
+                self.on_line(text)
+                self.summary.feed(text)
+            if self.tracker.update(event):
+                self.on_progress(self.tracker.percent, self.tracker.text)
+            return
+
+        self.on_line(line)
+        self.summary.feed(line)
+        self.failures.feed(line)
+        m = RUNNING_TASK_RE.search(line)
+        if m and int(m.group(2)) > 0:
+            percent = int(m.group(1)) * 100 / int(m.group(2))
+            # Only report when the visible value changes.
+            if int(percent) != self.percent:
+                self.percent = int(percent)
+                self.on_progress(percent, f"{int(percent)}%")
+
+class BuildSession:
+    def __init__(self, poky, build_dir, user, cache_dir, log, hash_server=None, bb_server=None):
+        self.poky = poky
+        self.build_dir = build_dir
+        self.build_path = os.path.join(poky, build_dir)
+        self.user = user
+        self.cache_dir = cache_dir
+        self.log = log
+        self.hashserv = hash_server or hashserv.HashServer(cache_dir, user, log)
+        # Resident bitbake server; None runs every command with a fresh one.
+        self.bb_server = bb_server
+        self.owner = None
+        if user and user != "root" and os.geteuid() == 0:
+            try:
+                pw = pwd.getpwnam(user)
+                self.owner = (pw.pw_uid, pw.pw_gid)
+            except KeyError:
+                pass
+
+    # --- Ownership (the app runs as root on behalf of `user`) ---
+    def mirror_dir(self):
+        return os.path.join(self.cache_dir, "git")
+
+    def marker_dir(self):
+        return os.path.join(self.cache_dir, "ownership")
+
+    def fix_cache_ownership(self, *paths):
+        if self.owner:
+            ownership.chown_written(paths or (self.cache_dir,), *self.owner, self.cache_dir)
+
+    def fix_mirror_ownership(self):
+        # Mirrors are large; only directories changed since the last pass are read.
+        mirror_dir = self.mirror_dir()
+        if not self.owner or not os.path.isdir(mirror_dir): return
+        ownership.repair_ownership(mirror_dir, *self.owner, self.marker_dir())
+        self.fix_cache_ownership(mirror_dir, ownership.marker_path(self.marker_dir(), mirror_dir))
+
+    def repair_ownership(self):
+        if not self.owner or not os.path.isdir(self.poky): return None
+        stats = ownership.repair_ownership(self.poky, *self.owner, self.marker_dir())
+        self.fix_cache_ownership(ownership.marker_path(self.marker_dir(), self.poky))
+        mode = "incremental" if stats["incremental"] else "full"
+        self.log(f"Ownership check ({mode}): scanned {stats['scanned']} entries, "
+                 f"checked {stats['checked']}, fixed {stats['fixed']} in {stats['seconds']:.2f}s")
+        if stats["errors"]:
+            self.log(f"Warning: {stats['errors']} entries could not be checked or fixed.")
+        return stats
+
+    # --- Preparation ---
+    def install_dependencies(self, strict=False):
+        self.log("Checking host dependencies...")
+        cache_file = os.path.join(self.cache_dir, "host-deps.json")
+        try:
+            host_deps.ensure_packages(cache_file, self.log)
+            self.fix_cache_ownership(cache_file)
+        except Exception as e:
+            if strict: raise
+            self.log(f"Critical Error checking host dependencies: {e}")
+
+    def apply(self, profile, psi_baseline=None):
+        # Writes the full configuration; returns (written, removed) like confgen.apply().
+        conf = confgen.conf_dir(self.poky, self.build_dir)
+        if not os.path.isdir(conf):
+            raise RuntimeError(f"{conf} not found. Run oe-init-build-env once first.")
+        for line in confgen.cross_device_dirs(profile["general"], self.build_path):
+            self.log(f"Warning: on a different filesystem than TMPDIR, files will be copied instead of hardlinked: {line}")
+        return confgen.apply(self.poky, self.build_dir, profile, self.cache_dir, self.log, psi_baseline)
+
+    def fetch_layers(self, profile):
+        # Clones the layers the profile needs; returns the names that failed.
+        if not os.path.isdir(self.poky): return []
+        branch = git_layers.detect_branch(self.poky)
+        self.log(f"Detected Poky branch: {branch}")
+        failed = []
+        missing = git_layers.missing_layers(self.poky, confgen.required_layers(profile), branch)
+        if missing:
+            self.log(f"Missing layers: {', '.join(m[0] for m in missing)}. Fetching in parallel...")
+            failed = git_layers.fetch_layers(missing, self.log, mirror_dir=self.mirror_dir())
+            self.fix_mirror_ownership()
+        self.log("Layer check complete.")
+        return failed
+
+    def ensure_hashserv(self, general):
+        address = confgen.hashserv_address(general, self.cache_dir)
+        if address and not self.hashserv.ensure_running(self.poky, address):
+            self.log("Warning: hash equivalence server is not available; bitbake may fail to connect to BB_HASHSERVE.")
+
+    def prepare(self, profile, skip_deps=False, strict=False):
+        # Everything a build needs before bitbake runs. With `strict`, a
+        # failed dependency check or layer fetch raises instead of warning.
+        if not skip_deps:
+            self.install_dependencies(strict)
+        confgen.write_bblayers(confgen.conf_dir(self.poky, self.build_dir), profile, self.log)
+        failed = self.fetch_layers(profile)
+        if failed:
+            if strict: raise RuntimeError(f"Failed to fetch layers: {', '.join(failed)}")
+            self.log(f"Warning: Failed to fetch layers: {', '.join(failed)}")
+        try:
+            self.repair_ownership()
+        except Exception as e:
+            if strict: raise
+            self.log(f"Ownership repair failed: {e}")
+        self.ensure_hashserv(profile["general"])
+
+    def make_scratch(self):
+        server = self.bb_server or bitbake_server.ResidentServer(self.user, self.log)
+        return scratch.Scratch(self.build_path, self.cache_dir, self.user, self.log,
+                               before_remount=lambda: server.stop(self.poky, self.build_dir))
+
+    # --- Running bitbake ---
+    def bitbake_command(self, general, targets, task=None):
+        # (command, uses the event helper)
+        if general.get("event_mode"):
+            helper = bitbake_events.install_helper(self.cache_dir)
+            self.fix_cache_ownership(helper)
+            return bitbake_events.build_helper_cmd(helper, targets, task), True
+        task_arg = f"-c {task} " if task else ""
+        return f"bitbake {task_arg}{targets}", False
+
+    def shell_command(self, general, cmd):
+        if self.bb_server and general.get("resident_server"):
+            cmd = self.bb_server.wrap(self.poky, self.build_dir, cmd)
+        return bitbake_events.build_env_cmd(self.poky, self.build_dir, self.user, cmd)
+
+    def run(self, general, cmd, output, on_start=None, new_session=False):
+        # Runs `cmd` in the build environment, feeding every line to
+        # `output`. `on_start(proc)` is called as soon as it is running.
+        proc = subprocess.Popen(self.shell_command(general, cmd), shell=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, universal_newlines=True, start_new_session=new_session)
+        if on_start: on_start(proc)
+        while True:
+            line = proc.stdout.readline()
+            if not line and proc.poll() is not None: break
+            if line:
+                output.feed(line.strip())
+        proc.wait()
+        if confgen.hashserv_address(general, self.cache_dir):
+            output.summary.resolve(hashserv.db_path(self.cache_dir))
+        return proc
+
+    def build(self, general, target, execute):
+        # Fast scratch, bitbake and buildstats around `execute(cmd, events)`,
+        # the front end's way of running a command. Returns (ok, buildstats).
+        targets = confgen.expand_targets(general, target)
+        fast_scratch = None
+        if general.get("scratch_tmpfs"):
+            fast_scratch = self.make_scratch()
+            fast_scratch.prepare(f"{general['machine']}/{target}")
+        self.log(f"Building {targets}...")
+
+        started = time.time()
+        try:
+            ok = execute(*self.bitbake_command(general, targets))
+            result = self.buildstats(general, started)
+        finally:
+            if fast_scratch:
+                fast_scratch.finish(confgen.build_machines(general))
+        return ok, result
+
+    def buildstats(self, general, started):
+        bb_threads, _ = confgen.tuned_parallelism(general)
+        try:
+            return buildstats.summarize(confgen.tmp_dir(general, self.build_path), bb_threads, newer_than=started)
+        except Exception as e:
+            self.log(f"Could not read buildstats: {e}")
+            return None
+
+    def failure_details(self, general, failures):
+        return task_failures.extract(failures, confgen.tmp_dir(general, self.build_path))
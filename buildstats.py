@@ -0,0 +1,174 @@
+import os
+import bisect
+import collections
+
+TOP_N = 10
+
+Task = collections.namedtuple("Task", ["recipe", "task", "start", "end", "cpu", "failed"])
+
+def latest_dir(tmpdir, newer_than=None):
+    root = os.path.join(tmpdir, "buildstats")
+    try:
+        entries = [e for e in os.scandir(root) if e.is_dir()]
+    except OSError:
+        return None
+    if not entries: return None
+    # Directory names are BUILDNAME timestamps, so they sort chronologically.
+    latest = max(entries, key=lambda e: e.name)
+    if newer_than is not None and latest.stat().st_mtime < newer_than:
+        return None
+    return latest.path
+
+def _parse_task_file(path, recipe, task):
+    start = end = None
+    rusage = 0.0
+    ticks = 0
+    failed = False
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            key, sep, value = line.partition(":")
+            if not sep: continue
+            value = value.strip()
+            if key == "Started":
+                start = float(value)
+            elif key == "Ended":
+                end = float(value)
+            elif key in ("rusage ru_utime", "rusage ru_stime", "Child rusage ru_utime", "Child rusage ru_stime"):
+                rusage += float(value)
+            elif key in ("utime", "stime", "cutime", "cstime"):
+                ticks += int(value)
+            elif key == "Status":
+                failed = value != "PASSED"
+    if start is None or end is None:
+        return None
+    cpu = rusage if rusage else ticks / os.sysconf("SC_CLK_TCK")
+    return Task(recipe, task, start, end, cpu, failed)
+
+def parse(stats_dir):
+    tasks = []
+    with os.scandir(stats_dir) as recipes:
+        for recipe in recipes:
+            if not recipe.is_dir(): continue
+            with os.scandir(recipe.path) as files:
+                for entry in files:
+                    if not entry.name.startswith("do_"): continue
+                    try:
+                        t = _parse_task_file(entry.path, recipe.name, entry.name)
+                    except (OSError, ValueError):
+                        continue
+                    if t: tasks.append(t)
+    return tasks
+
+def critical_path(tasks):
+    # Buildstats has no dependency graph. Walk back from the last task to
+    # finish, each time taking the task that finished last before the
+    # current one started (preferring the same recipe), which is the task
+    # most likely to have been blocking it.
+    if not tasks: return []
+    by_end = sorted(tasks, key=lambda t: t.end)
+    ends = [t.end for t in by_end]
+
+    path = [by_end[-1]]
+    current = by_end[-1]
+    while True:
+        # Predecessors end no later than the current task starts and start
+        # strictly before it, so the walk always moves back in time (tasks
+        # shorter than bitbake's 10 ms resolution have start == end).
+        j = bisect.bisect_right(ends, current.start) - 1
+        latest = best = None
+        while j >= 0:
+            cand = by_end[j]
+            j -= 1
+            if cand is current or cand.start >= current.start: continue
+            if latest is None:
+                latest = cand
+            elif latest.end - cand.end > 1.0:
+                break
+            # Prefer a same-recipe predecessor that ended at about the
+            # same time as the latest one.
+            if cand.recipe == current.recipe:
+                best = cand
+                break
+        if latest is None: break
+        current = best or latest
+        path.append(current)
+    path.reverse()
+    return path
+
+def parallelism(tasks, wall):
+    events = []
+    for t in tasks:
+        events.append((t.start, 1))
+        events.append((t.end, -1))
+    events.sort()
+    busy = peak = 0
+    last = events[0][0] if events else 0
+    histogram = collections.Counter()
+    for when, delta in events:
+        histogram[busy] += when - last
+        last = when
+        busy += delta
+        peak = max(peak, busy)
+    average = sum(t.end - t.start for t in tasks) / wall if wall > 0 else 0
+    return average, peak, histogram
+
+def analyze(tasks, threads, top_n=TOP_N):
+    if not tasks: return None
+    begin = min(t.start for t in tasks)
+    finish = max(t.end for t in tasks)
+    wall = finish - begin
+
+    recipes = {}
+    for t in tasks:
+        r = recipes.setdefault(t.recipe, [0.0, 0.0])
+        r[0] += t.end - t.start
+        r[1] += t.cpu
+
+    average, peak, histogram = parallelism(tasks, wall)
+    underused = sum(v for k, v in histogram.items() if k < max(1, threads // 2))
+    path = critical_path(tasks)
+
+    return {
+        "tasks": len(tasks),
+        "failed": sum(1 for t in tasks if t.failed),
+        "wall": wall,
+        "cpu": sum(t.cpu for t in tasks),
+        "threads": threads,
+        "avg_parallel": average,
+        "peak_parallel": peak,
+        "underused": underused / wall if wall > 0 else 0,
+        "critical_path": [(t.recipe, t.task, t.end - t.start) for t in path],
+        "critical_time": sum(t.end - t.start for t in path),
+        "slowest": [(t.recipe, t.task, t.end - t.start) for t in sorted(tasks, key=lambda t: t.start - t.end)[:top_n]],
+        "recipes": sorted(((name, w, c) for name, (w, c) in recipes.items()), key=lambda r: -r[1])[:top_n],
+    }
+
+def _fmt(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+def format_summary(result):
+    lines = [
+        f"--- Build statistics: {result['tasks']} tasks ({result['failed']} failed), wall {_fmt(result['wall'])}, CPU {_fmt(result['cpu'])} ---",
+        f"Parallelism: average {result['avg_parallel']:.1f}, peak {result['peak_parallel']} of BB_NUMBER_THREADS={result['threads']}; "
+        f"{result['underused'] * 100:.0f}% of the time fewer than {max(1, result['threads'] // 2)} tasks were running",
+        f"Critical path (approx.): {len(result['critical_path'])} tasks, {_fmt(result['critical_time'])}; longest on it:",
+    ]
+    for recipe, task, secs in sorted(result["critical_path"], key=lambda c: -c[2])[:TOP_N]:
+        lines.append(f"  {_fmt(secs):>8}  {recipe}:{task}")
+    lines.append("Slowest tasks:")
+    for recipe, task, secs in result["slowest"]:
+        lines.append(f"  {_fmt(secs):>8}  {recipe}:{task}")
+    lines.append("Slowest recipes (wall / CPU):")
+    for name, wall, cpu in result["recipes"]:
+        lines.append(f"  {_fmt(wall):>8} / {_fmt(cpu):>8}  {name}")
+    return "\n".join(lines)
+
+def summarize(tmpdir, threads, newer_than=None):
+    stats_dir = latest_dir(tmpdir, newer_than)
+    if not stats_dir: return None
+    result = analyze(parse(stats_dir), threads)
+    if result: result["dir"] = stats_dir
+    return result
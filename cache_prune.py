@@ -0,0 +1,197 @@
+import os
+import re
+import time
+import sqlite3
+
+# Directories are rescanned only when their mtime changes; every so often do
+# a full pass anyway to pick up atime updates of files we never re-stat.
+FULL_RESCAN_AGE = 7 * 86400
+# A directory modified this close to the scan could change again within the
+# same mtime tick, so it is not trusted on the next run.
+RACY_WINDOW = 2
+
+HASH_RE = re.compile(r'[0-9a-f]{64}')
+COMPANION_SUFFIXES = (".done", ".lock")
+
+def parse_locked_sigs(path):
+    # locked-sigs.inc as written by `bitbake -S none <target>`.
+    hashes = set()
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                hashes.update(HASH_RE.findall(line))
+    except OSError:
+        pass
+    return hashes
+
+def is_protected(path, protected):
+    if not protected: return False
+    return any(h in protected for h in HASH_RE.findall(os.path.basename(path)))
+
+def format_size(size):
+    if size < 1024 ** 2:
+        return f"{size / 1024:.1f} KB"
+    if size < 1024 ** 3:
+        return f"{size / 1024 ** 2:.1f} MB"
+    return f"{size / 1024 ** 3:.2f} GB"
+
+class CacheIndex:
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, root TEXT, parent TEXT, mtime_ns INTEGER);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, root TEXT, dir TEXT, size INTEGER, used REAL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+            CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+            CREATE INDEX IF NOT EXISTS files_used ON files(root, used);
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def _forget_tree(self, path):
+        prefix = path.rstrip("/") + "/"
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))
+        self.db.execute("DELETE FROM files WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, len(prefix), prefix))
+
+    def update(self, root, recursive=True):
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            self._forget_tree(root)
+            self.db.commit()
+            return {"scanned": 0, "skipped": 0}
+
+        key = f"full:{root}"
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        full = row is None or now - float(row[0]) > FULL_RESCAN_AGE
+
+        scanned = skipped = 0
+        stack = [root]
+        while stack:
+            d = stack.pop()
+            try: st = os.stat(d)
+            except OSError:
+                self._forget_tree(d)
+                continue
+
+            row = self.db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (d,)).fetchone()
+            if row and row[0] == st.st_mtime_ns and not full:
+                skipped += 1
+                if recursive:
+                    stack.extend(r[0] for r in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (d,)))
+                continue
+
+            scanned += 1
+            files = []
+            subdirs = []
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                fst = entry.stat(follow_symlinks=False)
+                                files.append((entry.path, root, d, fst.st_size, max(fst.st_atime, fst.st_mtime)))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+            self.db.execute("DELETE FROM files WHERE dir = ?", (d,))
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", files)
+            known = {r[0] for r in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (d,))}
+            for gone in known - set(subdirs):
+                self._forget_tree(gone)
+
+            mtime = 0 if now - st.st_mtime < RACY_WINDOW else st.st_mtime_ns
+            parent = os.path.dirname(d) if d != root else None
+            self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", (d, root, parent, mtime))
+            if recursive:
+                stack.extend(subdirs)
+
+        if full:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(now)))
+        self.db.commit()
+        return {"scanned": scanned, "skipped": skipped}
+
+    def plan(self, roots, budget, protected=None):
+        roots = [os.path.abspath(r) for r in roots]
+        marks = ",".join("?" * len(roots))
+        total = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM files WHERE root IN ({marks})", roots).fetchone()[0]
+
+        need = total - budget
+        evict = []
+        evict_size = protected_count = protected_size = 0
+        if need > 0:
+            for path, size, used in self.db.execute(
+                    f"SELECT path, size, used FROM files WHERE root IN ({marks}) ORDER BY used ASC", roots):
+                if need <= 0: break
+                if path.endswith(COMPANION_SUFFIXES): continue
+                if is_protected(path, protected):
+                    protected_count += 1
+                    protected_size += size
+                    continue
+                evict.append((path, size, used))
+                evict_size += size
+                need -= size
+
+        return {
+            "roots": roots,
+            "total": total,
+            "budget": budget,
+            "evict": evict,
+            "evict_size": evict_size,
+            "protected": protected_count,
+            "protected_size": protected_size,
+            "shortfall": max(0, need),
+        }
+
+    def prune(self, plan, log=None):
+        freed = removed = recent = errors = 0
+        for path, size, used in plan["evict"]:
+            try: st = os.lstat(path)
+            except OSError:
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                continue
+            last = max(st.st_atime, st.st_mtime)
+            if last > used + 1:
+                # Used since the index was built: no longer a LRU candidate.
+                self.db.execute("UPDATE files SET used = ? WHERE path = ?", (last, path))
+                recent += 1
+                continue
+            try:
+                os.remove(path)
+                for suffix in COMPANION_SUFFIXES:
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                        self.db.execute("DELETE FROM files WHERE path = ?", (path + suffix,))
+            except OSError as e:
+                errors += 1
+                if log: log(f"Could not remove {path}: {e}")
+                continue
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+            freed += st.st_size
+            removed += 1
+        self.db.commit()
+        return {"removed": removed, "freed": freed, "recent": recent, "errors": errors}
+
+def format_report(plan, limit=10):
+    lines = [
+        f"Cache size: {format_size(plan['total'])} (budget {format_size(plan['budget'])})",
+    ]
+    if not plan["evict"]:
+        lines.append("Nothing to prune.")
+        return "\n".join(lines)
+    lines.append(f"Would remove {len(plan['evict'])} files, {format_size(plan['evict_size'])}")
+    if plan["protected"]:
+        lines.append(f"Protected (current image signatures): {plan['protected']} files, {format_size(plan['protected_size'])}")
+    if plan["shortfall"]:
+        lines.append(f"Budget cannot be met: {format_size(plan['shortfall'])} over after pruning")
+    lines.append("Oldest entries:")
+    for path, size, used in plan["evict"][:limit]:
+        lines.append(f"  {time.strftime('%Y-%m-%d', time.localtime(used))}  {format_size(size):>10}  {os.path.basename(path)}")
+    return "\n".join(lines)
@@ -0,0 +1,500 @@
+import os
+import re
+import json
+import multiprocessing
+
+import filesync
+import hashserv
+import pressure
+import scratch
+import meta_yoctool
+
+# Everything needed to turn a yoctool.conf profile into local.conf,
+# bblayers.conf and multiconfig files. No tkinter here: the GUI tabs feed
+# their get_state() dicts in, and the headless CLI feeds the JSON file.
+
+RPI_MACHINES = ["raspberrypi0-wifi", "raspberrypi3", "raspberrypi4", "raspberrypi5"]
+MACHINES = ["qemux86-64"] + RPI_MACHINES
+IMAGES = ["core-image-minimal", "core-image-base", "core-image-full-cmdline", "core-image-sato"]
+
+RPI_REQUIRED_LAYERS = [
+    ("meta-openembedded", "https://git.openembedded.org/meta-openembedded"),
+    ("meta-raspberrypi", "https://git.yoctoproject.org/meta-raspberrypi"),
+]
+OTA_REQUIRED_LAYERS = [("meta-rauc", "https://github.com/rauc/meta-rauc -b scarthgap")]
+
+AUTO_START = "# --- YOCTOOL AUTO CONFIG START ---\n"
+AUTO_END = "# --- YOCTOOL AUTO CONFIG END ---\n"
+MULTICONFIG_HEADER = "# Generated by Yoctool\n"
+
+# User lines for these variables are dropped to avoid duplicates, but only
+# when the auto block actually sets the variable; see strip_managed().
+MANAGED_PATTERNS = [re.compile(p) for p in (
+    r'^\s*MACHINE\s*\?{0,2}=',
+    r'^\s*DISTRO\s*\?{0,2}=',
+    r'^\s*PACKAGE_CLASSES\s*\?{0,2}=',
+    r'^\s*BB_NUMBER_THREADS\s*=',
+    r'^\s*PARALLEL_MAKE\s*=',
+    r'^\s*BB_PRESSURE_MAX_(CPU|IO|MEMORY)\s*\?{0,2}=',
+    r'^\s*BBMULTICONFIG\s*\?{0,2}=',
+    r'^\s*BB_HASHSERVE\s*\?{0,2}=',
+    r'^\s*DL_DIR\s*\?{0,2}=',
+    r'^\s*SSTATE_DIR\s*\?{0,2}=',
+    r'^\s*TMPDIR\s*\?{0,2}=',
+    r'^\s*INHERIT\s*\+=\s*"rm_work"',
+    r'^\s*RM_WORK_EXCLUDE\s*\+?=',
+    r'^\s*BB_SIGNATURE_HANDLER\s*\?{0,2}=',
+    r'^\s*SSTATE_MIRRORS\s*\?{0,2}=',
+    r'^\s*EXTRA_IMAGE_FEATURES\s*\?{0,2}=',
+    r'^\s*DISTRO_FEATURES:append\s*=',
+    r'^\s*VIRTUAL-RUNTIME_init_manager\s*=',
+    r'^\s*INHERIT\s*\+=\s*"mender-full"',
+    r'^\s*INHERIT\s*\+=\s*"buildstats"',
+    r'^\s*MENDER_',
+)]
+
+def default_profile():
+    cores = multiprocessing.cpu_count()
+    return {
+        "general": {
+            "machine": "raspberrypi0-wifi",
+            "distro": "poky",
+            "image": "core-image-full-cmdline",
+            "pkg_format": "package_rpm",
+            "init_system": "systemd",
+            "bb_threads": cores,
+            "parallel_make": cores,
+            "event_mode": False,
+            "resident_server": False,
+            "prefetch": False,
+            "auto_tune": False,
+            "hashserv": False,
+            "hashserv_bind": "unix",
+            "sstate_mirror": "",
+            "dl_dir": "",
+            "sstate_dir": "",
+            "scratch_tmpfs": False,
+            "rm_work_exclude": "",
+            "cache_budget": 50,
+            "cache_protect": True,
+            "matrix": False,
+            "matrix_machines": [],
+        },
+        "image": {
+            "debug_tweaks": True,
+            "ssh_server": True,
+            "tools_debug": False,
+            "package_mgmt": True,
+        },
+        "ota": {
+            "enable_rauc": False,
+            "rauc_slot_size": "1024",
+            "target_ip": "192.168.1.x",
+            "target_user": "root",
+        },
+        "managers": [{
+            "rpi_hostname": "raspberrypi-yocto",
+            "rpi_username": "root",
+            "rpi_password": "root",
+            "rpi_usb_gadget": False,
+            "rpi_enable_uart": True,
+            "license_commercial": True,
+            "persistent_logs": True,
+            "rpi_enable_wifi": False,
+            "wifi_ssid": "",
+            "wifi_password": "",
+        }],
+    }
+
+def load_profile(path):
+    with open(path, "r") as f:
+        data = json.load(f)
+    profile = default_profile()
+    for key in ("general", "image", "ota"):
+        profile[key].update(data.get(key, {}))
+    if data.get("managers"):
+        profile["managers"][0].update(data["managers"][0])
+    return profile
+
+# --- Paths ---
+def conf_dir(poky, build_dir):
+    return os.path.join(poky, build_dir, "conf")
+
+def tmp_dir(general, build_path):
+    if general.get("scratch_tmpfs"):
+        return scratch.mount_point(build_path)
+    return os.path.join(build_path, "tmp")
+
+def dl_dir(general, build_path):
+    return general.get("dl_dir", "").strip() or os.path.join(build_path, "downloads")
+
+def sstate_dir(general, build_path):
+    return general.get("sstate_dir", "").strip() or os.path.join(build_path, "sstate-cache")
+
+def deploy_dir(general, build_path, machine=None):
+    # In fast scratch mode images are read from the persistent copy.
+    if general.get("scratch_tmpfs"):
+        return os.path.join(scratch.persist_dir(build_path), "images", machine or general["machine"])
+    return os.path.join(tmp_dir(general, build_path), "deploy", "images", machine or general["machine"])
+
+def device_of(path):
+    # The directory may not exist yet; use the filesystem it would land on.
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path: return None
+        path = parent
+    return os.stat(path).st_dev
+
+def cross_device_dirs(general, build_path):
+    # A scratch tmpfs can never share a filesystem; compare with the build dir.
+    tmp_dev = device_of(build_path if general.get("scratch_tmpfs") else tmp_dir(general, build_path))
+    other = []
+    for name, key in (("DL_DIR", "dl_dir"), ("SSTATE_DIR", "sstate_dir")):
+        path = general.get(key, "").strip()
+        if path and tmp_dev is not None and device_of(path) != tmp_dev:
+            other.append(f"{name} = {path}")
+    return other
+
+# --- Targets ---
+def matrix_machines(general):
+    if not general.get("matrix"): return []
+    return list(general.get("matrix_machines", []))
+
+def build_machines(general):
+    return matrix_machines(general) or [general["machine"]]
+
+def expand_targets(general, targets):
+    # In matrix mode every plain target becomes one mc:<machine>:<target>
+    # per machine, so all of them share a single bitbake parse.
+    machines = matrix_machines(general)
+    if not machines: return targets
+    expanded = []
+    for t in targets.split():
+        if t.startswith("mc:"):
+            expanded.append(t)
+        else:
+            expanded.extend(f"mc:{m}:{t}" for m in machines)
+    return " ".join(expanded)
+
+def rpi_supported(general):
+    return any(m in RPI_MACHINES for m in build_machines(general))
+
+# --- local.conf ---
+def hashserv_address(general, cache_dir):
+    if not general.get("hashserv"): return None
+    return hashserv.normalize_address(general.get("hashserv_bind"), cache_dir)
+
+def tuned_parallelism(general):
+    if not general.get("auto_tune"):
+        return general["bb_threads"], general["parallel_make"]
+    _, available = pressure.memory_info()
+    return pressure.auto_tune(multiprocessing.cpu_count(), available)
+
+def general_lines(general, cache_dir, psi_baseline=None):
+    lines = []
+    lines.append(f'MACHINE ??= "{general["machine"]}"\n')
+    matrix = matrix_machines(general)
+    if matrix:
+        lines.append(f'BBMULTICONFIG = "{" ".join(matrix)}"\n')
+    lines.append(f'DISTRO ?= "{general["distro"]}"\n')
+    lines.append(f'PACKAGE_CLASSES ?= "{general["pkg_format"]}"\n')
+    if general.get("auto_tune"):
+        bb_threads, parallel_make = tuned_parallelism(general)
+        lines.extend(pressure.config_lines(bb_threads, parallel_make, multiprocessing.cpu_count(), psi_baseline))
+    else:
+        lines.append(f'BB_NUMBER_THREADS = "{general["bb_threads"]}"\n')
+        lines.append(f'PARALLEL_MAKE = "-j {general["parallel_make"]}"\n')
+
+    # --- FIX: Dùng biến INIT_MANAGER thay vì chỉ set VIRTUAL-RUNTIME ---
+    # Đây là chuẩn mới của Yocto, giúp các layer khác (như Mender) nhận diện đúng.
+    if general["init_system"] == "systemd":
+        lines.append('INIT_MANAGER = "systemd"\n')
+        # Các dòng dưới đây là bổ trợ (thường INIT_MANAGER tự xử lý, nhưng giữ lại cho chắc chắn)
+        lines.append('DISTRO_FEATURES:append = " systemd usrmerge"\n')
+        lines.append('VIRTUAL-RUNTIME_init_manager = "systemd"\n')
+    elif general["init_system"] == "sysvinit":
+        lines.append('INIT_MANAGER = "sysvinit"\n')
+
+    lines.append('INHERIT += "buildstats"\n')
+
+    if general.get("dl_dir", "").strip():
+        lines.append(f'DL_DIR = "{general["dl_dir"].strip()}"\n')
+    if general.get("sstate_dir", "").strip():
+        lines.append(f'SSTATE_DIR = "{general["sstate_dir"].strip()}"\n')
+    if general.get("scratch_tmpfs"):
+        lines.append(f'TMPDIR = "${{TOPDIR}}/{scratch.TMPDIR_NAME}"\n')
+        lines.append('INHERIT += "rm_work"\n')
+        # Keep the image's own work dir (rootfs, logs) for inspection.
+        exclude = [general["image"]] + general.get("rm_work_exclude", "").split()
+        lines.append(f'RM_WORK_EXCLUDE += "{" ".join(exclude)}"\n')
+
+    lines.extend(hashserv.config_lines(hashserv_address(general, cache_dir), general.get("sstate_mirror")))
+    return lines
+
+def multiconfig_lines(machine):
+    # TMPDIR is left shared so native/cross tasks are only built once.
+    return [f'MACHINE = "{machine}"\n']
+
+def image_lines(image):
+    features = []
+    if image["debug_tweaks"]: features.append("debug-tweaks")
+    if image["ssh_server"]: features.append("ssh-server-openssh")
+    if image["tools_debug"]: features.append("tools-debug")
+    if image["package_mgmt"]: features.append("package-management")
+
+    if features:
+        return [f'EXTRA_IMAGE_FEATURES ?= "{" ".join(features)}"\n']
+    return []
+
+def rpi_lines(rpi, general, ota, layer):
+    # Returns (distro-wide lines, machine lines). Multiconfigs share one
+    # TMPDIR, so only the machine lines may differ between them.
+    distro = []
+    lines = []
+
+    user = rpi["rpi_username"].strip()
+    pwd = rpi["rpi_password"].strip()
+
+    if user and user != "root":
+        distro.append('INHERIT += "extrausers"\n')
+        pass_flag = f"-P '{pwd}'" if pwd else "-P 'root'"
+        distro.append(f'EXTRA_USERS_PARAMS += "useradd {pass_flag} -G sudo,video,render,input,shutdown,disk {user};"\n')
+
+    lines.append(f'ENABLE_UART = "{"1" if rpi["rpi_enable_uart"] else "0"}"\n')
+
+    if rpi["license_commercial"]:
+        distro.append('LICENSE_FLAGS_ACCEPTED:append = " commercial synaptics-killswitch"\n')
+
+    if rpi["rpi_usb_gadget"]:
+        lines.append('RPI_EXTRA_CONFIG:append = "dtoverlay=dwc2"\n')
+        lines.append('KERNEL_MODULE_AUTOLOAD += "dwc2 g_ether"\n')
+        lines.append('IMAGE_INSTALL:append = " kernel-module-dwc2 kernel-module-g-ether"\n')
+
+    if rpi["persistent_logs"]:
+        distro.append('VOLATILE_LOG_DIR = "no"\n')
+
+    if rpi["rpi_enable_wifi"]:
+        layer.generate_wpa_config(rpi["wifi_ssid"], rpi["wifi_password"])
+        distro.append('DISTRO_FEATURES:append = " systemd wifi usrmerge"\n')
+        distro.append('VIRTUAL-RUNTIME_init_manager = "systemd"\n')
+        distro.append('DISTRO_FEATURES_BACKFILL_CONSIDERED = "sysvinit"\n')
+        distro.append('VIRTUAL-RUNTIME_initscripts = "systemd-compat-units"\n')
+
+        lines.append('IMAGE_INSTALL:append = " wpa-supplicant iw linux-firmware-rpidistro-bcm43430 kernel-module-brcmfmac kernel-module-brcmfmac-wcc wpa-config wireless-regdb-static avahi-daemon libnss-mdns"\n')
+
+        lines.append('KERNEL_MODULE_AUTOLOAD:append = " brcmfmac-wcc"\n')
+        lines.append('CMDLINE:append = " brcmfmac.feature_disable=0x200000"\n')
+
+    layer.create_base_files_bbappend(rpi["rpi_hostname"], ota["enable_rauc"])
+
+    if ota["enable_rauc"]:
+        layer.setup_rauc_recipes(ota["rauc_slot_size"], general["machine"])
+
+        distro.append('DEPENDS:append:pn-rauc = " libubootenv"\n')
+
+        lines.append('\n')
+        lines.append('RPI_USE_U_BOOT = "1"\n')
+        lines.append('PREFERRED_PROVIDER_virtual/bootloader = "u-boot"\n')
+        lines.append('PREFERRED_PROVIDER_rauc-conf = "rpi-rauc-conf"\n')
+        lines.append('PREFERRED_PROVIDER_virtual/rauc-conf = "rpi-rauc-conf"\n')
+        lines.append('BBMASK += "meta-rauc/recipes-core/rauc/rauc-conf.bb"\n')
+        lines.append('IMAGE_INSTALL:append = " rpi-rauc-conf libubootenv-bin e2fsprogs-mke2fs dosfstools"\n')
+        lines.append('WKS_FILE = "sdimage-dual-raspberrypi.wks"\n')
+        lines.append('EXTRA_IMAGEDEPENDS:remove = "rpi-u-boot-scr"\n')
+        lines.append('IMAGE_BOOT_FILES:append = " uboot.env"\n')
+
+    return distro, lines
+
+def rauc_key_dir(poky):
+    project_root = os.path.dirname(poky) if poky else os.getcwd()
+    return os.path.join(project_root, "rauc-keys")
+
+def ota_lines(ota, general, layer, log):
+    if not ota["enable_rauc"]: return []
+
+    layer.create_bundle_recipe()
+
+    key_path_real = os.path.join(rauc_key_dir(layer.poky_dir), "development-1.key.pem")
+    if not os.path.exists(key_path_real):
+         log("Warning: RAUC Keys not found. Please click 'Generate Keys'.")
+
+    key_dir = "${TOPDIR}/../../rauc-keys"
+    cert_path = os.path.join(key_dir, "development-1.cert.pem")
+    key_path = os.path.join(key_dir, "development-1.key.pem")
+
+    lines = []
+    lines.append('\n')
+    lines.append('PACKAGECONFIG:append:pn-rauc = " uboot"\n')
+    lines.append('DISTRO_FEATURES:append = " rauc"\n')
+    lines.append('IMAGE_INSTALL:append = " rauc"\n')
+    lines.append(f'RAUC_KEY_FILE_REAL = "{key_path}"\n')
+    lines.append(f'RAUC_CERT_FILE_REAL = "{cert_path}"\n')
+    lines.append(f'RAUC_KEYRING_FILE = "{cert_path}"\n')
+
+    lines.append(f'RAUC_TARGET_IMAGE = "{general["image"]}"\n')
+    lines.append('IMAGE_FSTYPES:append = " wic.bz2 ext4"\n')
+    lines.append('SYSTEMD_AUTO_ENABLE:pn-systemd-growfs = "disable"\n')
+    lines.append('IMAGE_FEATURES:remove = "read-only-rootfs"\n')
+
+    return lines
+
+def strip_managed(lines, emitted):
+    # `emitted` is the new auto block: a user line is only replaced when the
+    # block sets the same variable, otherwise it is the user's own setting.
+    patterns = [p for p in MANAGED_PATTERNS if any(p.match(l) for l in emitted)]
+    clean_lines = []
+    skip_block = False
+    continued = False
+    for line in lines:
+        if "# --- YOCTOOL AUTO CONFIG START" in line:
+            skip_block = True
+            continue
+        if "# --- YOCTOOL AUTO CONFIG END" in line:
+            skip_block = False
+            continue
+        if skip_block: continue
+        if continued or any(p.match(line) for p in patterns):
+            # Also drop the continuation lines of a multi-line value.
+            continued = line.rstrip().endswith("\\")
+            continue
+        clean_lines.append(line)
+
+    # The auto block is appended after one blank line; drop the blank lines
+    # left by the previous block so that rendering is idempotent.
+    while clean_lines and not clean_lines[-1].strip():
+        clean_lines.pop()
+    if clean_lines and not clean_lines[-1].endswith('\n'):
+        clean_lines[-1] += '\n'
+    return clean_lines
+
+def render_local_conf(existing, profile, layer, cache_dir, log, psi_baseline=None):
+    # Returns (local.conf lines, matrix machines, {machine: extra lines}).
+    # meta-yoctool files are only rendered into `layer`; see apply().
+    general, ota, rpi = profile["general"], profile["ota"], profile["managers"][0]
+
+    auto = general_lines(general, cache_dir, psi_baseline)
+    auto.extend(image_lines(profile["image"]))
+
+    # In matrix mode machine settings go into the multiconfig files of
+    # the machines they belong to. Distro-wide ones stay in local.conf so
+    # that all multiconfigs sharing TMPDIR agree on them.
+    matrix = matrix_machines(general)
+    board_lines = {}
+    if rpi_supported(general):
+        distro_rpi, machine_rpi = rpi_lines(rpi, general, ota, layer)
+        auto.extend(distro_rpi)
+        if not matrix:
+            auto.extend(machine_rpi)
+        for m in matrix:
+            if m in RPI_MACHINES:
+                board_lines.setdefault(m, []).extend(machine_rpi)
+
+    auto.extend(ota_lines(ota, general, layer, log))
+
+    lines = strip_managed(existing, auto)
+    lines.append("\n" + AUTO_START)
+    lines.extend(auto)
+    lines.append(AUTO_END)
+    return lines, matrix, board_lines
+
+def write_multiconfigs(conf_path, machines, extra_lines, log):
+    # Returns (written, removed) file names.
+    mc_dir = os.path.join(conf_path, "multiconfig")
+    written, removed = [], []
+
+    if os.path.isdir(mc_dir):
+        for name in os.listdir(mc_dir):
+            path = os.path.join(mc_dir, name)
+            if not name.endswith(".conf") or name[:-5] in machines: continue
+            try:
+                with open(path, 'r') as f:
+                    if f.readline() == MULTICONFIG_HEADER:
+                        os.remove(path)
+                        removed.append(f"multiconfig/{name}")
+            except OSError: pass
+
+    for m in machines:
+        content = MULTICONFIG_HEADER + "".join(multiconfig_lines(m)) + "".join(extra_lines.get(m, []))
+        if filesync.sync_file(os.path.join(mc_dir, f"{m}.conf"), content):
+            written.append(f"multiconfig/{m}.conf")
+    if machines:
+        log(f"Multiconfig matrix: {', '.join(machines)}")
+    return written, removed
+
+# --- bblayers.conf ---
+def rpi_bblayers_lines(rpi):
+    layers = [
+        'BBLAYERS += "${TOPDIR}/../meta-openembedded/meta-oe"\n',
+        'BBLAYERS += "${TOPDIR}/../meta-openembedded/meta-python"\n',
+        'BBLAYERS += "${TOPDIR}/../meta-openembedded/meta-networking"\n',
+        'BBLAYERS += "${TOPDIR}/../meta-raspberrypi"\n'
+    ]
+
+    if rpi["rpi_enable_wifi"]:
+        layers.append('BBLAYERS += "${TOPDIR}/../meta-yoctool"\n')
+
+    return layers
+
+def ota_bblayers_lines():
+    return ['BBLAYERS += "${TOPDIR}/../meta-rauc"\n']
+
+def required_layers(profile):
+    return RPI_REQUIRED_LAYERS + OTA_REQUIRED_LAYERS
+
+def render_bblayers(profile):
+    base_content = [
+        'POKY_BBLAYERS_CONF_VERSION = "2"',
+        'BBPATH = "${TOPDIR}"',
+        'BBFILES ?= ""',
+        'BBLAYERS ?= " \\',
+        '  ${TOPDIR}/../meta \\',
+        '  ${TOPDIR}/../meta-poky \\',
+        '  ${TOPDIR}/../meta-yocto-bsp \\',
+        '"'
+    ]
+
+    content = '\n'.join(base_content) + '\n'
+    for lines in (rpi_bblayers_lines(profile["managers"][0]), ota_bblayers_lines()):
+        content += '\n# Added by Yoctool\n' + "".join(lines)
+    return content
+
+def write_bblayers(conf_path, profile, log):
+    if filesync.sync_file(os.path.join(conf_path, "bblayers.conf"), render_bblayers(profile)):
+        log("Regenerated bblayers.conf with correct paths.")
+        return True
+    return False
+
+def apply(poky, build_dir, profile, cache_dir, log, psi_baseline=None):
+    # Renders everything first, then only rewrites files whose content
+    # changed, so an unchanged APPLY leaves bitbake's parse cache valid.
+    conf_path = conf_dir(poky, build_dir)
+    local_conf = os.path.join(conf_path, "local.conf")
+    if os.path.exists(local_conf):
+        with open(local_conf, 'r') as f: existing = f.readlines()
+    else:
+        existing = []
+
+    layer = meta_yoctool.MetaLayer(poky, log)
+    lines, matrix, board_lines = render_local_conf(existing, profile, layer, cache_dir, log, psi_baseline)
+
+    written = []
+    if filesync.sync_file(local_conf, "".join(lines)):
+        written.append("local.conf")
+    mc_written, removed = write_multiconfigs(conf_path, matrix, board_lines, log)
+    written.extend(mc_written)
+    if write_bblayers(conf_path, profile, log):
+        written.append("bblayers.conf")
+    if filesync.sync_file(os.path.join(conf_path, "yoctool.conf"), json.dumps(profile, indent=4)):
+        written.append("yoctool.conf")
+
+    result = layer.sync()
+    if result:
+        written.extend(f"meta-yoctool/{rel}" for rel in result["written"])
+        removed.extend(f"meta-yoctool/{rel}" for rel in result["removed"])
+
+    if written or removed:
+        log("Configuration files changed: " + ", ".join(written + [f"-{r}" for r in removed]))
+    else:
+        log("Configuration unchanged; nothing written.")
+    return written, removed
@@ -1,8 +1,12 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, filedialog
 import multiprocessing
+import threading
 import os
 
+import confgen
+import pressure
+
 class GeneralTab:
     def __init__(self, root_app):
         self.root_app = root_app
@@ -18,6 +22,26 @@ class GeneralTab:
         cpu_count = multiprocessing.cpu_count()
         self.bb_threads_var = tk.IntVar(value=cpu_count)
         self.parallel_make_var = tk.IntVar(value=cpu_count)
+        self.event_mode_var = tk.BooleanVar(value=False)
+        self.resident_server_var = tk.BooleanVar(value=False)
+        self.prefetch_var = tk.BooleanVar(value=False)
+        self.auto_tune_var = tk.BooleanVar(value=False)
+        self.psi_baseline = None
+
+        self.hashserv_var = tk.BooleanVar(value=False)
+        self.hashserv_bind_var = tk.StringVar(value="unix")
+        self.sstate_mirror_var = tk.StringVar()
+
+        self.dl_dir_var = tk.StringVar()
+        self.sstate_dir_var = tk.StringVar()
+        self.cache_budget_var = tk.IntVar(value=50)
+        self.scratch_tmpfs_var = tk.BooleanVar(value=False)
+        self.rm_work_exclude_var = tk.StringVar()
+        self.cache_protect_var = tk.BooleanVar(value=True)
+
+        self.matrix_var = tk.BooleanVar(value=False)
+        self.matrix_machines = []
+        self.matrix_list = None
 
     def create_tab(self, notebook):
         tab = ttk.Frame(notebook)
@@ -50,6 +74,15 @@ class GeneralTab:
                                         values=["core-image-minimal", "core-image-base", "core-image-full-cmdline", "core-image-sato"], width=25)
         self.image_combo.grid(row=1, column=1, padx=5, pady=5, sticky="w")
 
+        ttk.Checkbutton(grp_target, text="Matrix build (multiconfig):", variable=self.matrix_var,
+                        command=self.on_matrix_changed).grid(row=1, column=2, padx=5, pady=5, sticky="ne")
+        self.matrix_list = tk.Listbox(grp_target, selectmode="multiple", exportselection=False, height=4, width=22)
+        for m in all_machines:
+            self.matrix_list.insert("end", m)
+        self.matrix_list.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+        self.matrix_list.bind("<<ListboxSelect>>", self.on_matrix_changed)
+        self._sync_matrix_list()
+
         grp_sys = ttk.LabelFrame(tab, text=" System Core ")
         grp_sys.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
 
@@ -63,30 +96,111 @@ class GeneralTab:
         grp_perf.grid(row=1, column=1, padx=10, pady=5, sticky="nsew")
 
         ttk.Label(grp_perf, text="BB_NUMBER_THREADS:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
-        ttk.Spinbox(grp_perf, from_=1, to=64, textvariable=self.bb_threads_var, width=5).grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        self.spin_threads = ttk.Spinbox(grp_perf, from_=1, to=256, textvariable=self.bb_threads_var, width=5)
+        self.spin_threads.grid(row=0, column=1, padx=5, pady=5, sticky="w")
 
         ttk.Label(grp_perf, text="PARALLEL_MAKE (-j):").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-        ttk.Spinbox(grp_perf, from_=1, to=64, textvariable=self.parallel_make_var, width=5).grid(row=1, column=1, padx=5, pady=5, sticky="w")
-
-    def get_config_lines(self):
-        lines = []
-        lines.append(f'MACHINE ??= "{self.machine_var.get()}"\n')
-        lines.append(f'DISTRO ?= "{self.distro_var.get()}"\n')
-        lines.append(f'PACKAGE_CLASSES ?= "{self.pkg_format_var.get()}"\n')
-        lines.append(f'BB_NUMBER_THREADS = "{self.bb_threads_var.get()}"\n')
-        lines.append(f'PARALLEL_MAKE = "-j {self.parallel_make_var.get()}"\n')
-        
-        # --- FIX: Dùng biến INIT_MANAGER thay vì chỉ set VIRTUAL-RUNTIME ---
-        # Đây là chuẩn mới của Yocto, giúp các layer khác (như Mender) nhận diện đúng.
-        if self.init_system_var.get() == "systemd":
-            lines.append('INIT_MANAGER = "systemd"\n')
-            # Các dòng dưới đây là bổ trợ (thường INIT_MANAGER tự xử lý, nhưng giữ lại cho chắc chắn)
-            lines.append('DISTRO_FEATURES:append = " systemd usrmerge"\n')
-            lines.append('VIRTUAL-RUNTIME_init_manager = "systemd"\n')
-        elif self.init_system_var.get() == "sysvinit":
-            lines.append('INIT_MANAGER = "sysvinit"\n')
-            
-        return lines
+        self.spin_make = ttk.Spinbox(grp_perf, from_=1, to=256, textvariable=self.parallel_make_var, width=5)
+        self.spin_make.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Checkbutton(grp_perf, text="Auto (cores, RAM, pressure)", variable=self.auto_tune_var, command=self.on_auto_tune_changed).grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(grp_perf, text="Structured progress (bitbake events)", variable=self.event_mode_var).grid(row=2, column=0, columnspan=3, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(grp_perf, text="Keep bitbake server warm between runs", variable=self.resident_server_var).grid(row=3, column=0, columnspan=3, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(grp_perf, text="Parse and fetch in the background after APPLY & SAVE", variable=self.prefetch_var).grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="w")
+        self.on_auto_tune_changed()
+
+        grp_share = ttk.LabelFrame(tab, text=" Shared State ")
+        grp_share.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+        grp_share.columnconfigure(3, weight=1)
+
+        ttk.Checkbutton(grp_share, text="Local hash equivalence server", variable=self.hashserv_var).grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        ttk.Label(grp_share, text="Bind:").grid(row=0, column=1, padx=5, pady=5, sticky="e")
+        ttk.Entry(grp_share, textvariable=self.hashserv_bind_var, width=20).grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        ttk.Label(grp_share, text="(unix or host:port)", font=("Arial", 8, "italic"), foreground="gray").grid(row=0, column=3, padx=5, sticky="w")
+
+        ttk.Label(grp_share, text="SSTATE_MIRRORS:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        ttk.Entry(grp_share, textvariable=self.sstate_mirror_var).grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky="ew")
+
+        grp_storage = ttk.LabelFrame(tab, text=" Storage ")
+        grp_storage.grid(row=3, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+        grp_storage.columnconfigure(1, weight=1)
+
+        for row, (label, var) in enumerate((("Shared DL_DIR:", self.dl_dir_var), ("Shared SSTATE_DIR:", self.sstate_dir_var))):
+            ttk.Label(grp_storage, text=label).grid(row=row, column=0, padx=5, pady=5, sticky="e")
+            ttk.Entry(grp_storage, textvariable=var).grid(row=row, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+            ttk.Button(grp_storage, text="Browse", command=lambda v=var: v.set(filedialog.askdirectory() or v.get())).grid(row=row, column=3, padx=5, pady=5)
+        ttk.Label(grp_storage, text="(empty = inside the build directory)", font=("Arial", 8, "italic"), foreground="gray").grid(row=2, column=1, padx=5, sticky="w")
+
+        ttk.Label(grp_storage, text="Cache budget (GB):").grid(row=3, column=0, padx=5, pady=5, sticky="e")
+        f_budget = ttk.Frame(grp_storage)
+        f_budget.grid(row=3, column=1, columnspan=3, sticky="w")
+        ttk.Spinbox(f_budget, from_=1, to=10000, textvariable=self.cache_budget_var, width=7).pack(side="left", padx=5, pady=5)
+        ttk.Checkbutton(f_budget, text="Protect current image's sstate when pruning", variable=self.cache_protect_var).pack(side="left", padx=10, pady=5)
+
+        ttk.Checkbutton(grp_storage, text="Fast scratch: TMPDIR in RAM (tmpfs) with rm_work", variable=self.scratch_tmpfs_var).grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        ttk.Label(grp_storage, text="Keep work dirs of:").grid(row=5, column=0, padx=5, pady=5, sticky="e")
+        ttk.Entry(grp_storage, textvariable=self.rm_work_exclude_var).grid(row=5, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+        ttk.Label(grp_storage, text="(recipes, space separated)", font=("Arial", 8, "italic"), foreground="gray").grid(row=5, column=3, padx=5, sticky="w")
+
+    def _sync_matrix_list(self):
+        if not self.matrix_list: return
+        values = self.matrix_list.get(0, "end")
+        self.matrix_list.configure(state="normal")
+        self.matrix_list.selection_clear(0, "end")
+        for m in self.matrix_machines:
+            if m in values:
+                self.matrix_list.selection_set(values.index(m))
+        self.matrix_list.configure(state="normal" if self.matrix_var.get() else "disabled")
+
+    def on_matrix_changed(self, event=None):
+        if self.matrix_list and self.matrix_var.get():
+            self.matrix_machines = [self.matrix_list.get(i) for i in self.matrix_list.curselection()]
+        self._sync_matrix_list()
+        self.root_app.update_ui_visibility()
+
+    def get_matrix_machines(self):
+        return confgen.matrix_machines(self.get_state())
+
+    def get_build_machines(self):
+        return confgen.build_machines(self.get_state())
+
+    def expand_targets(self, targets):
+        return confgen.expand_targets(self.get_state(), targets)
+
+    def get_multiconfig_lines(self, machine):
+        return confgen.multiconfig_lines(machine)
+
+    def on_auto_tune_changed(self):
+        auto = self.auto_tune_var.get()
+        for spin in (getattr(self, "spin_threads", None), getattr(self, "spin_make", None)):
+            if spin: spin.configure(state="disabled" if auto else "normal")
+        if not auto: return
+        _, available = pressure.memory_info()
+        bb_threads, parallel_make = pressure.auto_tune(multiprocessing.cpu_count(), available)
+        self.bb_threads_var.set(bb_threads)
+        self.parallel_make_var.set(parallel_make)
+        if self.psi_baseline is None and pressure.is_available():
+            threading.Thread(target=self._measure_baseline, daemon=True).start()
+
+    def _measure_baseline(self):
+        # Idle stall rates of this host; limits are set relative to them.
+        rates, _ = pressure.sample_rates(interval=2.0)
+        self.psi_baseline = rates
+
+    def get_hashserv_address(self):
+        return confgen.hashserv_address(self.get_state(), self.root_app.cache_dir)
+
+    def get_tmp_dir(self, build_path):
+        return confgen.tmp_dir(self.get_state(), build_path)
+
+    def get_deploy_dir(self, build_path):
+        return confgen.deploy_dir(self.get_state(), build_path)
+
+    def get_dl_dir(self, build_path):
+        return confgen.dl_dir(self.get_state(), build_path)
+
+    def get_sstate_dir(self, build_path):
+        return confgen.sstate_dir(self.get_state(), build_path)
 
     def get_state(self):
         return {
@@ -97,6 +211,21 @@ class GeneralTab:
             "init_system": self.init_system_var.get(),
             "bb_threads": self.bb_threads_var.get(),
             "parallel_make": self.parallel_make_var.get(),
+            "event_mode": self.event_mode_var.get(),
+            "resident_server": self.resident_server_var.get(),
+            "prefetch": self.prefetch_var.get(),
+            "auto_tune": self.auto_tune_var.get(),
+            "hashserv": self.hashserv_var.get(),
+            "hashserv_bind": self.hashserv_bind_var.get(),
+            "sstate_mirror": self.sstate_mirror_var.get(),
+            "dl_dir": self.dl_dir_var.get(),
+            "sstate_dir": self.sstate_dir_var.get(),
+            "scratch_tmpfs": self.scratch_tmpfs_var.get(),
+            "rm_work_exclude": self.rm_work_exclude_var.get(),
+            "cache_budget": self.cache_budget_var.get(),
+            "cache_protect": self.cache_protect_var.get(),
+            "matrix": self.matrix_var.get(),
+            "matrix_machines": list(self.matrix_machines),
         }
 
     def set_state(self, state):
@@ -107,4 +236,21 @@ class GeneralTab:
         self.pkg_format_var.set(state.get("pkg_format", "package_rpm"))
         self.init_system_var.set(state.get("init_system", "systemd"))
         self.bb_threads_var.set(state.get("bb_threads", multiprocessing.cpu_count()))
-        self.parallel_make_var.set(state.get("parallel_make", multiprocessing.cpu_count()))
\ No newline at end of file
+        self.parallel_make_var.set(state.get("parallel_make", multiprocessing.cpu_count()))
+        self.event_mode_var.set(state.get("event_mode", False))
+        self.resident_server_var.set(state.get("resident_server", False))
+        self.prefetch_var.set(state.get("prefetch", False))
+        self.auto_tune_var.set(state.get("auto_tune", False))
+        self.on_auto_tune_changed()
+        self.hashserv_var.set(state.get("hashserv", False))
+        self.hashserv_bind_var.set(state.get("hashserv_bind", "unix"))
+        self.sstate_mirror_var.set(state.get("sstate_mirror", ""))
+        self.dl_dir_var.set(state.get("dl_dir", ""))
+        self.sstate_dir_var.set(state.get("sstate_dir", ""))
+        self.scratch_tmpfs_var.set(state.get("scratch_tmpfs", False))
+        self.rm_work_exclude_var.set(state.get("rm_work_exclude", ""))
+        self.cache_budget_var.set(state.get("cache_budget", 50))
+        self.cache_protect_var.set(state.get("cache_protect", True))
+        self.matrix_var.set(state.get("matrix", False))
+        self.matrix_machines = list(state.get("matrix_machines", []))
+        self._sync_matrix_list()
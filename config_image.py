@@ -11,10 +11,14 @@ class ImageTab:
         self.feat_tools_debug = tk.BooleanVar(value=False)
         self.feat_package_mgmt = tk.BooleanVar(value=True)
 
+        self.tab = None
+
     def create_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="Image Features")
-        
+        self.tab = ttk.Frame(notebook)
+        notebook.add(self.tab, text="Image Features")
+
+    def build_tab(self):
+        tab = self.tab
         frame_extra = ttk.LabelFrame(tab, text=" EXTRA_IMAGE_FEATURES ")
         frame_extra.pack(fill="x", padx=10, pady=10)
 
@@ -23,17 +27,6 @@ class ImageTab:
         ttk.Checkbutton(frame_extra, text="tools-debug (GDB, Strace, etc.)", variable=self.feat_tools_debug).pack(anchor="w", padx=10, pady=2)
         ttk.Checkbutton(frame_extra, text="package-management (Keep package manager in image)", variable=self.feat_package_mgmt).pack(anchor="w", padx=10, pady=2)
 
-    def get_config_lines(self):
-        features = []
-        if self.feat_debug_tweaks.get(): features.append("debug-tweaks")
-        if self.feat_ssh_server.get(): features.append("ssh-server-openssh")
-        if self.feat_tools_debug.get(): features.append("tools-debug")
-        if self.feat_package_mgmt.get(): features.append("package-management")
-        
-        if features:
-            return [f'EXTRA_IMAGE_FEATURES ?= "{" ".join(features)}"\n']
-        return []
-
     def get_state(self):
         return {
             "debug_tweaks": self.feat_debug_tweaks.get(),
@@ -47,4 +40,4 @@ class ImageTab:
         self.feat_debug_tweaks.set(state.get("debug_tweaks", True))
         self.feat_ssh_server.set(state.get("ssh_server", True))
         self.feat_tools_debug.set(state.get("tools_debug", False))
-        self.feat_package_mgmt.set(state.get("package_mgmt", True))
\ No newline at end of file
+        self.feat_package_mgmt.set(state.get("package_mgmt", True))
@@ -2,9 +2,11 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import os
 import subprocess
-import glob
 import threading
 
+import confgen
+import rauc_deploy
+
 class OTATab:
     def __init__(self, root_app):
         self.root_app = root_app
@@ -16,10 +18,14 @@ class OTATab:
         self.target_user = tk.StringVar(value="root")
         self.target_pass = tk.StringVar(value="root")
 
+        self.tab = None
+
     def create_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="OTA Update (RAUC)")
-        
+        self.tab = ttk.Frame(notebook)
+        notebook.add(self.tab, text="OTA Update (RAUC)")
+
+    def build_tab(self):
+        tab = self.tab
         frame_cfg = ttk.LabelFrame(tab, text=" 1. RAUC Configuration ")
         frame_cfg.pack(fill="x", padx=10, pady=5)
         
@@ -69,69 +75,28 @@ class OTATab:
         
         poky_dir = self.root_app.poky_path.get()
         build_dir = self.root_app.build_dir_name.get()
-        machine = self.root_app.tab_general.machine_var.get()
-        deploy_dir = os.path.join(poky_dir, build_dir, "tmp/deploy/images", machine)
+        deploy_dir = self.root_app.tab_general.get_deploy_dir(os.path.join(poky_dir, build_dir))
         
         if not os.path.exists(deploy_dir):
             messagebox.showerror("Error", "Deploy directory not found. Build first.")
             return
             
-        files = glob.glob(os.path.join(deploy_dir, "*.raucb"))
-        if not files:
+        bundle_file = rauc_deploy.find_bundle(deploy_dir)
+        if not bundle_file:
             messagebox.showerror("Error", "No .raucb file found. Please click 'BUILD UPDATE BUNDLE' first.")
             return
-            
-        bundle_file = max(files, key=os.path.getctime)
-        file_name = os.path.basename(bundle_file)
-        
-        ip = self.target_ip.get()
-        user = self.target_user.get()
-        pwd = self.target_pass.get()
-        target_path = f"/tmp/{file_name}"
-        
-        self.root_app.log(f"Starting SCP transfer: {file_name} -> {ip}...")
-        
-        cmd_scp = ["sshpass", "-p", pwd, "scp", "-v", "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null", bundle_file, f"{user}@{ip}:{target_path}"]
-        cmd_install = ["sshpass", "-p", pwd, "ssh", "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null", f"{user}@{ip}", f"rauc install {target_path} && reboot"]
         
-        threading.Thread(target=self.run_scp_thread, args=(cmd_scp, cmd_install, file_name)).start()
+        args = (bundle_file, self.target_ip.get(), self.target_user.get(), self.target_pass.get())
+        threading.Thread(target=self.run_scp_thread, args=args).start()
 
-    def run_scp_thread(self, cmd_scp, cmd_install, filename):
+    def run_scp_thread(self, bundle_file, ip, user, pwd):
         try:
             self.root_app.set_busy_state(True)
-            
-            process = subprocess.Popen(
-                cmd_scp, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,
-                text=True, 
-                bufsize=1, 
-                universal_newlines=True
-            )
-            
-            for line in process.stdout:
-                line_str = line.strip()
-                if line_str:
-                    if "Sending file modes" in line_str or "Transferred" in line_str or "Bytes per second" in line_str or "Sink" in line_str:
-                         self.root_app.log(f"[SCP] {line_str}")
-            
-            process.wait()
-            
-            if process.returncode == 0:
-                self.root_app.log(f"SUCCESS: {filename} uploaded.")
-                
-                self.root_app.log("Installing update & Rebooting. Please wait...")
-                install_process = subprocess.run(cmd_install, capture_output=True, text=True)
-                
-                if install_process.returncode == 0 or install_process.returncode == 255:
-                    self.root_app.log(f"[INSTALL] {install_process.stdout.strip()}")
-                    self.root_app.root.after(0, messagebox.showinfo, "Success", f"Update installed successfully!\nDevice is rebooting into the new partition.")
-                else:
-                    self.root_app.log(f"INSTALL ERROR: {install_process.stderr}")
-                    self.root_app.root.after(0, messagebox.showerror, "Install Failed", f"Update failed during rauc install.\nError: {install_process.stderr}")
+            ok, msg = rauc_deploy.deploy_bundle(bundle_file, ip, user, pwd, self.root_app.log)
+            if ok:
+                self.root_app.root.after(0, messagebox.showinfo, "Success", msg)
             else:
-                 self.root_app.log(f"SCP ERROR: Transfer failed with code {process.returncode}")
-                 self.root_app.root.after(0, messagebox.showerror, "Transfer Failed", "Failed to upload the update bundle.")
+                self.root_app.root.after(0, messagebox.showerror, "Deploy Failed", msg)
 
         except Exception as e:
             self.root_app.log(f"DEPLOY ERROR: {str(e)}")
@@ -171,75 +136,11 @@ class OTATab:
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
-    def create_bundle_recipe(self):
-        poky_dir = self.root_app.poky_path.get()
-        if not poky_dir: return
-        
-        layer_path = os.path.join(poky_dir, "meta-yoctool")
-        recipes_dir = os.path.join(layer_path, "recipes-core", "bundles")
-        os.makedirs(recipes_dir, exist_ok=True)
-        
-        bundle_bb = os.path.join(recipes_dir, "update-bundle.bb")
-        content = """DESCRIPTION = "RAUC Update Bundle"
-LICENSE = "MIT"
-LIC_FILES_CHKSUM = "file://${COMMON_LICENSE_DIR}/MIT;md5=0835ade698e0bcf8506ecda2f7b4f302"
-
-inherit bundle
-
-RAUC_BUNDLE_COMPATIBLE = "${MACHINE}"
-RAUC_BUNDLE_VERSION = "v1"
-RAUC_BUNDLE_DESCRIPTION = "RAUC Bundle generated by Yoctool"
-RAUC_BUNDLE_FORMAT = "plain"
-
-RAUC_BUNDLE_SLOTS = "rootfs" 
-RAUC_SLOT_rootfs = "${RAUC_TARGET_IMAGE}"
-RAUC_SLOT_rootfs[fstype] = "ext4"
-
-RAUC_KEY_FILE = "${RAUC_KEY_FILE_REAL}"
-RAUC_CERT_FILE = "${RAUC_CERT_FILE_REAL}"
-"""
-        with open(bundle_bb, "w") as f: f.write(content.strip() + "\n")
-
-    def get_config_lines(self):
-        if not self.enable_rauc.get(): return []
-        
-        self.create_bundle_recipe()
-        
-        poky_dir = self.root_app.poky_path.get()
-        project_root = os.path.dirname(poky_dir) if poky_dir else os.getcwd()
-        key_dir_real = os.path.join(project_root, "rauc-keys")
-        cert_path_real = os.path.join(key_dir_real, "development-1.cert.pem")
-        key_path_real = os.path.join(key_dir_real, "development-1.key.pem")
-
-        if not os.path.exists(key_path_real):
-             self.root_app.log("Warning: RAUC Keys not found. Please click 'Generate Keys'.")
-
-        key_dir = "${TOPDIR}/../../rauc-keys"
-        cert_path = os.path.join(key_dir, "development-1.cert.pem")
-        key_path = os.path.join(key_dir, "development-1.key.pem")
-
-        lines = []
-        lines.append('\n')
-        lines.append('PACKAGECONFIG:append:pn-rauc = " uboot"\n')
-        lines.append('DISTRO_FEATURES:append = " rauc"\n')
-        lines.append('IMAGE_INSTALL:append = " rauc"\n')
-        lines.append(f'RAUC_KEY_FILE_REAL = "{key_path}"\n')
-        lines.append(f'RAUC_CERT_FILE_REAL = "{cert_path}"\n')
-        lines.append(f'RAUC_KEYRING_FILE = "{cert_path}"\n')
-        
-        current_image = self.root_app.tab_general.image_var.get()
-        lines.append(f'RAUC_TARGET_IMAGE = "{current_image}"\n')
-        lines.append('IMAGE_FSTYPES:append = " wic.bz2 ext4"\n')
-        lines.append('SYSTEMD_AUTO_ENABLE:pn-systemd-growfs = "disable"\n')
-        lines.append('IMAGE_FEATURES:remove = "read-only-rootfs"\n')
-        
-        return lines
-
     def get_bblayers_lines(self):
-        return ['BBLAYERS += "${TOPDIR}/../meta-rauc"\n']
+        return confgen.ota_bblayers_lines()
     
     def get_required_layers(self):
-        return [("meta-rauc", "https://github.com/rauc/meta-rauc -b scarthgap")]
+        return confgen.OTA_REQUIRED_LAYERS
     
     def get_state(self):
          return {
@@ -254,4 +155,4 @@ RAUC_CERT_FILE = "${RAUC_CERT_FILE_REAL}"
         self.enable_rauc.set(state.get("enable_rauc", False))
         self.rauc_slot_size.set(state.get("rauc_slot_size", "1024"))
         self.target_ip.set(state.get("target_ip", "192.168.1.x"))
-        self.target_user.set(state.get("target_user", "root"))
\ No newline at end of file
+        self.target_user.set(state.get("target_user", "root"))
@@ -0,0 +1,260 @@
+import os
+import json
+import struct
+import hashlib
+import threading
+import ctypes
+import ctypes.util
+
+# Index of tmp/deploy/images/<machine>: (machine, image, fstype) -> newest
+# artifact. Images come from their .testdata.json (IMAGE_BASENAME, MACHINE,
+# IMAGE_LINK_NAME, IMAGE_FSTYPES), everything else (bundles, ...) from the
+# "<name>-<machine>.<ext>" symlinks bitbake points at the latest build.
+# inotify keeps it current without listing or stat-ing the directory on
+# every lookup; without inotify the directory mtime is polled instead.
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+TESTDATA_SUFFIX = ".testdata.json"
+
+_libc = None
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1, libc.inotify_add_watch
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+def _split_name(name, machine):
+    # "update-bundle-raspberrypi4.raucb" -> ("update-bundle", "raucb")
+    # "core-image-minimal-raspberrypi4.rootfs.wic.bz2" -> ("core-image-minimal", "wic.bz2")
+    stem, _, ext = name.partition(".")
+    if not ext or not stem.endswith(f"-{machine}"): return None, None
+    if ext.startswith("rootfs."): ext = ext[len("rootfs."):]
+    return stem[:-len(machine) - 1], ext
+
+class DeployIndex:
+    def __init__(self, deploy_dir):
+        self.deploy_dir = deploy_dir
+        self.machine = os.path.basename(os.path.normpath(deploy_dir))
+        self.lock = threading.Lock()
+        self.fd = None
+        self.wd = None
+        self.dir_mtime = None
+        self.names = set()
+        self.links = {}
+        self.testdata = {}    # name -> (mtime_ns, parsed vars)
+        self.entries = {}
+        self.dirty = False
+        self.checksums = {}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _watch(self):
+        libc = _inotify()
+        if not libc or not os.path.isdir(self.deploy_dir): return False
+        if self.fd is None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0: return False
+            self.fd = fd
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(self.deploy_dir), WATCH_MASK)
+        if wd < 0: return False
+        self.wd = wd
+        return True
+
+    def _read_events(self):
+        # Names touched since the last call; None means "rescan everything".
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            except OSError:
+                return None
+            pos = 0
+            while pos + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, pos)
+                name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0")
+                pos += EVENT_HEADER.size + length
+                if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self.wd = None
+                    return None
+                if name: changed.add(os.fsdecode(name))
+
+    def _full_scan(self):
+        self.names = set()
+        self.links = {}
+        self.dir_mtime = None
+        try:
+            self.dir_mtime = os.stat(self.deploy_dir).st_mtime_ns
+            with os.scandir(self.deploy_dir) as it:
+                for entry in it:
+                    self.names.add(entry.name)
+                    if entry.is_symlink():
+                        self.links[entry.name] = os.readlink(entry.path)
+        except OSError:
+            pass
+
+    def _update_names(self, changed):
+        for name in changed:
+            path = os.path.join(self.deploy_dir, name)
+            if os.path.lexists(path):
+                self.names.add(name)
+                try: self.links[name] = os.readlink(path)
+                except OSError: self.links.pop(name, None)
+            else:
+                self.names.discard(name)
+                self.links.pop(name, None)
+                self.testdata.pop(name, None)
+
+    def refresh(self):
+        with self.lock:
+            if self.wd is not None:
+                changed = self._read_events()
+                if changed is None:
+                    self.close()
+                    self.wd = None
+                elif changed:
+                    self._update_names(changed)
+                    self.dirty = True
+            if self.wd is None:
+                if self._watch():
+                    # First use, or the directory was (re)created.
+                    self._full_scan()
+                    self.dirty = True
+                else:
+                    try: mtime = os.stat(self.deploy_dir).st_mtime_ns
+                    except OSError: mtime = None
+                    if mtime != self.dir_mtime:
+                        self._full_scan()
+                        self.dirty = True
+            if self.dirty:
+                self._rebuild()
+                self.dirty = False
+
+    def _load_testdata(self, name):
+        path = os.path.join(self.deploy_dir, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self.testdata.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        keep = ("IMAGE_BASENAME", "MACHINE", "IMAGE_LINK_NAME", "IMAGE_NAME", "IMAGE_NAME_SUFFIX", "IMAGE_FSTYPES")
+        data = {k: data.get(k) or "" for k in keep}
+        self.testdata[name] = (mtime, data)
+        return data
+
+    def _resolve(self, name):
+        path = os.path.join(self.deploy_dir, name)
+        if name in self.links:
+            target = os.path.join(self.deploy_dir, self.links[name])
+            return os.path.normpath(target) if os.path.exists(target) else None
+        return path if name in self.names else None
+
+    def _add(self, entries, image, fstype, path, link=None):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        key = (self.machine, image, fstype)
+        old = entries.get(key)
+        if old and old["mtime"] >= st.st_mtime: return
+        entries[key] = {"machine": self.machine, "image": image, "fstype": fstype, "path": path,
+                        "link": link, "size": st.st_size, "mtime": st.st_mtime}
+
+    def _rebuild(self):
+        entries = {}
+        for name in self.links:
+            image, fstype = _split_name(name, self.machine)
+            path = self._resolve(name) if image else None
+            if path:
+                self._add(entries, image, fstype, path, os.path.join(self.deploy_dir, name))
+
+        # testdata.json is authoritative for images: exact IMAGE_BASENAME,
+        # so "core-image-minimal" never picks "core-image-minimal-dev".
+        for name in [n for n in self.names if n.endswith(TESTDATA_SUFFIX) and n not in self.links]:
+            td = self._load_testdata(name)
+            if not td or not td["IMAGE_BASENAME"]: continue
+            image = td["IMAGE_BASENAME"]
+            for fstype in td["IMAGE_FSTYPES"].split():
+                for base in (td["IMAGE_LINK_NAME"], td["IMAGE_NAME"]):
+                    if not base: continue
+                    found = False
+                    for candidate in (f"{base}.{fstype}", f"{base}{td['IMAGE_NAME_SUFFIX']}.{fstype}"):
+                        path = self._resolve(candidate)
+                        if path:
+                            self._add(entries, image, fstype, path, os.path.join(self.deploy_dir, candidate) if candidate in self.links else None)
+                            found = True
+                            break
+                    if found: break
+        self.entries = entries
+
+    def find(self, image, fstypes):
+        # Newest artifact of `image` for the first fstype (in order of
+        # preference) that exists.
+        self.refresh()
+        for fstype in fstypes:
+            entry = self.entries.get((self.machine, image, fstype))
+            if entry: return dict(entry)
+        return None
+
+    def newest(self, fstype):
+        self.refresh()
+        entries = [e for e in self.entries.values() if e["fstype"] == fstype]
+        return dict(max(entries, key=lambda e: e["mtime"])) if entries else None
+
+    def checksum(self, entry):
+        # sha256 of an entry, from bitbake's .sha256sum file when present,
+        # otherwise computed once per (path, size, mtime).
+        key = (entry["path"], entry["size"], entry["mtime"])
+        if key in self.checksums: return self.checksums[key]
+        try:
+            with open(entry["path"] + ".sha256sum", "r") as f:
+                value = f.read().split()[0]
+        except (OSError, IndexError):
+            h = hashlib.sha256()
+            with open(entry["path"], "rb") as f:
+                for chunk in iter(lambda: f.read(4 * 1024 * 1024), b""):
+                    h.update(chunk)
+            value = h.hexdigest()
+        self.checksums[key] = value
+        return value
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get(deploy_dir):
+    deploy_dir = os.path.abspath(deploy_dir)
+    with _indexes_lock:
+        index = _indexes.get(deploy_dir)
+        if index is None:
+            index = _indexes[deploy_dir] = DeployIndex(deploy_dir)
+        return index
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import tempfile
+
+# Generated files are only rewritten when their content changes: bitbake
+# looks at mtimes, so touching an identical recipe or conf file costs a
+# reparse (and can invalidate the whole parse cache).
+
+MANIFEST_NAME = ".yoctool-manifest"
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return digest(f.read())
+    except OSError:
+        return None
+
+def write_atomic(path, data):
+    # Write next to the target and rename over it, keeping the owner and
+    # mode of the file being replaced (or of the directory for new files).
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        st = os.stat(path)
+        mode = st.st_mode & 0o7777
+    except OSError:
+        st = os.stat(directory)
+        mode = 0o644
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        if os.geteuid() == 0:
+            os.chown(tmp, st.st_uid, st.st_gid)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+def sync_file(path, content):
+    # Returns True when the file was (re)written.
+    data = content.encode() if isinstance(content, str) else content
+    try:
+        same_size = os.path.getsize(path) == len(data)
+    except OSError:
+        same_size = False
+    if same_size and file_digest(path) == digest(data):
+        return False
+    write_atomic(path, data)
+    return True
+
+class FileTree:
+    # Desired content of a generated directory, keyed by relative path.
+    def __init__(self):
+        self.files = {}
+        self.obsolete = set()
+
+    def add(self, rel, content):
+        self.files[rel] = content.encode() if isinstance(content, str) else content
+
+    def copy(self, rel, src):
+        with open(src, "rb") as f:
+            self.files[rel] = f.read()
+
+    def remove(self, rel):
+        # Files written by older versions that must not be left behind.
+        self.obsolete.add(rel)
+
+    def _load_manifest(self, root):
+        try:
+            with open(os.path.join(root, MANIFEST_NAME), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _remove_empty_dirs(self, root, rel):
+        d = os.path.dirname(rel)
+        while d:
+            try: os.rmdir(os.path.join(root, d))
+            except OSError: break
+            d = os.path.dirname(d)
+
+    def sync(self, root):
+        # Returns {"written": [...], "removed": [...], "kept": [...], "unchanged": n}.
+        old = self._load_manifest(root)
+        result = {"written": [], "removed": [], "kept": [], "unchanged": 0}
+
+        for rel in sorted(self.files):
+            if sync_file(os.path.join(root, rel), self.files[rel]):
+                result["written"].append(rel)
+            else:
+                result["unchanged"] += 1
+
+        stale = (set(old) - set(self.files)) | (self.obsolete - set(self.files))
+        for rel in sorted(stale):
+            path = os.path.join(root, rel)
+            if not os.path.exists(path): continue
+            # A generated file edited by hand is left alone.
+            if rel in old and file_digest(path) != old[rel]:
+                result["kept"].append(rel)
+                continue
+            try:
+                os.remove(path)
+                result["removed"].append(rel)
+                self._remove_empty_dirs(root, rel)
+            except OSError:
+                result["kept"].append(rel)
+
+        manifest = {rel: digest(data) for rel, data in self.files.items()}
+        if manifest != old and (self.files or old):
+            sync_file(os.path.join(root, MANIFEST_NAME), json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+        return result
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import fcntl
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+FETCH_WORKERS = 3
+FETCH_ATTEMPTS = 2
+PROGRESS_STEP = 10
+
+# Mirrors younger than this are used as-is, without asking the network.
+MIRROR_MAX_AGE = 6 * 3600
+MIRROR_STAMP = "yoctool-fetched"
+
+def parse_layer_spec(url_info, default_branch):
+    parts = url_info.split()
+    branch = default_branch
+    if "-b" in parts:
+        idx = parts.index("-b")
+        if idx + 1 < len(parts):
+            branch = parts[idx + 1]
+    return parts[0], branch
+
+def detect_branch(poky, default="scarthgap"):
+    try:
+        branch = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=poky, text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return default
+    return default if branch == "HEAD" else branch
+
+def missing_layers(poky, required, branch):
+    # (name, url, branch, path) for every required layer not checked out yet.
+    missing = []
+    for name, url_info in required:
+        path = os.path.join(poky, name)
+        if not os.path.exists(path):
+            url, target_branch = parse_layer_spec(url_info, branch)
+            missing.append((name, url, target_branch, path))
+    return missing
+
+def _run_git(name, args, log):
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    last = {}
+    tail = []
+    for line in proc.stderr:
+        text = line.strip()
+        if not text: continue
+        m = re.search(r'^(.*?):\s+(\d+)%', text)
+        if m:
+            # git redraws progress in place; only report each PROGRESS_STEP.
+            phase, pct = m.group(1), int(m.group(2))
+            step = pct - pct % PROGRESS_STEP
+            if last.get(phase) != step:
+                last[phase] = step
+                log(f"[{name}] {phase}: {step}%")
+        else:
+            tail.append(text)
+            log(f"[{name}] {text}")
+    proc.wait()
+    return proc.returncode == 0, "\n".join(tail[-5:])
+
+def mirror_path(cache_dir, url):
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', url.split("://", 1)[-1]).strip("_")
+    if name.endswith(".git"): name = name[:-4]
+    return os.path.join(cache_dir, name + ".git")
+
+def _mirror_has_branch(path, branch):
+    if not branch: return True
+    return subprocess.run(["git", "--git-dir", path, "rev-parse", "--verify", "--quiet", f"refs/heads/{branch}"],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+def update_mirror(cache_dir, name, url, branch, log, max_age=MIRROR_MAX_AGE):
+    # Returns the bare mirror path, or None when it cannot provide `branch`.
+    # Layers sharing a URL, and other workspaces, wait on the same lock file.
+    path = mirror_path(cache_dir, url)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _update_mirror(path, name, url, branch, log, max_age)
+
+def _update_mirror(path, name, url, branch, log, max_age):
+    stamp = os.path.join(path, MIRROR_STAMP)
+
+    if not os.path.isdir(path):
+        log(f"[{name}] Creating mirror {path}")
+        ok, _ = _run_git(name, ["git", "clone", "--mirror", "--progress", url, path], log)
+        if not ok:
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # Workspaces borrow objects through alternates; never prune them.
+        subprocess.run(["git", "--git-dir", path, "config", "gc.pruneExpire", "never"], check=False)
+    else:
+        try: age = time.time() - os.path.getmtime(stamp)
+        except OSError: age = None
+        has_branch = _mirror_has_branch(path, branch)
+        if age is not None and age < max_age and has_branch:
+            log(f"[{name}] Using cached mirror (fetched {int(age // 60)} min ago)")
+            return path
+        log(f"[{name}] Refreshing mirror {path}")
+        ok, _ = _run_git(name, ["git", "--git-dir", path, "fetch", "--progress", "origin"], log)
+        if not ok:
+            if not has_branch: return None
+            log(f"[{name}] Mirror refresh failed, using cached copy.")
+            return path
+
+    if not _mirror_has_branch(path, branch):
+        return None
+    with open(stamp, "w") as f: f.write(f"{time.time()}\n")
+    return path
+
+def clone_from_mirror(name, mirror, url, branch, path, log):
+    args = ["git", "clone", "--shared", "--progress"]
+    if branch:
+        args.extend(["-b", branch])
+    args.extend([mirror, path])
+    existed = os.path.exists(path)
+    ok, _ = _run_git(name, args, log)
+    if ok:
+        subprocess.run(["git", "-C", path, "remote", "set-url", "origin", url], check=False)
+    elif not existed and os.path.exists(path):
+        shutil.rmtree(path, ignore_errors=True)
+    return ok
+
+def clone_layer(name, url, branch, path, log, mirror_dir=None):
+    if mirror_dir:
+        try:
+            mirror = update_mirror(mirror_dir, name, url, branch, log)
+            if mirror and clone_from_mirror(name, mirror, url, branch, path, log):
+                return True
+        except Exception as e:
+            log(f"[{name}] Mirror error: {e}")
+        log(f"[{name}] Mirror unavailable, cloning from network.")
+
+    use_branch = branch
+    for attempt in range(1, FETCH_ATTEMPTS + 1):
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+        args = ["git", "clone", "--progress", "--depth", "1", "--single-branch"]
+        if use_branch:
+            args.extend(["-b", use_branch])
+        args.extend([url, path])
+
+        log(f"[{name}] Cloning {url} ({use_branch or 'default branch'}), attempt {attempt}/{FETCH_ATTEMPTS}")
+        ok, err = _run_git(name, args, log)
+        if ok:
+            return True
+        if use_branch and "not found in upstream" in err:
+            log(f"[{name}] Branch '{use_branch}' does not exist upstream, falling back to the default branch.")
+            use_branch = None
+
+    if os.path.exists(path):
+        shutil.rmtree(path, ignore_errors=True)
+    return False
+
+def fetch_layers(layers, log, workers=FETCH_WORKERS, mirror_dir=None):
+    # layers: list of (name, url, branch, path). Returns the names that failed.
+    if not layers: return []
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(layers))) as pool:
+        futures = {pool.submit(clone_layer, name, url, branch, path, log, mirror_dir): name for name, url, branch, path in layers}
+        for future in as_completed(futures):
+            name = futures[future]
+            try: ok = future.result()
+            except Exception as e:
+                log(f"[{name}] Error: {e}")
+                ok = False
+            log(f"[{name}] {'Ready' if ok else 'FAILED'}")
+            if not ok: failed.append(name)
+    return failed
@@ -0,0 +1,242 @@
+import os
+import re
+import pwd
+import time
+import socket
+import sqlite3
+import threading
+import subprocess
+
+SOCKET_NAME = "hashserv.sock"
+DB_NAME = "hashserv.db"
+LOG_NAME = "hashserv.log"
+RESTART_DELAY = 5
+MAX_RESTARTS = 5
+
+def db_path(cache_dir):
+    return os.path.join(cache_dir, DB_NAME)
+
+def equivalent_count(path, taskhashes):
+    # How many of `taskhashes` the server maps to a different unihash, i.e.
+    # were satisfied by the output of an equivalent earlier task. None when
+    # the database cannot be read.
+    if not os.path.exists(path): return None
+    try:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    except sqlite3.Error:
+        return None
+    try:
+        # unihashes_v2 (kirkstone) or unihashes_v3 (scarthgap and later).
+        tables = [r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'unihashes_v%'")]
+        if not tables: return None
+        table = max(tables)
+        hashes = list(set(taskhashes))
+        count = 0
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            count += db.execute(f"SELECT COUNT(DISTINCT taskhash) FROM {table} WHERE taskhash != unihash "
+                                f"AND taskhash IN ({','.join('?' * len(chunk))})", chunk).fetchone()[0]
+        return count
+    except sqlite3.Error:
+        return None
+    finally:
+        db.close()
+
+def default_address(cache_dir):
+    return "unix://" + os.path.join(cache_dir, SOCKET_NAME)
+
+def normalize_address(bind, cache_dir):
+    bind = (bind or "").strip()
+    if not bind or bind == "unix":
+        return default_address(cache_dir)
+    return bind
+
+def is_listening(address, timeout=1.0):
+    try:
+        if address.startswith("unix://"):
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            target = address[len("unix://"):]
+        else:
+            host, _, port = address.rpartition(":")
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            target = (host or "localhost", int(port))
+        s.settimeout(timeout)
+        try:
+            s.connect(target)
+            return True
+        finally:
+            s.close()
+    except (OSError, ValueError):
+        return False
+
+def mirror_line(mirror):
+    mirror = (mirror or "").strip()
+    if not mirror: return None
+    if "://" not in mirror:
+        return f'SSTATE_MIRRORS ?= "file://.* file://{os.path.abspath(mirror)}/PATH"\n'
+    return f'SSTATE_MIRRORS ?= "file://.* {mirror.rstrip("/")}/PATH;downloadfilename=PATH"\n'
+
+def config_lines(address, mirror=None):
+    lines = []
+    if address:
+        lines.append(f'BB_HASHSERVE = "{address}"\n')
+        lines.append('BB_SIGNATURE_HANDLER = "OEEquivHash"\n')
+    line = mirror_line(mirror)
+    if line:
+        lines.append(line)
+    return lines
+
+def _log_tail(path, size=2048):
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - size))
+            lines = f.read().decode(errors="replace").strip().splitlines()
+        return lines[-1] if lines else ""
+    except OSError:
+        return ""
+
+class HashServer:
+    # Keeps one bitbake-hashserv alive for all workspaces so equivalent
+    # task outputs are recognised across builds, not just within one.
+    def __init__(self, cache_dir, user, log):
+        self.cache_dir = cache_dir
+        self.user = user
+        self.log = log
+        self.proc = None
+        self.address = None
+        self.log_file = None
+        self.stopping = False
+        self.lock = threading.Lock()
+
+    def is_running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def ensure_running(self, poky, address):
+        with self.lock:
+            if self.is_running() and self.address == address:
+                return True
+            if self.is_running():
+                self._stop_locked()
+            if is_listening(address):
+                self.log(f"Hash equivalence server already listening on {address}")
+                self.address = address
+                return True
+            server = os.path.join(poky, "bitbake", "bin", "bitbake-hashserv")
+            if not os.path.exists(server):
+                self.log(f"Hash equivalence server not found: {server}")
+                return False
+            self.address = address
+            self.stopping = False
+            return self._spawn_locked(server)
+
+    def _spawn_locked(self, server, restarts=0):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self.address.startswith("unix://"):
+            sock = self.address[len("unix://"):]
+            if os.path.exists(sock):
+                try: os.remove(sock)
+                except OSError: pass
+
+        self.log_file = os.path.join(self.cache_dir, LOG_NAME)
+        cmd = ["python3", server, "--bind", self.address, "--database", db_path(self.cache_dir), "--log", "WARNING"]
+        if self.user and os.geteuid() == 0:
+            cmd = ["sudo", "-H", "-u", self.user] + cmd
+            # The server runs as the user and creates its socket and DB here.
+            try:
+                pw = pwd.getpwnam(self.user)
+                open(self.log_file, "ab").close()
+                for path in (self.cache_dir, self.log_file):
+                    os.chown(path, pw.pw_uid, pw.pw_gid)
+            except (KeyError, OSError): pass
+        try:
+            # New session: a Ctrl-C or STOP sent to a build must not reach it.
+            with open(self.log_file, "ab") as err:
+                self.proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=err, start_new_session=True)
+        except OSError as e:
+            self.log(f"Could not start hash equivalence server: {e}")
+            self.proc = None
+            return False
+
+        for _ in range(50):
+            if is_listening(self.address, timeout=0.2): break
+            if self.proc.poll() is not None: break
+            time.sleep(0.1)
+
+        if self.proc.poll() is not None:
+            err = _log_tail(self.log_file)
+            self.log(f"Hash equivalence server exited: {err or self.proc.returncode}")
+            self.proc = None
+            return False
+
+        self.log(f"Hash equivalence server running on {self.address} (pid {self.proc.pid})")
+        threading.Thread(target=self._supervise, args=(self.proc, server, restarts), daemon=True).start()
+        return True
+
+    def _supervise(self, proc, server, restarts):
+        proc.wait()
+        err = _log_tail(self.log_file)
+        with self.lock:
+            if self.stopping or self.proc is not proc: return
+            self.log(f"Hash equivalence server died ({err or proc.returncode}).")
+            self.proc = None
+            if restarts >= MAX_RESTARTS:
+                self.log("Hash equivalence server keeps failing; giving up.")
+                return
+        time.sleep(RESTART_DELAY)
+        with self.lock:
+            if self.stopping or self.proc is not None: return
+            self.log(f"Restarting hash equivalence server ({restarts + 1}/{MAX_RESTARTS})...")
+            self._spawn_locked(server, restarts + 1)
+
+    def _stop_locked(self):
+        self.stopping = True
+        proc, self.proc = self.proc, None
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try: proc.wait(timeout=5)
+            except subprocess.TimeoutExpired: proc.kill()
+
+    def stop(self):
+        with self.lock:
+            self._stop_locked()
+
+class SstateSummary:
+    # Collects bitbake's reuse statistics from its console/log output.
+    def __init__(self):
+        self.sstate = None
+        self.tasks = None
+        # Task hashes of setscene tasks that completed (event mode only).
+        self.restored = []
+        self.equivalent = None
+
+    def feed_event(self, event):
+        if event.kind == "setscene_done" and event.data.get("taskhash"):
+            self.restored.append(event.data["taskhash"])
+
+    def resolve(self, path):
+        # Restored tasks whose hash the server remapped were skipped thanks
+        # to hash equivalence.
+        if self.restored:
+            self.equivalent = equivalent_count(path, self.restored)
+
+    def feed(self, line):
+        m = re.search(r'Sstate summary: Wanted (\d+) Local (\d+) Mirrors (\d+) Missed (\d+) Current (\d+)', line)
+        if m:
+            self.sstate = tuple(int(x) for x in m.groups())
+            return
+        m = re.search(r"Tasks Summary: Attempted (\d+) tasks of which (\d+) didn't need to be rerun", line)
+        if m:
+            self.tasks = (int(m.group(1)), int(m.group(2)))
+
+    def format(self):
+        parts = []
+        if self.sstate:
+            wanted, local, mirrors, missed, current = self.sstate
+            parts.append(f"sstate reused {local + mirrors}/{wanted} (local {local}, mirrors {mirrors}, missed {missed}, current {current})")
+        if self.tasks:
+            parts.append(f"{self.tasks[1]}/{self.tasks[0]} tasks skipped")
+        if self.equivalent is not None:
+            parts.append(f"{self.equivalent} skipped thanks to hash equivalence")
+        if not parts: return None
+        return "Build summary: " + ", ".join(parts)
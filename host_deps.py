@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import hashlib
+import subprocess
+
+HOST_PACKAGES = [
+    "gawk", "wget", "git", "diffstat", "unzip", "texinfo", "gcc", "build-essential",
+    "chrpath", "socat", "cpio", "python3", "python3-pip", "python3-pexpect",
+    "xz-utils", "debianutils", "iputils-ping", "python3-git", "python3-jinja2",
+    "libegl1", "libsdl1.2-dev", "pylint", "xterm", "zstd", "lz4", "file", "locales"
+]
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+
+def fingerprint(pkgs):
+    # Any apt/dpkg transaction rewrites the status file, so its mtime is
+    # enough to know whether a previous answer is still valid.
+    try: status_mtime = os.stat(DPKG_STATUS).st_mtime_ns
+    except OSError: status_mtime = 0
+    h = hashlib.sha256()
+    h.update("\n".join(sorted(pkgs)).encode())
+    h.update(str(status_mtime).encode())
+    return h.hexdigest()
+
+def load_cache(cache_file):
+    try:
+        with open(cache_file, "r") as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+def save_cache(cache_file, pkgs):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, "w") as f:
+        json.dump({"fingerprint": fingerprint(pkgs), "checked": time.time()}, f)
+
+def query_missing(pkgs):
+    # One dpkg-query call for the whole list; unknown names only go to stderr.
+    proc = subprocess.run(["dpkg-query", "-W", "-f=${Package}\t${db:Status-Abbrev}\n"] + list(pkgs),
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    installed = set()
+    for line in proc.stdout.splitlines():
+        name, _, status = line.partition("\t")
+        if status.startswith("ii"):
+            installed.add(name)
+    return [p for p in pkgs if p not in installed]
+
+def apt_install(pkgs, log):
+    env = os.environ.copy()
+    env["DEBIAN_FRONTEND"] = "noninteractive"
+    cmd_update = ["sudo", "apt-get", "update"]
+    cmd_install = ["sudo", "apt-get", "install", "-y"] + list(pkgs)
+
+    subprocess.run(cmd_update, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    proc = subprocess.run(cmd_install, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    if proc.returncode != 0 and "Could not get lock" in proc.stderr:
+        log("Apt locked. Retrying in 5s...")
+        time.sleep(5)
+        proc = subprocess.run(cmd_install, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    if proc.returncode != 0:
+        log("Warning: Failed to install dependencies.")
+        log(f"--- APT ERROR LOG ---\n{proc.stderr}\n---------------------")
+        return False
+    return True
+
+def ensure_packages(cache_file, log, pkgs=HOST_PACKAGES):
+    if load_cache(cache_file).get("fingerprint") == fingerprint(pkgs):
+        log("Host dependencies unchanged since last check.")
+        return True
+
+    missing = query_missing(pkgs)
+    if missing:
+        log(f"Installing missing host packages: {' '.join(missing)}")
+        if not apt_install(missing, log):
+            return False
+        missing = query_missing(missing)
+        if missing:
+            log(f"Warning: Packages still missing after apt-get: {' '.join(missing)}")
+            return False
+        log("Dependencies installed successfully.")
+    else:
+        log("All host dependencies are installed.")
+
+    save_cache(cache_file, pkgs)
+    return True
@@ -1,5 +1,8 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox
 import os
 import pwd
 import sys
@@ -13,14 +16,36 @@ import config_image
 import config_ota
 import config_rpi
 
+import bitbake_server
+import hashserv
+import manager_log
 import manager_setup
 import manager_build
-import manager_sdcard
-import update_yoctool
+import manager_queue
+import manager_prefetch
+
+# Time for the window manager to expose the freshly mapped window.
+FIRST_PAINT_DELAY_MS = 50
+
+class StartupTimer:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = STARTED
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self):
+        total = (self.last - STARTED) * 1000
+        return "Startup timing: " + ", ".join(f"{p} {ms:.0f} ms" for p, ms in self.phases) + f" (total {total:.0f} ms)"
 
 class YoctoolApp:
-    def __init__(self, root):
+    def __init__(self, root, timer=None):
         self.root = root
+        self.timer = timer or StartupTimer(False)
         
         self.APP_VERSION = self.get_version_from_filename()
         
@@ -30,12 +55,21 @@ class YoctoolApp:
         self.poky_path = tk.StringVar()
         self.build_dir_name = tk.StringVar(value="build")
         self.selected_drive = tk.StringVar()
+        self.log_max_lines = tk.IntVar(value=5000)
 
         self.sudo_user = self._detect_invoking_user()
         if os.geteuid() != 0:
             messagebox.showwarning("Permission Warning", "Please run with 'sudo' to allow flashing.")
         if not self.sudo_user:
             self.sudo_user = "root"
+        self.cache_dir = os.path.join(self._get_user_home(), ".cache", "yoctool")
+
+        self.mgr_log = manager_log.LogManager(self)
+        # Rarely used parts are imported when first needed, not at startup.
+        self.log_browser = None
+        self.failure_panel = None
+        self.hashserv = hashserv.HashServer(self.cache_dir, self.sudo_user, self.log)
+        self.bb_server = bitbake_server.ResidentServer(self.sudo_user, self.log)
 
         self.tab_rpi = config_rpi.RpiTab(self)
         self.board_managers = [self.tab_rpi]
@@ -48,18 +82,57 @@ class YoctoolApp:
         self.build_progress = tk.DoubleVar()
         self.build_progress_text = tk.StringVar(value="0%")
         self.build_progress.trace_add("write", self._update_progress_canvas)
+        self.build_progress_text.trace_add("write", self._update_progress_canvas)
+        self.pressure_text = tk.StringVar(value="")
+        self.prefetch_text = tk.StringVar(value="")
         
         self.config_file = os.path.expanduser("~/.yoctool_config")
 
         self.mgr_setup = manager_setup.SetupManager(self)
         self.mgr_build = manager_build.BuildManager(self)
-        self.mgr_sdcard = manager_sdcard.SDCardManager(self)
+        self.mgr_sdcard = None
+        self.mgr_queue = manager_queue.QueueManager(self)
+        self.mgr_cache = None
+        self.mgr_prefetch = manager_prefetch.PrefetchManager(self)
+
+        self.timer.mark("managers")
 
         self.create_menu()
         self.create_widgets()
-        
-        self.mgr_setup.load_saved_path()
+        self.mgr_log.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.timer.mark("widgets")
+
         self.log(f"Tool initialized. CPU Cores detected: {multiprocessing.cpu_count()}")
+        # Read the config only once the window is on screen. An idle callback
+        # could run before mainloop() maps the window, delaying first paint.
+        self.map_binding = self.root.bind("<Map>", self._on_first_map, add="+")
+
+    def _on_first_map(self, event):
+        # Child widgets' <Map> events also reach the root's binding.
+        if event.widget is not self.root or self.map_binding is None: return
+        self.root.unbind("<Map>", self.map_binding)
+        self.map_binding = None
+        self.root.after(FIRST_PAINT_DELAY_MS, self._after_first_paint)
+
+    def _after_first_paint(self):
+        # Draw whatever the expose left pending before the slow part.
+        self.root.update_idletasks()
+        self.timer.mark("first paint")
+        self.mgr_setup.load_saved_path()
+        self.timer.mark("load config")
+        if self.timer.enabled:
+            report = self.timer.report()
+            self.log(report)
+            print(report, file=sys.stderr)
+
+    def on_close(self):
+        # Nothing here may block the Tk thread for long: the prefetch and
+        # the bitbake servers are only told to stop.
+        self.mgr_prefetch.cancel(wait=False)
+        self.bb_server.stop_all()
+        self.hashserv.stop()
+        self.root.destroy()
 
     def _detect_invoking_user(self):
         sudo_user = os.environ.get("SUDO_USER")
@@ -75,6 +148,12 @@ class YoctoolApp:
 
         return os.environ.get("USER")
 
+    def _get_user_home(self):
+        try:
+            return pwd.getpwnam(self.sudo_user).pw_dir
+        except KeyError:
+            return os.path.expanduser("~")
+
     def get_version_from_filename(self):
         version = "v1.0.0"
         if getattr(sys, 'frozen', False):
@@ -95,8 +174,33 @@ class YoctoolApp:
         self.root.config(menu=menubar)
 
     def check_update(self):
+        import update_yoctool
         update_yoctool.check_for_update(self.root, self.APP_VERSION)
 
+    def get_sdcard_manager(self):
+        if self.mgr_sdcard is None:
+            import manager_sdcard
+            self.mgr_sdcard = manager_sdcard.SDCardManager(self)
+        return self.mgr_sdcard
+
+    def get_cache_manager(self):
+        if self.mgr_cache is None:
+            import manager_cache
+            self.mgr_cache = manager_cache.CacheManager(self)
+        return self.mgr_cache
+
+    def open_log_browser(self):
+        if self.log_browser is None:
+            import manager_logbrowser
+            self.log_browser = manager_logbrowser.LogBrowser(self)
+        self.log_browser.open()
+
+    def show_failures(self, results):
+        if self.failure_panel is None:
+            import manager_failures
+            self.failure_panel = manager_failures.FailurePanel(self)
+        self.failure_panel.show(results)
+
     def show_about(self):
         messagebox.showinfo("About", f"Yoctool\nVersion: {self.APP_VERSION}\nAuthor: Hungnt8687")
 
@@ -125,11 +229,13 @@ class YoctoolApp:
         notebook.pack(fill="both", expand=True, padx=5, pady=5)
         
         self.tab_general.create_tab(notebook)
-        self.tab_image.create_tab(notebook)
-        self.tab_ota.create_tab(notebook)
-        
-        for mgr in self.board_managers:
-            mgr.create_tab(notebook)
+
+        # The other tabs get an empty page now and their widgets on first select.
+        self.lazy_tabs = {}
+        for tab in [self.tab_image, self.tab_ota] + self.board_managers:
+            tab.create_tab(notebook)
+            self.lazy_tabs[str(tab.tab)] = tab
+        notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
         
         frame_cfg_btns = ttk.Frame(frame_config)
         frame_cfg_btns.pack(pady=10)
@@ -141,6 +247,10 @@ class YoctoolApp:
         
         self.update_ui_visibility()
 
+    def _on_tab_changed(self, event):
+        tab = self.lazy_tabs.pop(event.widget.select(), None)
+        if tab: tab.build_tab()
+
     def update_ui_visibility(self, event=None):
         for mgr in self.board_managers:
             is_supported = mgr.is_current_machine_supported()
@@ -165,10 +275,16 @@ class YoctoolApp:
         
         self.btn_build = ttk.Button(f_build_btns, text="START BUILD", command=self.mgr_build.start_build_thread)
         self.btn_build.pack(side="left", padx=10)
+        self.btn_stop = ttk.Button(f_build_btns, text="STOP", command=self.mgr_build.stop_build, state="disabled")
+        self.btn_stop.pack(side="left", padx=10)
         self.btn_clean = ttk.Button(f_build_btns, text="CLEAN BUILD", command=self.mgr_build.start_clean_thread)
         self.btn_clean.pack(side="left", padx=10)
         self.btn_clear_cache = ttk.Button(f_build_btns, text="CLEAR CACHE", command=self.mgr_build.start_clear_cache_thread)
         self.btn_clear_cache.pack(side="left", padx=10)
+        self.btn_prune = ttk.Button(f_build_btns, text="PRUNE CACHE", command=lambda: self.get_cache_manager().start_prune_thread())
+        self.btn_prune.pack(side="left", padx=10)
+
+        self.mgr_queue.create_panel(frame_build)
 
         frame_flash = ttk.LabelFrame(frame_top, text=" 4. SD Card ")
         frame_flash.pack(side="left", fill="both", expand=True, padx=(5, 0))
@@ -178,12 +294,12 @@ class YoctoolApp:
         self.drive_menu = ttk.Combobox(f_flash_ctrl, textvariable=self.selected_drive, width=15, state="readonly")
         self.drive_menu.pack(side="left", padx=5, fill="x", expand=True)
         
-        ttk.Button(f_flash_ctrl, text="↻", width=3, command=self.mgr_sdcard.scan_drives).pack(side="left", padx=2)
+        ttk.Button(f_flash_ctrl, text="↻", width=3, command=lambda: self.get_sdcard_manager().scan_drives()).pack(side="left", padx=2)
         
-        self.btn_format = ttk.Button(f_flash_ctrl, text="FORMAT", command=self.mgr_sdcard.format_drive)
+        self.btn_format = ttk.Button(f_flash_ctrl, text="FORMAT", command=lambda: self.get_sdcard_manager().format_drive())
         self.btn_format.pack(side="left", padx=5)
         
-        self.btn_flash = ttk.Button(f_flash_ctrl, text="FLASH", command=self.mgr_sdcard.flash_image)
+        self.btn_flash = ttk.Button(f_flash_ctrl, text="FLASH", command=lambda: self.get_sdcard_manager().flash_image())
         self.btn_flash.pack(side="left", padx=5)
 
         frame_progress = ttk.Frame(frame_ops)
@@ -193,6 +309,8 @@ class YoctoolApp:
         self.pb_rect = self.pb_canvas.create_rectangle(0, 0, 0, 25, fill="#4CAF50", outline="")
         self.pb_text = self.pb_canvas.create_text(0, 12, text="0%", font=("Arial", 10, "bold"), fill="black")
         self.pb_canvas.bind("<Configure>", lambda e: self._update_progress_canvas())
+        ttk.Label(frame_progress, textvariable=self.pressure_text, font=("Arial", 8), foreground="gray").pack(anchor="w")
+        ttk.Label(frame_progress, textvariable=self.prefetch_text, font=("Arial", 8), foreground="gray").pack(anchor="w")
 
     def _update_progress_canvas(self, *args):
         try:
@@ -202,30 +320,33 @@ class YoctoolApp:
             if canvas_width <= 1: canvas_width = 400
             bar_width = (canvas_width * percent) / 100
             self.pb_canvas.coords(self.pb_rect, 0, 0, bar_width, 25)
-            self.pb_canvas.itemconfig(self.pb_text, text=f"{int(percent)}%")
+            self.pb_canvas.itemconfig(self.pb_text, text=self.build_progress_text.get() or f"{int(percent)}%")
             self.pb_canvas.coords(self.pb_text, canvas_width / 2, 12)
         except: pass
 
     def _setup_log_section(self):
         frame_log = ttk.LabelFrame(self.root, text=" 5. Terminal Output ")
         frame_log.pack(fill="both", expand=True, padx=10, pady=5)
-        self.log_area = scrolledtext.ScrolledText(frame_log, height=12, bg="black", fg="white", font=("Courier New", 10))
-        self.log_area.pack(fill="both", expand=True, padx=5, pady=5)
+        f_log_opts = ttk.Frame(frame_log)
+        f_log_opts.pack(fill="x", padx=5)
+        ttk.Spinbox(f_log_opts, from_=1000, to=100000, increment=1000, textvariable=self.log_max_lines, width=8).pack(side="right")
+        ttk.Label(f_log_opts, text="Scrollback lines:").pack(side="right", padx=(0, 5))
+        ttk.Button(f_log_opts, text="LOGS", command=self.open_log_browser).pack(side="left")
 
-    def log(self, msg):
-        self.root.after(0, self._log_safe, msg)
+        self.terminal = manager_log.TerminalView(frame_log, max_lines=self.log_max_lines.get(), height=12, bg="black", fg="white", font=("Courier New", 10))
+        self.terminal.pack(fill="both", expand=True, padx=5, pady=5)
+        self.log_area = self.terminal.text
+        self.log_max_lines.trace_add("write", self._update_log_limit)
+
+    def _update_log_limit(self, *args):
+        try: self.terminal.set_max_lines(self.log_max_lines.get())
+        except tk.TclError: pass
 
-    def _log_safe(self, msg):
-        self.log_area.insert(tk.END, msg + "\n")
-        self.log_area.see(tk.END)
+    def log(self, msg):
+        self.mgr_log.write(msg)
     
     def log_overwrite(self, msg):
-        self.root.after(0, self._log_overwrite_safe, msg)
-    
-    def _log_overwrite_safe(self, msg):
-        self.log_area.delete("end-2l", "end-1l")
-        self.log_area.insert(tk.END, msg + "\n")
-        self.log_area.see(tk.END)
+        self.mgr_log.overwrite(msg)
 
     def set_busy_state(self, busy):
         state = "disabled" if busy else "normal"
@@ -233,10 +354,13 @@ class YoctoolApp:
         self.btn_clean.config(state=state)
         if hasattr(self, 'btn_clear_cache'):
             self.btn_clear_cache.config(state=state)
+        if hasattr(self, 'btn_prune'):
+            self.btn_prune.config(state=state)
         self.btn_format.config(state=state)
         self.btn_flash.config(state=state)
         self.btn_load.config(state=state)
         self.btn_save.config(state=state)
+        self.btn_stop.config(state="normal" if busy else "disabled")
 
 def relaunch_with_pkexec():
     env_args = []
@@ -279,6 +403,9 @@ if __name__ == "__main__":
             relaunch_with_pkexec()
         sys.exit(0)
 
+    timer = StartupTimer("--startup-timing" in sys.argv[1:])
+    timer.mark("imports")
     root = tk.Tk()
-    app = YoctoolApp(root)
+    timer.mark("tk init")
+    app = YoctoolApp(root, timer)
     root.mainloop()
@@ -1,185 +1,251 @@
-import subprocess
 import threading
 import os
-import shlex
-import re
 import time
+import signal
 from tkinter import messagebox
 
+import bitbake_server
+import build_session
+import buildstats
+import confgen
+import pressure
+import scratch
+
+# STOP escalation. The first SIGINT lets running tasks finish (and write
+# their sstate); the second makes bitbake kill them; then the process group
+# and the server get SIGTERM and finally SIGKILL. Pressing STOP again skips
+# to the next step.
+GRACEFUL_TIMEOUT = 600
+FORCE_TIMEOUT = 60
+TERM_TIMEOUT = 15
+
 class BuildManager:
     def __init__(self, app):
         self.app = app
+        self.proc = None
+        self.proc_lock = threading.Lock()
+        self.stop_requested = threading.Event()
+        self.escalate = threading.Event()
+        self.stopper = None
 
     def start_build_thread(self):
         if not self.app.poky_path.get(): return
-        self.app.set_busy_state(True)
-        threading.Thread(target=self.run_build).start()
+        self.app.mgr_queue.add_job("image", self.app.tab_general.image_var.get())
+        self.app.mgr_queue.start()
 
     def start_clean_thread(self):
         if not self.app.poky_path.get(): return
         if messagebox.askyesno("Confirm", "Clean build (cleanall)? This removes the working directory, shared state cache, and downloaded sources for this image."):
-            self.app.set_busy_state(True)
-            threading.Thread(target=self.run_clean).start()
+            self.app.mgr_queue.add_job("clean", self.app.tab_general.image_var.get())
+            self.app.mgr_queue.start()
 
     def start_clear_cache_thread(self):
         if not self.app.poky_path.get(): return
-        if messagebox.askyesno("Confirm", "Clear global cache (tmp, sstate-cache, cache)?\n\nThis will force a full rebuild, but keeps your downloaded sources intact."):
+        if self.app.tab_general.sstate_dir_var.get().strip():
+            msg = "Clear build cache (tmp, cache)?\n\nThe shared SSTATE_DIR and downloaded sources are kept, so most tasks will be restored from sstate."
+        else:
+            msg = "Clear global cache (tmp, sstate-cache, cache)?\n\nThis will force a full rebuild, but keeps your downloaded sources intact."
+        if messagebox.askyesno("Confirm", msg):
+            self.stop_requested.clear()
             self.app.set_busy_state(True)
             threading.Thread(target=self.run_clear_cache).start()
 
     def start_specific_build(self, target):
         if not self.app.poky_path.get(): return
-        self.app.set_busy_state(True)
-        threading.Thread(target=self.run_build, args=(target,)).start()
-
-    def install_dependencies(self):
-        self.app.log("Checking and installing host dependencies...")
-        
-        pkgs = [
-            "gawk", "wget", "git", "diffstat", "unzip", "texinfo", "gcc", "build-essential",
-            "chrpath", "socat", "cpio", "python3", "python3-pip", "python3-pexpect",
-            "xz-utils", "debianutils", "iputils-ping", "python3-git", "python3-jinja2",
-            "libegl1", "libsdl1.2-dev", "pylint", "xterm", "zstd", "lz4", "file", "locales"
-        ]
-        
-        cmd_update = ["sudo", "apt-get", "update"]
-        cmd_install = ["sudo", "apt-get", "install", "-y"] + pkgs
-        
-        env = os.environ.copy()
-        env["DEBIAN_FRONTEND"] = "noninteractive"
-        
-        try:
-            subprocess.run(cmd_update, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-            
-            proc = subprocess.run(cmd_install, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-            
-            if proc.returncode != 0:
-                if "Could not get lock" in proc.stderr:
-                    self.app.log("Apt locked. Retrying in 5s...")
-                    time.sleep(5)
-                    proc = subprocess.run(cmd_install, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-
-            if proc.returncode != 0:
-                self.app.log("Warning: Failed to install dependencies.")
-                self.app.log(f"--- APT ERROR LOG ---\n{proc.stderr}\n---------------------")
-            else:
-                self.app.log("Dependencies installed successfully.")
+        self.app.mgr_queue.add_job("bundle" if target == "update-bundle" else "image", target)
+        self.app.mgr_queue.start()
 
-        except Exception as e:
-             self.app.log(f"Critical Error executing apt-get: {e}")
+    def session(self):
+        return build_session.BuildSession(self.app.poky_path.get(), self.app.build_dir_name.get(), self.app.sudo_user,
+                                          self.app.cache_dir, self.app.log, self.app.hashserv, self.app.bb_server)
 
-    def check_and_download_layers(self):
-        poky = self.app.poky_path.get()
-        if not poky or not os.path.isdir(poky): return
-
-        try:
-            branch = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=poky, text=True).strip()
-            if branch == "HEAD": branch = "scarthgap"
-        except: branch = "scarthgap"
-        self.app.log(f"Detected Poky branch: {branch}")
-
-        required_layers = []
-        if self.app.active_manager:
-            required_layers.extend(self.app.active_manager.get_required_layers())
-            
-        if hasattr(self.app.tab_ota, 'get_required_layers'):
-             required_layers.extend(self.app.tab_ota.get_required_layers())
-
-        for name, url_info in required_layers:
-            path = os.path.join(poky, name)
-            if not os.path.exists(path):
-                self.app.log(f"Missing layer {name}. Cloning...")
-                
-                clone_args = ["git", "clone", "--progress"]
-                target_branch = branch
-                
-                parts = url_info.split()
-                actual_url = parts[0]
-                
-                if "-b" in parts:
-                    try:
-                        idx = parts.index("-b")
-                        if idx + 1 < len(parts):
-                            target_branch = parts[idx+1]
-                    except: pass
-                
-                clone_args.extend(["-b", target_branch, actual_url, path])
-                
-                self.app.log(f"Running: {' '.join(clone_args)}")
-                success = self.app.mgr_setup.exec_stream_cmd(clone_args)
-                
-                if not success:
-                    self.app.log(f"Failed to clone {name} ({target_branch}). Retrying without branch...")
-                    self.app.mgr_setup.exec_stream_cmd(["git", "clone", "--progress", actual_url, path])
-
-        self.app.log("Layer check complete.")
-
-    def run_build(self, target=None):
+    def run_build(self, target=None, notify=True):
+        own_run = self.app.mgr_log.begin_run(f"build {target or self.app.tab_general.image_var.get()}")
+        ok = False
         try:
-            self.install_dependencies()
-
-            poky_path = self.app.poky_path.get()
-            user = self.app.sudo_user
-            if poky_path and user:
-                subprocess.run(["chown", "-R", f"{user}:{user}", poky_path], check=False)
-
-            self.app.mgr_setup.regenerate_bblayers()
-            self.check_and_download_layers()
-            
-            build_target = target if target else self.app.tab_general.image_var.get()
-            self.app.log(f"Building {build_target}...")
-            
-            cmd = f"bitbake {build_target}"
-                
-            self.exec_user_cmd(cmd)
+            ok = self._run_build(target, notify)
+            return ok
         finally:
-            self.app.root.after(0, self.app.set_busy_state, False)
-
-    def run_clean(self):
+            if own_run: self.app.mgr_log.end_run(ok)
+
+    def _run_build(self, target, notify):
+        # A prefetch may still be cloning layers or running bitbake in this
+        # build directory; let it finish before touching either.
+        self.app.mgr_prefetch.wait_idle()
+        session = self.session()
+        profile = self.app.mgr_setup.get_profile()
+        general = profile["general"]
+        session.prepare(profile)
+        ok, result = session.build(general, target or general["image"],
+                                   lambda cmd, events: self.exec_user_cmd(cmd, events, notify))
+        if result:
+            self.app.log(buildstats.format_summary(result))
+        return ok
+
+    def run_clean(self, target=None, notify=True):
+        own_run = self.app.mgr_log.begin_run(f"cleanall {target or self.app.tab_general.image_var.get()}")
+        ok = False
         try:
-            self.install_dependencies()
+            session = self.session()
+            general = self.app.tab_general.get_state()
+            session.install_dependencies()
             self.app.log("Cleaning build (cleanall)...")
-            self.exec_user_cmd(f"bitbake -c cleanall {self.app.tab_general.image_var.get()}")
+            targets = confgen.expand_targets(general, target or general["image"])
+            cmd, events = session.bitbake_command(general, targets, "cleanall")
+            ok = self.exec_user_cmd(cmd, events, notify)
+            return ok
         finally:
-            self.app.root.after(0, self.app.set_busy_state, False)
+            if own_run: self.app.mgr_log.end_run(ok)
 
     def run_clear_cache(self):
         try:
-            self.app.log("Clearing global Yocto cache (tmp, sstate-cache, cache)...")
-            self.exec_user_cmd("rm -rf tmp sstate-cache cache")
+            # The resident server keeps tmp/cache open; stop it before wiping.
+            self.app.mgr_prefetch.cancel()
+            self.app.bb_server.stop(self.app.poky_path.get(), self.app.build_dir_name.get())
+            self.session().make_scratch().unmount()
+            if self.app.tab_general.sstate_dir_var.get().strip():
+                # Never wipe a shared SSTATE_DIR: other workspaces rely on it.
+                self.app.log("Clearing build cache (tmp, cache); shared SSTATE_DIR kept...")
+                self.exec_user_cmd(f"rm -rf tmp {scratch.TMPDIR_NAME} cache")
+            else:
+                self.app.log("Clearing global Yocto cache (tmp, sstate-cache, cache)...")
+                self.exec_user_cmd(f"rm -rf tmp {scratch.TMPDIR_NAME} sstate-cache cache")
         finally:
             self.app.root.after(0, self.app.set_busy_state, False)
 
-    def exec_user_cmd(self, cmd):
-        safe_poky = shlex.quote(self.app.poky_path.get())
-        safe_build = shlex.quote(self.app.build_dir_name.get())
-        safe_user = shlex.quote(self.app.sudo_user)
-        full_cmd = f"sudo -H -u {safe_user} bash -lc 'cd {safe_poky} && source oe-init-build-env {safe_build} && {cmd}'"
-        
+    def stop_build(self):
+        self.stop_requested.set()
+        self.app.mgr_prefetch.cancel_async()
+        with self.proc_lock:
+            proc = self.proc
+            if self.stopper and self.stopper.is_alive():
+                self.app.log("STOP pressed again: escalating.")
+                self.escalate.set()
+                return
+            if proc is None or proc.poll() is not None:
+                self.app.log("Stop requested; no further jobs will start.")
+                return
+            self.escalate.clear()
+            self.stopper = threading.Thread(target=self._stop_worker, args=(proc,), daemon=True)
+            self.stopper.start()
+
+    def _stop_worker(self, proc):
+        build_path = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+
+        def interrupt():
+            # Only the bitbake client gets SIGINT: sudo would relay a signal
+            # sent to the whole group, and bitbake treats a second SIGINT as
+            # "kill the running tasks".
+            bitbake_server.signal_pids(bitbake_server.client_pids(bitbake_server.alive(tracked)), signal.SIGINT)
+
+        def group_and_server(sig):
+            def send():
+                pids = []
+                pid = bitbake_server.server_pid(build_path)
+                if pid and bitbake_server.is_running(build_path):
+                    pids = bitbake_server.process_tree(pid)
+                try: os.killpg(proc.pid, sig)
+                except OSError: pass
+                bitbake_server.signal_pids(pids + bitbake_server.alive(tracked), sig)
+            return send
+
+        stages = [
+            ("Stopping: waiting for running tasks to finish (press STOP again to force)...", interrupt, GRACEFUL_TIMEOUT),
+            ("Stopping: asking bitbake to terminate running tasks...", interrupt, FORCE_TIMEOUT),
+            ("Stopping: sending SIGTERM to bitbake...", group_and_server(signal.SIGTERM), TERM_TIMEOUT),
+            ("Stopping: sending SIGKILL to bitbake...", group_and_server(signal.SIGKILL), TERM_TIMEOUT),
+        ]
+        # The shell may exit before bitbake does; track the whole tree.
+        tracked = set(bitbake_server.process_tree(proc.pid))
+
+        def running():
+            tracked.update(bitbake_server.process_tree(proc.pid) if proc.poll() is None else [])
+            return proc.poll() is None or bitbake_server.alive(tracked)
+
+        for text, action, timeout in stages:
+            if not running(): break
+            self.app.log(text)
+            self.app.root.after(0, self.app.build_progress_text.set, text.split(":")[0])
+            self.escalate.clear()
+            action()
+            deadline = time.time() + timeout
+            while running() and time.time() < deadline and not self.escalate.is_set():
+                self.escalate.wait(0.5)
+
+    def _finish_stop(self, proc):
+        if self.stopper:
+            self.stopper.join()
+        build_path = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+        removed = bitbake_server.clear_stale_lock(build_path)
+        if removed:
+            self.app.log(f"Removed stale {' and '.join(removed)}.")
+        self.app.log(f"Build stopped (exit code {proc.returncode}).")
+        self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#FF9800"))
+        self.app.root.after(0, self.app.build_progress_text.set, "Stopped")
+
+    def exec_user_cmd(self, cmd, events=False, notify=True):
+        own_run = self.app.mgr_log.begin_run(cmd, cmd)
+        ok = False
+        try:
+            ok = self._exec_user_cmd(cmd, events, notify)
+            return ok
+        finally:
+            if own_run: self.app.mgr_log.end_run(ok)
+
+    def _exec_user_cmd(self, cmd, events, notify):
+        self.app.mgr_prefetch.wait_idle()
+        if self.stop_requested.is_set():
+            return False
+        session = self.session()
+        general = self.app.tab_general.get_state()
+
         self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#4CAF50"))
-        
-        proc = subprocess.Popen(full_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-        self.app.root.after(0, self.app.build_progress.set, 0)
-        self.app.root.after(0, self.app.build_progress_text.set, "0%")
-        
-        while True:
-            line = proc.stdout.readline()
-            if not line and proc.poll() is not None: break
-            if line:
-                self.app.log(line.strip())
-                m = re.search(r'Running task (\d+) of (\d+)', line)
-                if m:
-                    current = int(m.group(1))
-                    total = int(m.group(2))
-                    if total > 0:
-                        percent = (current / total) * 100
-                        self.app.root.after(0, self.app.build_progress.set, percent)
-                        self.app.root.after(0, self.app.build_progress_text.set, f"{int(percent)}%")
-                
+
+        def on_start(proc):
+            with self.proc_lock:
+                self.proc = proc
+                if self.stop_requested.is_set() and not (self.stopper and self.stopper.is_alive()):
+                    self.escalate.clear()
+                    self.stopper = threading.Thread(target=self._stop_worker, args=(proc,), daemon=True)
+                    self.stopper.start()
+            self._set_progress(0, "0%")
+
+        log_stats = self.app.mgr_log.get_stats()
+        monitor = pressure.PressureMonitor(lambda rates, text: self.app.root.after(0, self.app.pressure_text.set, text))
+        monitor.start()
+
+        output = build_session.BuildOutput(events, self.app.log, self._set_progress)
+        # A session of its own, so STOP can signal the whole tree.
+        proc = session.run(general, cmd, output, on_start, new_session=True)
+        with self.proc_lock:
+            self.proc = None
+
+        monitor.stop()
+        self.app.root.after(0, self.app.pressure_text.set, "")
+        self.app.mgr_log.report(log_stats)
+        text = output.summary.format()
+        if text: self.app.log(text)
+
+        if self.stop_requested.is_set() and proc.returncode != 0:
+            self._finish_stop(proc)
+            return False
+        if proc.returncode != 0 and output.failures.failures:
+            self.report_failures(session, general, output.failures.failures)
         if proc.returncode == 0: 
             self.app.root.after(0, self.app.build_progress.set, 100)
             self.app.root.after(0, self.app.build_progress_text.set, "100%") 
-            self.app.root.after(0, messagebox.showinfo, "Success", "Done!")
+            if notify: self.app.root.after(0, messagebox.showinfo, "Success", "Done!")
         else: 
             self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#FF0000"))
-            self.app.root.after(0, messagebox.showerror, "Error", "Failed!")
+            if notify: self.app.root.after(0, messagebox.showerror, "Error", "Failed!")
+        return proc.returncode == 0
+
+    def report_failures(self, session, general, failures):
+        results = session.failure_details(general, failures)
+        for r in results:
+            self.app.log(f"Failed task: {r['recipe']}:{r['task']} (log: {r['logfile'] or 'not found'})")
+        self.app.root.after(0, self.app.show_failures, results)
+
+    def _set_progress(self, percent, text):
+        self.app.root.after(0, self.app.build_progress.set, percent)
+        self.app.root.after(0, self.app.build_progress_text.set, text)
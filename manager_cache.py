@@ -0,0 +1,95 @@
+import os
+import threading
+from tkinter import messagebox
+
+import cache_prune
+
+class CacheManager:
+    def __init__(self, app):
+        self.app = app
+        self.index_file = os.path.join(app.cache_dir, "cache-index.sqlite")
+
+    def get_build_path(self):
+        return os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+
+    def get_cache_roots(self):
+        # (path, recursive): only top-level download files are pruned; git2/
+        # and other fetcher trees are left alone.
+        build = self.get_build_path()
+        tab = self.app.tab_general
+        return [(tab.get_sstate_dir(build), True), (tab.get_dl_dir(build), False)]
+
+    def start_prune_thread(self):
+        if not self.app.poky_path.get(): return
+        self.app.mgr_build.stop_requested.clear()
+        self.app.set_busy_state(True)
+        threading.Thread(target=self.run_prune_plan, daemon=True).start()
+
+    def get_protected_hashes(self):
+        targets = self.app.tab_general.expand_targets(self.app.tab_general.image_var.get())
+        self.app.log(f"Computing task signatures of {targets} (bitbake -S none)...")
+        if not self.app.mgr_build.exec_user_cmd(f"bitbake -S none {targets}", notify=False):
+            return None
+        hashes = cache_prune.parse_locked_sigs(os.path.join(self.get_build_path(), "locked-sigs.inc"))
+        self.app.log(f"Protecting {len(hashes)} task signatures.")
+        return hashes
+
+    def run_prune_plan(self):
+        plan = None
+        report = ""
+        try:
+            budget = int(self.app.tab_general.cache_budget_var.get() * 1024 ** 3)
+            protected = set()
+            if self.app.tab_general.cache_protect_var.get():
+                protected = self.get_protected_hashes()
+                if protected is None:
+                    self.app.log("Could not compute task signatures; not pruning.")
+                    self.app.root.after(0, messagebox.showerror, "Error", "Could not compute the current image's task signatures.\nFix the build or disable protection to prune.")
+                    return
+
+            self.app.log("Updating cache index...")
+            index = cache_prune.CacheIndex(self.index_file)
+            try:
+                for root, recursive in self.get_cache_roots():
+                    stats = index.update(root, recursive)
+                    self.app.log(f"  {root}: {stats['scanned']} dirs rescanned, {stats['skipped']} unchanged")
+                plan = index.plan([r for r, _ in self.get_cache_roots()], budget, protected)
+            finally:
+                index.close()
+
+            report = cache_prune.format_report(plan)
+            self.app.log(report)
+        except Exception as e:
+            self.app.log(f"Cache prune error: {e}")
+        finally:
+            self.app.mgr_setup.fix_cache_ownership(self.index_file)
+            self.app.root.after(0, self.app.set_busy_state, False)
+
+        if plan and plan["evict"]:
+            self.app.root.after(0, self.confirm_prune, plan, report)
+        elif plan:
+            self.app.root.after(0, messagebox.showinfo, "Cache", report)
+
+    def confirm_prune(self, plan, report):
+        if not messagebox.askyesno("Confirm Prune", report + "\n\nRemove these files now?"):
+            self.app.log("Prune cancelled (dry run only).")
+            return
+        self.app.set_busy_state(True)
+        threading.Thread(target=self.run_prune, args=(plan,), daemon=True).start()
+
+    def run_prune(self, plan):
+        try:
+            index = cache_prune.CacheIndex(self.index_file)
+            try:
+                result = index.prune(plan, self.app.log)
+            finally:
+                index.close()
+            msg = f"Pruned {result['removed']} files, freed {cache_prune.format_size(result['freed'])}."
+            if result["recent"]:
+                msg += f" Kept {result['recent']} files used since the scan."
+            self.app.log(msg)
+            self.app.root.after(0, messagebox.showinfo, "Success", msg)
+        except Exception as e:
+            self.app.log(f"Cache prune error: {e}")
+        finally:
+            self.app.root.after(0, self.app.set_busy_state, False)
@@ -0,0 +1,57 @@
+import tkinter as tk
+from tkinter import ttk, scrolledtext
+
+class FailurePanel:
+    def __init__(self, app):
+        self.app = app
+        self.top = None
+        self.results = []
+
+    def show(self, results):
+        self.results = results
+        if self.top is None or not self.top.winfo_exists():
+            self._build()
+        self.top.deiconify()
+        self.top.lift()
+        self.tree.delete(*self.tree.get_children())
+        for i, r in enumerate(results):
+            size = f"{r['size'] / 1024:.0f} KB" if r["size"] else ""
+            self.tree.insert("", "end", iid=str(i), values=(r["recipe"], r["task"], size))
+        if results:
+            self.tree.selection_set("0")
+
+    def _build(self):
+        self.top = tk.Toplevel(self.app.root)
+        self.top.title("Failed Tasks")
+        self.top.geometry("900x550")
+
+        self.tree = ttk.Treeview(self.top, columns=("recipe", "task", "size"), show="headings", height=5)
+        for col, text, width in (("recipe", "Recipe", 300), ("task", "Task", 200), ("size", "Log Size", 100)):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, stretch=(col == "recipe"))
+        self.tree.pack(fill="x", padx=10, pady=(10, 5))
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+
+        self.path_var = tk.StringVar()
+        ttk.Entry(self.top, textvariable=self.path_var, state="readonly").pack(fill="x", padx=10)
+
+        self.text = scrolledtext.ScrolledText(self.top, bg="black", fg="white", font=("Courier New", 10))
+        self.text.pack(fill="both", expand=True, padx=10, pady=(5, 10))
+        self.text.tag_configure("error", foreground="#ff6b6b")
+
+    def on_select(self, event=None):
+        sel = self.tree.selection()
+        if not sel: return
+        r = self.results[int(sel[0])]
+        self.path_var.set(r["logfile"] or "")
+        self.text.configure(state="normal")
+        self.text.delete("1.0", tk.END)
+        if r["error"]:
+            self.text.insert(tk.END, f"({r['error']})\n", "error")
+        elif r["size"] > sum(len(l) + 1 for l in r["lines"]):
+            self.text.insert(tk.END, f"... last {len(r['lines'])} lines of {r['size'] / 1024:.0f} KB ...\n")
+        for line in r["lines"]:
+            tag = "error" if "error" in line.lower() else ""
+            self.text.insert(tk.END, line + "\n", tag)
+        self.text.see(tk.END)
+        self.text.configure(state="disabled")
@@ -0,0 +1,225 @@
+import os
+import threading
+import collections
+import tempfile
+from array import array
+import tkinter as tk
+from tkinter import scrolledtext
+
+class LogManager:
+    FLUSH_INTERVAL_MS = 75
+    MAX_PENDING_LINES = 20000
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        # Each entry is (replace_last, text). Only the head of a batch can have
+        # replace_last set: it means "overwrite the last line already on screen".
+        self.pending = collections.deque()
+        self.flush_job = None
+
+        self.dropped = 0
+        self.total_lines = 0
+        self.total_dropped = 0
+        self.total_merged = 0
+
+        self.log_dir = os.path.join(app.cache_dir, "logs")
+        self.run = None
+
+    def start(self):
+        if self.flush_job is None:
+            self.flush_job = self.app.root.after(self.FLUSH_INTERVAL_MS, self._flush)
+
+    def stop(self):
+        if self.flush_job is not None:
+            try: self.app.root.after_cancel(self.flush_job)
+            except: pass
+            self.flush_job = None
+
+    def write(self, msg):
+        with self.lock:
+            self._append(False, msg)
+            if self.run:
+                self._write_run(msg)
+
+    def _write_run(self, msg):
+        try:
+            self.run.write(msg)
+        except (OSError, ValueError):
+            self.run = None
+
+    def begin_run(self, label, cmd=None):
+        # Returns False when a run is already being recorded (nested calls
+        # end up in the outer run's file).
+        with self.lock:
+            if self.run: return False
+            import runlog
+            try:
+                self.run = runlog.RunLog(self.log_dir, label, cmd)
+            except OSError:
+                return False
+        return True
+
+    def end_run(self, ok):
+        with self.lock:
+            run, self.run = self.run, None
+        if run is None: return
+        try:
+            run.close(ok)
+        except (OSError, ValueError):
+            pass
+        self.app.mgr_setup.fix_cache_ownership(run.path, run.index_path)
+
+    def overwrite(self, msg):
+        with self.lock:
+            if self.pending:
+                # Progress line replacing one that never reached the screen.
+                self.pending[-1] = (self.pending[-1][0], msg)
+                self.total_merged += 1
+            else:
+                self._append(True, msg)
+
+    def _append(self, replace_last, msg):
+        if len(self.pending) >= self.MAX_PENDING_LINES:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append((replace_last, msg))
+        self.total_lines += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "lines": self.total_lines,
+                "merged": self.total_merged,
+                "dropped": self.total_dropped + self.dropped,
+                "pending": len(self.pending),
+            }
+
+    def report(self, since=None):
+        # `since` is a get_stats() snapshot taken when the command started.
+        stats = self.get_stats()
+        if since:
+            stats = {k: stats[k] - since[k] for k in ("lines", "merged", "dropped")}
+        if stats["merged"] or stats["dropped"]:
+            self.write(f"[log] {stats['lines']} lines received, {stats['merged']} merged, {stats['dropped']} dropped under backpressure")
+
+    def _flush(self):
+        self.flush_job = None
+        with self.lock:
+            batch = self.pending
+            self.pending = collections.deque()
+            dropped = self.dropped
+            self.total_dropped += dropped
+            self.dropped = 0
+
+        try:
+            if batch or dropped:
+                lines = [msg for _, msg in batch]
+                if dropped:
+                    lines.insert(0, f"[log] {dropped} lines dropped under backpressure")
+                self._render(batch[0][0] if batch and not dropped else False, lines)
+        finally:
+            self.start()
+
+    def _render(self, replace_last, lines):
+        terminal = getattr(self.app, "terminal", None)
+        if terminal is None: return
+        terminal.append(lines, replace_last)
+
+
+class TerminalView:
+    SPILL_CHUNK = 256
+    PAGE_LINES = 500
+
+    def __init__(self, parent, max_lines=5000, **kwargs):
+        self.text = scrolledtext.ScrolledText(parent, **kwargs)
+        self.text.configure(yscrollcommand=self._on_yscroll)
+
+        self.max_lines = max_lines
+        self.line_count = 0
+        # Global index of the first line shown in the widget. Lines before it
+        # live in the spill file and are paged back in when scrolled to.
+        self.top_index = 0
+        self.spilled = 0
+        self.spill = None
+        self.spill_size = 0
+        self.spill_chunks = array('Q')
+        self.paging = False
+
+    def pack(self, **kwargs):
+        self.text.pack(**kwargs)
+
+    def set_max_lines(self, max_lines):
+        try: self.max_lines = max(100, int(max_lines))
+        except (TypeError, ValueError): return
+
+    def is_following(self):
+        return self.text.yview()[1] >= 0.999
+
+    def append(self, lines, replace_last=False):
+        following = self.is_following()
+        if replace_last and self.line_count:
+            self.text.delete("end-2l", "end-1l")
+            self.line_count -= 1
+        text = "\n".join(lines)
+        self.text.insert(tk.END, text + "\n")
+        self.line_count += text.count("\n") + 1
+
+        # Trim in chunks so each line is moved to disk once: O(1) amortised.
+        slack = max(100, self.max_lines // 10)
+        if (following and self.line_count > self.max_lines + slack) or self.line_count > self.max_lines * 2:
+            self._trim(self.line_count - self.max_lines)
+
+        if following:
+            self.text.see(tk.END)
+
+    def _trim(self, count):
+        head = self.text.get("1.0", f"{count + 1}.0")
+        lines = head.split("\n")[:count]
+        # Lines that were paged back in are already on disk.
+        already_spilled = max(0, self.spilled - self.top_index)
+        self._spill_lines(lines[already_spilled:])
+        self.text.delete("1.0", f"{count + 1}.0")
+        self.top_index += count
+        self.line_count -= count
+
+    def _spill_lines(self, lines):
+        if not lines: return
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile(prefix="yoctool-log-")
+        self.spill.seek(0, 2)
+        chunks = []
+        for line in lines:
+            if self.spilled % self.SPILL_CHUNK == 0:
+                self.spill_chunks.append(self.spill_size)
+            data = (line + "\n").encode("utf-8", "replace")
+            chunks.append(data)
+            self.spill_size += len(data)
+            self.spilled += 1
+        self.spill.write(b"".join(chunks))
+
+    def _read_spill(self, start, end):
+        chunk = start // self.SPILL_CHUNK
+        self.spill.flush()
+        self.spill.seek(self.spill_chunks[chunk])
+        for _ in range(start - chunk * self.SPILL_CHUNK):
+            self.spill.readline()
+        return [self.spill.readline().decode("utf-8", "replace").rstrip("\n") for _ in range(end - start)]
+
+    def _on_yscroll(self, first, last):
+        self.text.vbar.set(first, last)
+        if float(first) <= 0.0 and self.top_index > 0 and not self.paging:
+            self.paging = True
+            self.text.after_idle(self._page_in)
+
+    def _page_in(self):
+        try:
+            count = min(self.PAGE_LINES, self.top_index)
+            if count <= 0 or self.spill is None: return
+            lines = self._read_spill(self.top_index - count, self.top_index)
+            self.text.insert("1.0", "\n".join(lines) + "\n")
+            self.top_index -= count
+            self.line_count += count
+            self.text.yview(f"{count + 1}.0")
+        finally:
+            self.paging = False
@@ -0,0 +1,116 @@
+import time
+import tkinter as tk
+from tkinter import ttk, scrolledtext, messagebox
+
+import runlog
+
+class LogBrowser:
+    CONTEXT = 100
+    KINDS = {"Errors": ("error",), "Errors + Warnings": ("error", "warning"), "Tasks": ("task",), "All marks": ("error", "warning", "task")}
+
+    def __init__(self, app):
+        self.app = app
+        self.top = None
+        self.reader = None
+        self.runs = []
+        self.window = (0, 0)
+
+    def open(self):
+        if self.top is not None and self.top.winfo_exists():
+            self.top.lift()
+            self.load_runs()
+            return
+        self.top = tk.Toplevel(self.app.root)
+        self.top.title("Build Logs")
+        self.top.geometry("950x650")
+
+        self.runs_tree = ttk.Treeview(self.top, columns=("started", "label", "status", "errors", "warnings"), show="headings", height=7)
+        for col, text, width in (("started", "Started", 140), ("label", "Command", 420), ("status", "Status", 70),
+                                 ("errors", "Errors", 60), ("warnings", "Warnings", 70)):
+            self.runs_tree.heading(col, text=text)
+            self.runs_tree.column(col, width=width, stretch=(col == "label"))
+        self.runs_tree.pack(fill="x", padx=10, pady=(10, 5))
+        self.runs_tree.bind("<<TreeviewSelect>>", self.on_run_selected)
+
+        f_marks = ttk.Frame(self.top)
+        f_marks.pack(fill="x", padx=10)
+        self.kind_var = tk.StringVar(value="Errors + Warnings")
+        cb = ttk.Combobox(f_marks, textvariable=self.kind_var, values=list(self.KINDS), state="readonly", width=18)
+        cb.pack(side="left")
+        cb.bind("<<ComboboxSelected>>", lambda e: self.fill_marks())
+        ttk.Button(f_marks, text="◀ Earlier", command=lambda: self.shift(-1)).pack(side="left", padx=5)
+        ttk.Button(f_marks, text="Later ▶", command=lambda: self.shift(1)).pack(side="left")
+        ttk.Button(f_marks, text="↻", width=3, command=self.load_runs).pack(side="right")
+        self.info_var = tk.StringVar()
+        ttk.Label(f_marks, textvariable=self.info_var, foreground="gray").pack(side="left", padx=10)
+
+        self.marks_tree = ttk.Treeview(self.top, columns=("line", "text"), show="headings", height=7)
+        self.marks_tree.heading("line", text="Line")
+        self.marks_tree.column("line", width=80, stretch=False)
+        self.marks_tree.heading("text", text="Message")
+        self.marks_tree.column("text", width=800)
+        self.marks_tree.pack(fill="x", padx=10, pady=5)
+        self.marks_tree.bind("<<TreeviewSelect>>", self.on_mark_selected)
+
+        self.text = scrolledtext.ScrolledText(self.top, bg="black", fg="white", font=("Courier New", 10))
+        self.text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.text.tag_configure("target", background="#7a1f1f")
+        self.load_runs()
+
+    def load_runs(self):
+        self.runs = runlog.list_runs(self.app.mgr_log.log_dir)
+        self.runs_tree.delete(*self.runs_tree.get_children())
+        for i, run in enumerate(self.runs):
+            status = {True: "ok", False: "failed", None: "running"}[run["ok"]]
+            counts = run["counts"]
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"]))
+            self.runs_tree.insert("", "end", iid=str(i), values=(started, run["label"], status,
+                                                                 counts.get("error", ""), counts.get("warning", "")))
+
+    def on_run_selected(self, event=None):
+        sel = self.runs_tree.selection()
+        if not sel: return
+        try:
+            self.reader = runlog.LogReader(self.runs[int(sel[0])]["path"])
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot open log: {e}", parent=self.top)
+            return
+        self.info_var.set(f"{self.reader.line_count} lines")
+        self.fill_marks()
+        # Straight to the first error, if any.
+        first = next((m for m in self.reader.marks if m[1] == "error"), None)
+        if first:
+            self.show(first[0])
+        else:
+            self.show(max(0, self.reader.line_count - 1))
+
+    def fill_marks(self):
+        self.marks_tree.delete(*self.marks_tree.get_children())
+        if not self.reader: return
+        kinds = self.KINDS[self.kind_var.get()]
+        for i, (line, kind, text) in enumerate(self.reader.marks):
+            if kind in kinds:
+                self.marks_tree.insert("", "end", iid=str(i), values=(line + 1, text))
+
+    def on_mark_selected(self, event=None):
+        sel = self.marks_tree.selection()
+        if sel and self.reader:
+            self.show(self.reader.marks[int(sel[0])][0])
+
+    def shift(self, direction):
+        if not self.reader: return
+        self.show(self.window[0] + self.CONTEXT + direction * self.CONTEXT, mark=False)
+
+    def show(self, line, mark=True):
+        line = min(line, max(0, self.reader.line_count - 1))
+        start = max(0, line - self.CONTEXT)
+        lines = self.reader.lines(start, start + 2 * self.CONTEXT)
+        self.window = (start, start + len(lines))
+        self.text.configure(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(f"{start + i + 1:>7}  {text}" for i, text in enumerate(lines)))
+        if mark and start <= line < start + len(lines):
+            row = line - start + 1
+            self.text.tag_add("target", f"{row}.0", f"{row}.end")
+            self.text.see(f"{row}.0")
+        self.text.configure(state="disabled")
@@ -0,0 +1,183 @@
+import os
+import re
+import signal
+import subprocess
+import threading
+
+import bitbake_server
+import confgen
+
+# After APPLY & SAVE, parse the recipes (`bitbake -p`) and fetch the sources
+# of the selected image (`--runall=fetch`) in the background at nice 19 and
+# idle I/O priority, so START BUILD finds a warm parse cache and a complete
+# DL_DIR. Any other bitbake command waits for it and raises it to normal
+# priority first: the server only serves one command at a time.
+
+CANCEL_TIMEOUT = 30
+
+class PrefetchManager:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        # Held by the run that is working; a newer one waits for it.
+        self.serial = threading.Lock()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.proc = None
+        self.boosted = False
+        self.generation = 0
+        self.cancelled_generation = 0
+        self.active = 0
+
+    def start(self):
+        poky = self.app.poky_path.get()
+        build_dir = self.app.build_dir_name.get()
+        if not poky or not build_dir: return
+        profile = self.app.mgr_setup.get_profile()
+        # Busy from here on, so a build started right after APPLY & SAVE
+        # waits for this prefetch even before its thread gets going.
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            if not self.active: self.boosted = False
+            self.active += 1
+            self.idle.clear()
+        threading.Thread(target=self.run, args=(generation, self.app.mgr_build.session(), profile), daemon=True).start()
+
+    def _cancelled(self, generation):
+        # Cancelled, or replaced by a newer APPLY & SAVE. Caller holds the lock.
+        return generation != self.generation or generation <= self.cancelled_generation
+
+    def _signal(self, sig):
+        with self.lock:
+            proc = self.proc
+        if proc:
+            try: os.killpg(proc.pid, sig)
+            except OSError: pass
+
+    def run(self, generation, session, profile):
+        try:
+            # A newer APPLY & SAVE replaces a prefetch that is still running;
+            # SIGINT makes the bitbake client ask the server to stop cleanly.
+            self._signal(signal.SIGINT)
+            if not self.serial.acquire(timeout=CANCEL_TIMEOUT):
+                self._signal(signal.SIGTERM)
+                self.serial.acquire()
+            try:
+                with self.lock:
+                    if self._cancelled(generation): return
+                self._prefetch(generation, session, profile)
+            finally:
+                self.serial.release()
+        finally:
+            with self.lock:
+                self.active -= 1
+                if not self.active: self.idle.set()
+
+    def _prefetch(self, generation, session, profile):
+        general = profile["general"]
+        targets = confgen.expand_targets(general, general["image"])
+        build_path = session.build_path
+        ok = False
+        try:
+            failed = session.fetch_layers(profile)
+            if failed:
+                self.app.log(f"Warning: Failed to fetch layers: {', '.join(failed)}")
+            self._status("Prefetch: parsing recipes...")
+            if not self._exec(generation, session, general, "bitbake -p", self._parse_line):
+                return
+            self._status("Prefetch: fetching sources...")
+            ok = self._exec(generation, session, general, f"bitbake --runall=fetch {targets}", self._fetch_line)
+        except Exception as e:
+            self.app.log(f"Prefetch failed: {e}")
+        finally:
+            pid = bitbake_server.server_pid(build_path)
+            if pid and bitbake_server.is_running(build_path):
+                bitbake_server.set_priority(bitbake_server.process_tree(pid), False)
+            with self.lock:
+                self.proc = None
+                cancelled = self._cancelled(generation)
+            if cancelled:
+                self._status("")
+            elif ok:
+                self.app.log("Prefetch complete: recipes parsed and sources fetched.")
+                self._status("Prefetch: ready")
+            else:
+                self._status("Prefetch: failed (see log)")
+
+    def _exec(self, generation, session, general, cmd, on_line):
+        build_path = session.build_path
+
+        with self.lock:
+            if self._cancelled(generation): return False
+            full_cmd = session.shell_command(general, cmd)
+            # A server started by this client inherits nice/ionice; a warm
+            # one is lowered explicitly below.
+            self.proc = subprocess.Popen(f"exec nice -n 19 ionice -c 3 {full_cmd}", shell=True,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                         universal_newlines=True, start_new_session=True)
+            proc = self.proc
+        lowered = False
+        for line in proc.stdout:
+            line = line.strip()
+            if not lowered and not self.boosted and bitbake_server.is_running(build_path):
+                pid = bitbake_server.server_pid(build_path)
+                if pid:
+                    bitbake_server.set_priority(bitbake_server.process_tree(pid), True)
+                    lowered = True
+            if line.startswith("ERROR:"):
+                self.app.log(f"[prefetch] {line}")
+            on_line(line)
+        proc.wait()
+        with self.lock:
+            return proc.returncode == 0 and not self._cancelled(generation)
+
+    def _parse_line(self, line):
+        m = re.search(r'Parsing of (\d+) \.bb files complete', line)
+        if m:
+            self._status(f"Prefetch: parsed {m.group(1)} recipes")
+
+    def _fetch_line(self, line):
+        m = re.search(r'Running task (\d+) of (\d+)', line)
+        if m:
+            self._status(f"Prefetch: fetching {m.group(1)}/{m.group(2)}")
+
+    def _status(self, text):
+        self.app.root.after(0, self.app.prefetch_text.set, text)
+
+    def is_running(self):
+        return not self.idle.is_set()
+
+    def wait_idle(self):
+        # Called by every other bitbake command before it starts.
+        if self.idle.is_set(): return
+        self.app.log("Waiting for background prefetch to finish (raised to normal priority)...")
+        self.boost()
+        self.idle.wait()
+
+    def boost(self):
+        with self.lock:
+            self.boosted = True
+            proc = self.proc
+        build_path = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+        pids = []
+        if proc:
+            pids += bitbake_server.process_tree(proc.pid)
+        pid = bitbake_server.server_pid(build_path)
+        if pid and bitbake_server.is_running(build_path):
+            pids += bitbake_server.process_tree(pid)
+        bitbake_server.set_priority(pids, False)
+
+    def cancel_async(self):
+        if not self.idle.is_set():
+            threading.Thread(target=self.cancel, daemon=True).start()
+
+    def cancel(self, wait=True):
+        with self.lock:
+            if self.idle.is_set(): return
+            self.cancelled_generation = self.generation
+        self._signal(signal.SIGINT)
+        if not wait: return
+        if not self.idle.wait(CANCEL_TIMEOUT):
+            self._signal(signal.SIGTERM)
+            self.idle.wait(CANCEL_TIMEOUT)
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+JOB_KINDS = ["image", "sdk", "bundle", "clean"]
+
+def job_target(job):
+    # Everything except clean can share one bitbake invocation; the SDK is
+    # expressed with bitbake's target:do_task syntax.
+    if job["kind"] == "sdk":
+        return f"{job['target']}:do_populate_sdk"
+    return job["target"]
+
+def plan_next_batch(jobs, poky, build_dir):
+    # Merge consecutive pending jobs of the current workspace into one call;
+    # clean jobs are never mixed with builds.
+    pending = [j for j in jobs if j["status"] == "pending" and j["poky"] == poky and j["build_dir"] == build_dir]
+    if not pending: return []
+    head = pending[0]
+    batch = []
+    for job in pending:
+        if (job["kind"] == "clean") != (head["kind"] == "clean"): break
+        batch.append(job)
+    return batch
+
+def batch_targets(batch):
+    targets = []
+    for job in batch:
+        if job_target(job) not in targets:
+            targets.append(job_target(job))
+    return targets
+
+def restore_jobs(jobs):
+    # Jobs left over from an earlier session come back paused: they only run
+    # again when the user resumes them (some may be destructive cleans).
+    for job in jobs:
+        if job.get("status") in ("pending", "running"):
+            job["status"] = "paused"
+            job["started"] = None
+    return jobs
+
+def other_workspace_jobs(jobs, poky, build_dir):
+    return [j for j in jobs if j["status"] in ("pending", "paused") and (j["poky"], j["build_dir"]) != (poky, build_dir)]
+
+def run_batch(batch, run, stopping, set_status, log):
+    # run(kind, targets) -> ok. A merged call that fails says nothing about
+    # which job failed, so its jobs are then run one at a time (what did
+    # build is restored from sstate) and each gets its own status.
+    ok = run(batch[0]["kind"], batch_targets(batch))
+    if ok or stopping() or len(batch) == 1:
+        set_status(batch, "done" if ok else "stopped" if stopping() else "failed")
+        return
+    log(f"Queue: the combined call failed; running its {len(batch)} jobs one at a time.")
+    for i, job in enumerate(batch):
+        if stopping():
+            set_status(batch[i:], "stopped")
+            return
+        ok = run(job["kind"], [job_target(job)])
+        set_status([job], "done" if ok else "stopped" if stopping() else "failed")
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+class QueueManager:
+    def __init__(self, app):
+        self.app = app
+        self.queue_file = os.path.join(app.cache_dir, "build-queue.json")
+        self.lock = threading.Lock()
+        self.jobs = []
+        self.next_id = 1
+        self.running = False
+        self.tree = None
+        self.tick_job = None
+
+        self.new_kind = tk.StringVar(value="image")
+        self.new_target = tk.StringVar()
+
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.queue_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.jobs = restore_jobs(data.get("jobs", []))
+        self.next_id = max([j.get("id", 0) for j in self.jobs] + [0]) + 1
+        paused = [j for j in self.jobs if j["status"] == "paused"]
+        if paused:
+            cleans = sum(1 for j in paused if j["kind"] == "clean")
+            self.app.log(f"Build queue: {len(paused)} unfinished job(s) from an earlier session restored paused"
+                         + (f" ({cleans} cleanall)" if cleans else "") + "; select them and press RESUME to run them.")
+
+    def save(self):
+        with self.lock:
+            data = {"jobs": list(self.jobs)}
+        try:
+            os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+            tmp = self.queue_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.queue_file)
+            self.app.mgr_setup.fix_cache_ownership(self.queue_file)
+        except OSError as e:
+            self.app.log(f"Could not save build queue: {e}")
+
+    def create_panel(self, parent):
+        f_add = ttk.Frame(parent)
+        f_add.pack(fill="x", padx=10, pady=(0, 5))
+        ttk.Combobox(f_add, textvariable=self.new_kind, values=JOB_KINDS, width=7, state="readonly").pack(side="left")
+        self.target_combo = ttk.Combobox(f_add, textvariable=self.new_target, width=22, postcommand=self._refresh_targets)
+        self.target_combo.pack(side="left", padx=5, fill="x", expand=True)
+        ttk.Button(f_add, text="ADD", width=5, command=self.add_from_panel).pack(side="left", padx=2)
+        ttk.Button(f_add, text="RUN", width=5, command=self.start).pack(side="left", padx=2)
+        ttk.Button(f_add, text="RESUME", command=self.resume_selected).pack(side="left", padx=2)
+        ttk.Button(f_add, text="✕", width=3, command=self.remove_selected).pack(side="left", padx=2)
+        ttk.Button(f_add, text="Clear Done", command=self.clear_finished).pack(side="left", padx=2)
+
+        self.tree = ttk.Treeview(parent, columns=("kind", "target", "status", "time"), show="headings", height=4)
+        for col, text, width in (("kind", "Kind", 60), ("target", "Target", 200), ("status", "Status", 80), ("time", "Time", 70)):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, stretch=(col == "target"))
+        self.tree.pack(fill="x", padx=10, pady=(0, 10))
+        self.refresh_view()
+
+    def _refresh_targets(self):
+        images = list(self.app.tab_general.image_combo["values"])
+        self.target_combo["values"] = images + ["update-bundle"]
+
+    def add_from_panel(self):
+        kind = self.new_kind.get()
+        target = self.new_target.get().strip()
+        if kind == "bundle":
+            target = target or "update-bundle"
+        if not target:
+            target = self.app.tab_general.image_var.get()
+        self.add_job(kind, target)
+
+    def add_job(self, kind, target):
+        poky = self.app.poky_path.get()
+        if not poky: return None
+        with self.lock:
+            job = {
+                "id": self.next_id,
+                "kind": kind,
+                "target": target,
+                "poky": poky,
+                "build_dir": self.app.build_dir_name.get(),
+                "status": "pending",
+                "added": time.time(),
+                "started": None,
+                "finished": None,
+            }
+            self.next_id += 1
+            self.jobs.append(job)
+        self.save()
+        self.refresh_view()
+        return job
+
+    def resume_selected(self):
+        # Selected paused jobs, or all paused jobs of this workspace.
+        poky, build_dir = self.app.poky_path.get(), self.app.build_dir_name.get()
+        ids = {int(i) for i in self.tree.selection()} if self.tree else set()
+        with self.lock:
+            jobs = [j for j in self.jobs if j["status"] == "paused" and (j["id"] in ids if ids else
+                    (j["poky"], j["build_dir"]) == (poky, build_dir))]
+        if not jobs: return
+        cleans = [j["target"] for j in jobs if j["kind"] == "clean"]
+        if cleans and not messagebox.askyesno("Confirm", "Resume includes cleanall of: " + ", ".join(cleans) +
+                                              "\n\nThis removes their working directories, shared state and downloads. Continue?"):
+            return
+        with self.lock:
+            for job in jobs:
+                job["status"] = "pending"
+        self.save()
+        self.refresh_view()
+        self.start()
+
+    def remove_selected(self):
+        if not self.tree: return
+        ids = {int(i) for i in self.tree.selection()}
+        with self.lock:
+            self.jobs = [j for j in self.jobs if j["id"] not in ids or j["status"] == "running"]
+        self.save()
+        self.refresh_view()
+
+    def clear_finished(self):
+        with self.lock:
+            self.jobs = [j for j in self.jobs if j["status"] in ("pending", "running")]
+        self.save()
+        self.refresh_view()
+
+    def refresh_view(self):
+        if not self.tree: return
+        with self.lock:
+            jobs = [dict(j) for j in self.jobs]
+        self.tree.delete(*self.tree.get_children())
+        now = time.time()
+        workspace = (self.app.poky_path.get(), self.app.build_dir_name.get())
+        for job in jobs:
+            if job.get("started"):
+                elapsed = format_duration((job.get("finished") or now) - job["started"])
+            else:
+                elapsed = ""
+            target = job["target"]
+            if (job["poky"], job["build_dir"]) != workspace:
+                target += f" ({os.path.basename(job['poky'])}/{job['build_dir']})"
+            self.tree.insert("", "end", iid=str(job["id"]), values=(job["kind"], target, job["status"], elapsed))
+
+    def _tick(self):
+        self.refresh_view()
+        self.tick_job = self.app.root.after(1000, self._tick) if self.running else None
+
+    def start(self):
+        with self.lock:
+            if self.running: return
+            if not any(j["status"] == "pending" for j in self.jobs): return
+            self.running = True
+        self.app.mgr_build.stop_requested.clear()
+        self.app.set_busy_state(True)
+        threading.Thread(target=self.run_queue, daemon=True).start()
+        if self.tick_job is None:
+            self._tick()
+
+    def _set_status(self, batch, status):
+        now = time.time()
+        with self.lock:
+            for job in batch:
+                job["status"] = status
+                if status == "running":
+                    job["started"] = now
+                else:
+                    job["finished"] = now
+        self.save()
+        self.app.root.after(0, self.refresh_view)
+
+    def _run_jobs(self, kind, targets):
+        try:
+            if kind == "clean":
+                return self.app.mgr_build.run_clean(" ".join(targets), notify=False)
+            return self.app.mgr_build.run_build(" ".join(targets), notify=False)
+        except Exception as e:
+            self.app.log(f"Queue error: {e}")
+            return False
+
+    def run_queue(self):
+        done = failed = 0
+        stopped = False
+        poky = self.app.poky_path.get()
+        build_dir = self.app.build_dir_name.get()
+        stopping = self.app.mgr_build.stop_requested.is_set
+        try:
+            while True:
+                with self.lock:
+                    batch = plan_next_batch(self.jobs, poky, build_dir)
+                if not batch: break
+
+                self._set_status(batch, "running")
+                if len(batch) > 1:
+                    self.app.log(f"Queue: running {len(batch)} jobs in one bitbake call: {' '.join(batch_targets(batch))}")
+                run_batch(batch, self._run_jobs, stopping, self._set_status, self.app.log)
+
+                with self.lock:
+                    statuses = [job["status"] for job in batch]
+                done += statuses.count("done")
+                failed += statuses.count("failed")
+                if stopping():
+                    stopped = True
+                    break
+        finally:
+            with self.lock:
+                self.running = False
+                others = other_workspace_jobs(self.jobs, poky, build_dir)
+            self.app.root.after(0, self.app.set_busy_state, False)
+            self.app.root.after(0, self.refresh_view)
+
+        if others:
+            places = sorted({f"{j['poky']}/{j['build_dir']}" for j in others})
+            self.app.log(f"Queue: {len(others)} job(s) for other workspaces were not run: {', '.join(places)}. "
+                         "Open that workspace to run them.")
+        if stopped:
+            self.app.log(f"Build queue stopped: {done} done, {failed} failed; remaining jobs left pending.")
+        elif failed:
+            self.app.root.after(0, messagebox.showerror, "Error", f"Build queue finished: {done} done, {failed} failed.")
+        elif done:
+            self.app.root.after(0, messagebox.showinfo, "Success", f"Build queue finished: {done} job(s) done.")
@@ -2,9 +2,10 @@ import subprocess
 import threading
 import os
 import shlex
-import glob
 from tkinter import messagebox
 
+import sdcard
+
 class SDCardManager:
     def __init__(self, app):
         self.app = app
@@ -83,67 +84,41 @@ class SDCardManager:
         if not sel or "No devices" in sel: return
         dev = f"/dev/{sel.split()[0]}"
         
-        machine = self.app.tab_general.machine_var.get()
         image = self.app.tab_general.image_var.get()
         
-        deploy = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get(), "tmp/deploy/images", machine)
+        deploy = self.app.tab_general.get_deploy_dir(os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get()))
         
-        files = glob.glob(os.path.join(deploy, f"{image}*.sdimg"))
-        if not files:
-            files = glob.glob(os.path.join(deploy, f"{image}*.wic*"))
-            
-        if not files: 
+        img = sdcard.find_image(deploy, image)
+        if not img: 
             messagebox.showerror("Error", f"No image (.sdimg or .wic) found for {image}")
             return
             
-        img = max(files, key=os.path.getctime)
         if messagebox.askyesno("Flash", f"Flash {os.path.basename(img)} to {dev}?"):
             self.app.set_busy_state(True)
-            try: img_size = os.path.getsize(img)
-            except: img_size = 0
-            threading.Thread(target=self.run_flash, args=(img, dev, img_size)).start()
+            threading.Thread(target=self.run_flash, args=(img, dev)).start()
+
+    def run_flash(self, img, dev):
+        def on_progress(percent, line):
+            self.app.log_overwrite(f">> {line}")
+            if percent is not None:
+                self.app.root.after(0, self.app.build_progress.set, percent)
+                self.app.root.after(0, self.app.build_progress_text.set, f"{int(percent)}%")
 
-    def run_flash(self, img, dev, img_size):
         try:
             self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#4CAF50"))
             self.app.log("Preparing to flash...")
-            
-            subprocess.run(f"umount {shlex.quote(dev)}*", shell=True, stderr=subprocess.DEVNULL)
-            
-            self.app.log(f"Flashing {os.path.basename(img)}...")
             self.app.root.after(0, self.app.build_progress.set, 0)
             self.app.root.after(0, self.app.build_progress_text.set, "0%")
             
-            safe_img = shlex.quote(img)
-            safe_dev = shlex.quote(dev)
-            
-            if img.endswith(".bz2"): cmd = f"bzcat {safe_img} | dd of={safe_dev} bs=4M status=progress conv=fsync"
-            else: cmd = f"dd if={safe_img} of={safe_dev} bs=4M status=progress conv=fsync"
-            
-            proc = subprocess.Popen(cmd, shell=True, stderr=subprocess.PIPE, universal_newlines=True)
-            while True:
-                line = proc.stderr.readline()
-                if not line and proc.poll() is not None: break
-                if "bytes" in line: 
-                    self.app.log_overwrite(f">> {line.strip()}")
-                    parts = line.split()
-                    if parts and parts[0].isdigit() and img_size > 0:
-                        bytes_copied = int(parts[0])
-                        percent = (bytes_copied / img_size) * 100
-                        percent = min(percent, 100)
-                        self.app.root.after(0, self.app.build_progress.set, percent)
-                        self.app.root.after(0, self.app.build_progress_text.set, f"{int(percent)}%")
-            
-            if proc.returncode == 0: 
-                self.app.log("Refreshing partition table...")
-                subprocess.run(f"partprobe {safe_dev}", shell=True)
-                subprocess.run("udevadm settle", shell=True)
-
+            if sdcard.flash(img, dev, on_progress, self.app.log): 
                 self.app.root.after(0, self.app.build_progress.set, 100)
                 self.app.root.after(0, self.app.build_progress_text.set, "100%")
                 self.app.root.after(0, messagebox.showinfo, "Success", "Flashed! Partition table updated.")
+            else:
+                self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#FF0000"))
+                self.app.log("Flash failed.")
         except Exception as e: 
             self.app.root.after(0, lambda: self.app.pb_canvas.itemconfig(self.app.pb_rect, fill="#FF0000"))
             self.app.root.after(0, messagebox.showerror, "Error", str(e))
         finally: 
-            self.app.root.after(0, self.app.set_busy_state, False)
\ No newline at end of file
+            self.app.root.after(0, self.app.set_busy_state, False)
@@ -7,6 +7,12 @@ import json
 import re
 import shlex
 
+import confgen
+import git_layers
+import scratch
+
+POKY_URL = "git://git.yoctoproject.org/poky"
+
 class SetupManager:
     def __init__(self, app):
         self.app = app # Reference to main YoctoolApp
@@ -42,6 +48,13 @@ class SetupManager:
     def get_tool_conf_path(self):
         return os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get(), "conf", "yoctool.conf")
 
+    def get_mirror_dir(self):
+        return os.path.join(self.app.cache_dir, "git")
+
+    def fix_cache_ownership(self, *paths):
+        # The app runs as root; give what it just wrote back to the real user.
+        self.app.mgr_build.session().fix_cache_ownership(*paths)
+
     def auto_load_config(self):
         self.load_config()
 
@@ -70,115 +83,65 @@ class SetupManager:
 
     def save_config(self):
         conf = self.get_conf_path()
-        tool_conf = self.get_tool_conf_path()
         
         if not os.path.exists(os.path.dirname(conf)):
             messagebox.showerror("Error", "Build/conf directory not found. Please setup Poky first.")
             return
 
+        if not self.check_shared_dirs():
+            return
+
         try:
-            if os.path.exists(conf):
-                with open(conf, 'r') as f: lines = f.readlines()
+            # apply() logs which files changed, or that none did.
+            written, removed = confgen.apply(self.app.poky_path.get(), self.app.build_dir_name.get(), self.get_profile(),
+                                             self.app.cache_dir, self.app.log, self.app.tab_general.psi_baseline)
+            build_path = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+            if not self.app.tab_general.scratch_tmpfs_var.get() and scratch.is_mounted(build_path):
+                # Fast scratch was turned off: give the RAM back.
+                threading.Thread(target=self.release_scratch, daemon=True).start()
+            elif self.app.tab_general.prefetch_var.get():
+                self.app.mgr_prefetch.start()
+            if written or removed:
+                messagebox.showinfo("Success", "Configuration Applied & Saved!")
             else:
-                lines = []
-            
-            clean_lines = []
-            skip_block = False
-            for line in lines:
-                if "# --- YOCTOOL AUTO CONFIG START" in line:
-                    skip_block = True
-                    continue
-                if "# --- YOCTOOL AUTO CONFIG END" in line:
-                    skip_block = False
-                    continue
-                if skip_block: continue
-                # Skip existing vars to avoid duplicates
-                if re.match(r'^\s*MACHINE\s*\?{0,2}=', line): continue
-                if re.match(r'^\s*DISTRO\s*\?{0,2}=', line): continue
-                if re.match(r'^\s*PACKAGE_CLASSES\s*\?{0,2}=', line): continue
-                if re.match(r'^\s*BB_NUMBER_THREADS\s*=', line): continue
-                if re.match(r'^\s*PARALLEL_MAKE\s*=', line): continue
-                if re.match(r'^\s*EXTRA_IMAGE_FEATURES\s*\?{0,2}=', line): continue
-                if re.match(r'^\s*DISTRO_FEATURES:append\s*=', line): continue
-                if re.match(r'^\s*VIRTUAL-RUNTIME_init_manager\s*=', line): continue
-                if re.match(r'^\s*INHERIT\s*\+=\s*"mender-full"', line): continue
-                if re.match(r'^\s*MENDER_', line): continue
-                clean_lines.append(line)
-
-            if clean_lines and not clean_lines[-1].endswith('\n'):
-                clean_lines[-1] += '\n'
-
-            clean_lines.append("\n# --- YOCTOOL AUTO CONFIG START ---\n")
-            clean_lines.extend(self.app.tab_general.get_config_lines())
-            clean_lines.extend(self.app.tab_image.get_config_lines())
-
-            for mgr in self.app.board_managers:
-                if mgr.is_current_machine_supported():
-                    clean_lines.extend(mgr.get_config_lines())
-
-            clean_lines.extend(self.app.tab_ota.get_config_lines())
-            clean_lines.append("# --- YOCTOOL AUTO CONFIG END ---\n")
-
-            with open(conf, 'w') as f:
-                f.writelines(clean_lines)
-
-            self.regenerate_bblayers()
-
-            app_state = {
-                "general": self.app.tab_general.get_state(),
-                "image": self.app.tab_image.get_state(),
-                "ota": self.app.tab_ota.get_state(),
-                "managers": [mgr.get_state() for mgr in self.app.board_managers]
-            }
-            
-            with open(tool_conf, 'w') as f:
-                json.dump(app_state, f, indent=4)
-
-            self.app.log("Configuration saved to local.conf & yoctool.conf")
-            messagebox.showinfo("Success", "Configuration Applied & Saved!")
+                messagebox.showinfo("Success", "Configuration already up to date; nothing was written.")
             
         except Exception as e: messagebox.showerror("Error", str(e))
 
-    def regenerate_bblayers(self):
-        if not self.app.poky_path.get() or not self.app.build_dir_name.get(): return
-        conf_dir = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get(), "conf")
-        bblayers_conf = os.path.join(conf_dir, "bblayers.conf")
-        
-        base_content = [
-            'POKY_BBLAYERS_CONF_VERSION = "2"',
-            'BBPATH = "${TOPDIR}"',
-            'BBFILES ?= ""',
-            'BBLAYERS ?= " \\',
-            '  ${TOPDIR}/../meta \\',
-            '  ${TOPDIR}/../meta-poky \\',
-            '  ${TOPDIR}/../meta-yocto-bsp \\',
-            '"'
-        ]
-        
-        os.makedirs(conf_dir, exist_ok=True)
-        with open(bblayers_conf, 'w') as f:
-            f.write('\n'.join(base_content) + '\n')
-            
-        self.app.log("Cleaned bblayers.conf (Factory Reset).")
-
-        def append_layers_from(source):
-            try:
-                lines = source.get_bblayers_lines()
-                with open(bblayers_conf, 'a') as f:
-                    f.write('\n# Added by Yoctool\n')
-                    for line in lines:
-                        f.write(line)
-            except: pass
-
-        if self.app.active_manager:
-            append_layers_from(self.app.active_manager)
-
-        if hasattr(self.app.tab_ota, 'get_bblayers_lines'):
-             append_layers_from(self.app.tab_ota)
-             
-        self.app.log("Regenerated bblayers.conf with correct paths.")
+    def release_scratch(self):
+        self.app.mgr_prefetch.wait_idle()
+        self.app.mgr_build.session().make_scratch().unmount()
+        if self.app.tab_general.prefetch_var.get():
+            self.app.mgr_prefetch.start()
+
+    def get_profile(self):
+        return {
+            "general": self.app.tab_general.get_state(),
+            "image": self.app.tab_image.get_state(),
+            "ota": self.app.tab_ota.get_state(),
+            "managers": [mgr.get_state() for mgr in self.app.board_managers]
+        }
+
+    def check_shared_dirs(self):
+        build_path = os.path.join(self.app.poky_path.get(), self.app.build_dir_name.get())
+        other = confgen.cross_device_dirs(self.app.tab_general.get_state(), build_path)
+        if not other: return True
+        return messagebox.askyesno("Different Filesystem",
+            "These directories are on a different filesystem than TMPDIR:\n\n" + "\n".join(other) +
+            "\n\nBitbake cannot hardlink between them, so fetched sources and sstate objects will be copied, "
+            "using more disk space and time.\n\nUse them anyway?")
 
     def exec_stream_cmd(self, cmd_args, cwd=None):
+        label = " ".join(cmd_args) if isinstance(cmd_args, (list, tuple)) else cmd_args
+        own_run = self.app.mgr_log.begin_run(label, label)
+        ok = False
+        try:
+            ok = self._exec_stream_cmd(cmd_args, cwd)
+            return ok
+        finally:
+            if own_run: self.app.mgr_log.end_run(ok)
+
+    def _exec_stream_cmd(self, cmd_args, cwd):
         try:
             process = subprocess.Popen(cmd_args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
             for line in process.stdout:
@@ -221,7 +184,7 @@ class SetupManager:
 
     def scan_git_branches(self, cb, var):
         try:
-            cmd = "git ls-remote --heads git://git.yoctoproject.org/poky"
+            cmd = f"git ls-remote --heads {POKY_URL}"
             proc = subprocess.run(cmd, shell=True, capture_output=True, text=True)
             if proc.returncode == 0:
                 branches = []
@@ -253,17 +216,28 @@ class SetupManager:
         threading.Thread(target=self.run_manual_clone, args=(top, branch, target_dir, btn)).start()
 
     def run_manual_clone(self, top, branch, target_dir, btn):
+        def on_git_line(line):
+            text = line.split("] ", 1)[-1]
+            self.app.root.after(0, self.lbl_dl_status.config, {"text": text})
+            match = re.search(r'(\d+)%', text)
+            if match: self.app.root.after(0, self.pb_dl.config, {"value": int(match.group(1))})
+
         try:
-            cmd = f"git clone --progress -b {branch} git://git.yoctoproject.org/poky {shlex.quote(target_dir)}"
-            process = subprocess.Popen(cmd, shell=True, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True)
-            for line in process.stderr:
-                text = line.strip()
-                self.app.root.after(0, self.lbl_dl_status.config, {"text": text})
-                match = re.search(r'(\d+)%', text)
-                if match: self.app.root.after(0, self.pb_dl.config, {"value": int(match.group(1))})
-            process.wait()
+            ok = False
+            mirror = git_layers.update_mirror(self.get_mirror_dir(), "poky", POKY_URL, branch, on_git_line)
+            if mirror:
+                ok = git_layers.clone_from_mirror("poky", mirror, POKY_URL, branch, target_dir, on_git_line)
+                self.app.mgr_build.session().fix_mirror_ownership()
+
+            if not ok:
+                cmd = f"git clone --progress -b {branch} {POKY_URL} {shlex.quote(target_dir)}"
+                process = subprocess.Popen(cmd, shell=True, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True)
+                for line in process.stderr:
+                    on_git_line(line.strip())
+                process.wait()
+                ok = process.returncode == 0
             
-            if process.returncode == 0:
+            if ok:
                 self.app.root.after(0, self.app.poky_path.set, target_dir)
                 self.app.root.after(0, self.save_poky_path)
                 self.app.root.after(0, self.auto_load_config)
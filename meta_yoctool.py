@@ -0,0 +1,328 @@
+import os
+
+import filesync
+
+class MetaLayer:
+    # Renders the generated meta-yoctool layer in memory; sync() writes the
+    # files that changed into the Poky checkout and drops stale ones.
+    def __init__(self, poky_dir, log=print):
+        self.poky_dir = poky_dir
+        self.log = log
+        self.tree = filesync.FileTree()
+
+    def get_layer_path(self):
+        return os.path.join(self.poky_dir, "meta-yoctool")
+
+    def sync(self):
+        if not self.poky_dir or not os.path.isdir(self.poky_dir): return None
+        result = self.tree.sync(self.get_layer_path())
+        for rel in result["kept"]:
+            self.log(f"meta-yoctool: {rel} was edited by hand; not removing it.")
+        return result
+
+    def generate_wpa_config(self, ssid, password):
+        recipe_dir = os.path.join("recipes-connectivity", "wpa-config")
+        files_dir = os.path.join(recipe_dir, "files")
+
+        self.tree.add(os.path.join("conf", "layer.conf"),
+            'BBPATH .= ":${LAYERDIR}"\n'
+            'BBFILES += "${LAYERDIR}/recipes-*/*/*.bb"\n'
+            'BBFILES += "${LAYERDIR}/recipes-*/*/*.bbappend"\n'
+            'BBFILE_COLLECTIONS += "wifisetup"\n'
+            'BBFILE_PATTERN_wifisetup = "^${LAYERDIR}/"\n'
+            'BBFILE_PRIORITY_wifisetup = "10"\n'
+            'LAYERSERIES_COMPAT_wifisetup = "scarthgap"\n')
+
+        wpa_conf = f"""ctrl_interface=/run/wpa_supplicant
+update_config=1
+country=VN
+
+network={{
+    ssid="{ssid}"
+    psk="{password}"
+}}
+"""
+        self.tree.add(os.path.join(files_dir, "wpa_supplicant.conf"), wpa_conf.strip() + "\n")
+
+        network_conf = """[Match]
+Name=wlan0
+
+[Network]
+DHCP=yes
+
+[DHCPv4]
+SendHostname=yes
+"""
+        self.tree.add(os.path.join(files_dir, "80-wifi.network"), network_conf.strip() + "\n")
+
+        wpa_service = """[Unit]
+Description=WPA Supplicant for wlan0
+Before=network.target
+After=dbus.service
+Wants=network.target
+
+[Service]
+Type=simple
+ExecStart=/usr/sbin/wpa_supplicant -i wlan0 -c /etc/wpa_supplicant/wpa_supplicant.conf
+Restart=on-failure
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+"""
+        self.tree.add(os.path.join(files_dir, "wpa-wlan0.service"), wpa_service.strip() + "\n")
+
+        self.tree.add(os.path.join(recipe_dir, "wpa-config_1.0.bb"), """SUMMARY = "WPA Supplicant and Networkd configuration"
+LICENSE = "MIT"
+LIC_FILES_CHKSUM = "file://${COMMON_LICENSE_DIR}/MIT;md5=0835ade698e0bcf8506ecda2f7b4f302"
+
+SRC_URI = "file://wpa_supplicant.conf \\
+           file://80-wifi.network \\
+           file://wpa-wlan0.service"
+
+S = "${WORKDIR}"
+
+inherit systemd
+
+SYSTEMD_SERVICE:${PN} = "wpa-wlan0.service"
+SYSTEMD_AUTO_ENABLE:${PN} = "enable"
+
+do_install() {
+    install -d ${D}${sysconfdir}/wpa_supplicant
+    install -m 600 ${WORKDIR}/wpa_supplicant.conf ${D}${sysconfdir}/wpa_supplicant/wpa_supplicant.conf
+
+    install -d ${D}${sysconfdir}/systemd/network
+    install -m 644 ${WORKDIR}/80-wifi.network ${D}${sysconfdir}/systemd/network/80-wifi.network
+
+    install -d ${D}${systemd_system_unitdir}
+    install -m 644 ${WORKDIR}/wpa-wlan0.service ${D}${systemd_system_unitdir}/wpa-wlan0.service
+}
+
+FILES:${PN} += "${sysconfdir}/wpa_supplicant/wpa_supplicant.conf \\
+                ${sysconfdir}/systemd/network/80-wifi.network \\
+                ${systemd_system_unitdir}/wpa-wlan0.service"
+""")
+
+    def create_base_files_bbappend(self, hostname, rauc):
+        recipe_dir = os.path.join("recipes-core", "base-files")
+        
+        hostname = hostname.strip()
+        content = ""
+        
+        if hostname:
+            content += f'hostname = "{hostname}"\n\n'
+            
+        if rauc:
+            content += """do_install:append() {
+    if ! grep -q "/boot" ${D}${sysconfdir}/fstab; then
+        echo "/dev/mmcblk0p1 /boot vfat defaults,rw,sync 0 0" >> ${D}${sysconfdir}/fstab
+    fi
+}
+"""
+        bbappend_file = os.path.join(recipe_dir, "base-files_%.bbappend")
+        if content:
+            self.tree.add(bbappend_file, content)
+        else:
+            self.tree.remove(bbappend_file)
+
+    def create_rauc_wks_file(self, size):
+        wks_path = os.path.join("wic", "sdimage-dual-raspberrypi.wks")
+        
+        content = f"""part /boot --source bootimg-partition --ondisk mmcblk0 --fstype=vfat --label boot --active --align 4096 --size 100
+part / --source rootfs --ondisk mmcblk0 --fstype=ext4 --label rootfs_A --align 4096 --size {size}
+part / --source rootfs --ondisk mmcblk0 --fstype=ext4 --label rootfs_B --align 4096 --size {size}
+part /data --ondisk mmcblk0 --fstype=ext4 --label data --align 4096 --size 128
+"""
+        self.tree.add(wks_path, content)
+
+    def create_rauc_config(self, machine):
+        rauc_recipe_dir = os.path.join("recipes-core", "rauc")
+        rauc_files_dir = os.path.join(rauc_recipe_dir, "files")
+
+        project_root = os.path.dirname(self.poky_dir)
+        cert_src = os.path.join(project_root, "rauc-keys", "development-1.cert.pem")
+        cert_dest = os.path.join(rauc_files_dir, "development-1.cert.pem")
+        if os.path.exists(cert_src):
+            self.tree.copy(cert_dest, cert_src)
+        else:
+            self.log(f"Warning: RAUC certificate not found at {cert_src}. "
+                     "The generated image may not include the keyring needed for update verification.")
+
+        sys_conf_content = f"""[system]
+compatible={machine}
+bootloader=uboot
+data-directory=/var/lib/rauc
+
+[keyring]
+path=development-1.cert.pem
+
+[slot.rootfs.0]
+device=/dev/mmcblk0p2
+type=ext4
+bootname=A
+
+[slot.rootfs.1]
+device=/dev/mmcblk0p3
+type=ext4
+bootname=B
+"""
+        self.tree.add(os.path.join(rauc_files_dir, "system.conf"), sys_conf_content.strip())
+        
+        fw_env_content = "/boot/uboot.env 0x0000 0x4000\n"
+        self.tree.add(os.path.join(rauc_files_dir, "fw_env.config"), fw_env_content)
+
+        for old_file in ["rauc-conf_1.0.bb", "rauc-conf_%.bbappend", "rauc-conf.bbappend"]:
+            self.tree.remove(os.path.join(rauc_recipe_dir, old_file))
+
+        recipe_content = """SUMMARY = "RPI Specific RAUC configuration"
+LICENSE = "MIT"
+LIC_FILES_CHKSUM = "file://${COMMON_LICENSE_DIR}/MIT;md5=0835ade698e0bcf8506ecda2f7b4f302"
+
+SRC_URI = "file://system.conf file://fw_env.config file://development-1.cert.pem"
+
+PROVIDES += "rauc-conf virtual/rauc-conf"
+RPROVIDES:${PN} += "rauc-conf virtual-rauc-conf"
+
+RCONFLICTS:${PN} += "rauc-conf"
+RREPLACES:${PN} += "rauc-conf"
+
+S = "${WORKDIR}"
+
+do_install() {
+    install -d ${D}${sysconfdir}/rauc
+    install -m 644 ${WORKDIR}/system.conf ${D}${sysconfdir}/rauc/system.conf
+    
+    if [ -f ${WORKDIR}/development-1.cert.pem ]; then
+        install -m 644 ${WORKDIR}/development-1.cert.pem ${D}${sysconfdir}/rauc/development-1.cert.pem
+    fi
+    
+    install -d ${D}${sysconfdir}
+    install -m 644 ${WORKDIR}/fw_env.config ${D}${sysconfdir}/fw_env.config
+}
+
+FILES:${PN} += "${sysconfdir}/rauc/system.conf ${sysconfdir}/fw_env.config ${sysconfdir}/rauc/development-1.cert.pem"
+"""
+        self.tree.add(os.path.join(rauc_recipe_dir, "rpi-rauc-conf_1.0.bb"), recipe_content.strip())
+
+    def create_uboot_bbappend(self):
+        uboot_dir = os.path.join("recipes-bsp", "u-boot")
+        
+        self.tree.remove(os.path.join(uboot_dir, "files", "boot.cmd"))
+
+        content = """DEPENDS += "u-boot-tools-native"
+
+do_compile:append() {
+    echo "bootlimit=3" >> ${B}/u-boot-initial-env
+    echo "bootcount=0" >> ${B}/u-boot-initial-env
+    echo "upgrade_available=0" >> ${B}/u-boot-initial-env
+    echo "BOOT_ORDER=A B" >> ${B}/u-boot-initial-env
+    echo "BOOT_A_LEFT=3" >> ${B}/u-boot-initial-env
+    echo "BOOT_B_LEFT=0" >> ${B}/u-boot-initial-env
+    
+    mkenvimage -s 16384 -o ${WORKDIR}/uboot.env ${B}/u-boot-initial-env
+}
+
+do_deploy:append() {
+    install -d ${DEPLOYDIR}
+    install -m 644 ${WORKDIR}/uboot.env ${DEPLOYDIR}/uboot.env
+}
+"""
+        self.tree.add(os.path.join(uboot_dir, "u-boot_%.bbappend"), content.strip())
+
+    def create_rpi_uboot_scr_bbappend(self):
+        scr_dir = os.path.join("recipes-bsp", "rpi-u-boot-scr")
+        files_dir = os.path.join(scr_dir, "files")
+        
+        self.tree.remove(os.path.join(scr_dir, "rpi-u-boot-scr_%.bbappend"))
+            
+        boot_cmd_content = """test -n "${BOOT_ORDER}" || setenv BOOT_ORDER "A B"
+test -n "${BOOT_A_LEFT}" || setenv BOOT_A_LEFT 3
+test -n "${BOOT_B_LEFT}" || setenv BOOT_B_LEFT 3
+
+setenv boot_part ""
+for target in ${BOOT_ORDER}; do
+    if test "${boot_part}" = ""; then
+        if test "${target}" = "A"; then
+            if test ${BOOT_A_LEFT} -gt 0; then
+                setenv boot_part "2"
+                setenv rauc_slot "A"
+                setexpr BOOT_A_LEFT ${BOOT_A_LEFT} - 1
+            fi
+        elif test "${target}" = "B"; then
+            if test ${BOOT_B_LEFT} -gt 0; then
+                setenv boot_part "3"
+                setenv rauc_slot "B"
+                setexpr BOOT_B_LEFT ${BOOT_B_LEFT} - 1
+            fi
+        fi
+    fi
+done
+
+saveenv
+
+if test "${boot_part}" = ""; then
+    setenv BOOT_ORDER "A B"
+    setenv BOOT_A_LEFT 3
+    setenv BOOT_B_LEFT 3
+    saveenv
+    reset
+fi
+
+setenv bootargs "console=ttyS0,115200 root=/dev/mmcblk0p${boot_part} rootfstype=ext4 rootwait rauc.slot=${rauc_slot}"
+fatload mmc 0:1 ${kernel_addr_r} @@KERNEL_IMAGETYPE@@
+@@KERNEL_BOOTCMD@@ ${kernel_addr_r} - ${fdt_addr}
+"""
+        self.tree.add(os.path.join(files_dir, "boot.cmd.in"), boot_cmd_content.strip())
+
+        content = """FILESEXTRAPATHS:prepend := "${THISDIR}/files:"
+"""
+        self.tree.add(os.path.join(scr_dir, "rpi-u-boot-scr.bbappend"), content.strip())
+
+    def create_kernel_rauc_bbappend(self):
+        kernel_dir = os.path.join("recipes-kernel", "linux")
+        files_dir = os.path.join(kernel_dir, "files")
+        
+        cfg_content = """CONFIG_BLK_DEV_LOOP=y
+CONFIG_SQUASHFS=y
+CONFIG_SQUASHFS_FILE_CACHE=y
+CONFIG_SQUASHFS_FILE_DIRECT=y
+CONFIG_SQUASHFS_DECOMP_SINGLE=y
+CONFIG_SQUASHFS_XATTR=y
+CONFIG_SQUASHFS_ZLIB=y
+CONFIG_SQUASHFS_XZ=y
+"""
+        self.tree.add(os.path.join(files_dir, "rauc.cfg"), cfg_content.strip())
+            
+        bbappend_content = """FILESEXTRAPATHS:prepend := "${THISDIR}/files:"
+SRC_URI += "file://rauc.cfg"
+"""
+        self.tree.add(os.path.join(kernel_dir, "linux-raspberrypi_%.bbappend"), bbappend_content.strip())
+
+    def setup_rauc_recipes(self, size, machine):
+        self.create_rauc_wks_file(size)
+        self.create_rauc_config(machine)
+        self.create_uboot_bbappend()
+        self.create_rpi_uboot_scr_bbappend()
+        self.create_kernel_rauc_bbappend()
+
+    def create_bundle_recipe(self):
+        bundle_bb = os.path.join("recipes-core", "bundles", "update-bundle.bb")
+        content = """DESCRIPTION = "RAUC Update Bundle"
+LICENSE = "MIT"
+LIC_FILES_CHKSUM = "file://${COMMON_LICENSE_DIR}/MIT;md5=0835ade698e0bcf8506ecda2f7b4f302"
+
+inherit bundle
+
+RAUC_BUNDLE_COMPATIBLE = "${MACHINE}"
+RAUC_BUNDLE_VERSION = "v1"
+RAUC_BUNDLE_DESCRIPTION = "RAUC Bundle generated by Yoctool"
+RAUC_BUNDLE_FORMAT = "plain"
+
+RAUC_BUNDLE_SLOTS = "rootfs" 
+RAUC_SLOT_rootfs = "${RAUC_TARGET_IMAGE}"
+RAUC_SLOT_rootfs[fstype] = "ext4"
+
+RAUC_KEY_FILE = "${RAUC_KEY_FILE_REAL}"
+RAUC_CERT_FILE = "${RAUC_CERT_FILE_REAL}"
+"""
+        self.tree.add(bundle_bb, content.strip() + "\n")
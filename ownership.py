@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+
+SCAN_WORKERS = 8
+
+# Trees inside a build directory that only bitbake (running as the invoking
+# user) writes to. Once a full pass has found them clean, incremental passes
+# skip them.
+BITBAKE_OWNED_DIRS = {"tmp", "sstate-cache", "downloads", "cache"}
+
+def marker_path(marker_dir, root):
+    key = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()[:16]
+    return os.path.join(marker_dir, f"ownership-{key}.json")
+
+def _load_marker(path, root, uid, gid):
+    try:
+        with open(path, "r") as f: data = json.load(f)
+    except (OSError, ValueError): return None
+    if data.get("root") != os.path.abspath(root) or data.get("uid") != uid or data.get("gid") != gid:
+        return None
+    return data.get("time")
+
+class _OwnershipScan:
+    def __init__(self, root, uid, gid, since, workers):
+        self.root = os.path.abspath(root)
+        self.uid = uid
+        self.gid = gid
+        self.since = since
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.scanned = 0
+        self.checked = 0
+        self.fixed = 0
+        self.errors = 0
+
+    def run(self):
+        self._check(self.root, os.lstat(self.root))
+        self.queue.put((self.root, True))
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads: t.start()
+        self.queue.join()
+        for _ in threads: self.queue.put(None)
+        for t in threads: t.join()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None: return
+                self._scan_dir(*item)
+            finally:
+                self.queue.task_done()
+
+    def _check(self, path, st):
+        if st.st_uid == self.uid and st.st_gid == self.gid:
+            return 0
+        try:
+            os.lchown(path, self.uid, self.gid)
+            return 1
+        except OSError:
+            with self.lock: self.errors += 1
+            return 0
+
+    def _scan_dir(self, path, check_entries):
+        scanned = checked = fixed = 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    scanned += 1
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if (self.since is not None and entry.name in BITBAKE_OWNED_DIRS
+                                    and os.path.isdir(os.path.join(path, "conf"))):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                            checked += 1
+                            fixed += self._check(entry.path, st)
+                            # A directory that has not changed since the last pass
+                            # has no new entries, so its files need no lstat.
+                            changed = self.since is None or st.st_ctime >= self.since
+                            self.queue.put((entry.path, changed))
+                        elif check_entries:
+                            st = entry.stat(follow_symlinks=False)
+                            checked += 1
+                            fixed += self._check(entry.path, st)
+                    except OSError:
+                        continue
+        except OSError:
+            with self.lock: self.errors += 1
+        with self.lock:
+            self.scanned += scanned
+            self.checked += checked
+            self.fixed += fixed
+
+def repair_ownership(root, uid, gid, marker_dir, workers=SCAN_WORKERS):
+    marker = marker_path(marker_dir, root)
+    since = _load_marker(marker, root, uid, gid)
+    start = time.time()
+
+    scan = _OwnershipScan(root, uid, gid, since, workers)
+    scan.run()
+
+    if not scan.errors:
+        os.makedirs(marker_dir, exist_ok=True)
+        with open(marker, "w") as f:
+            json.dump({"root": os.path.abspath(root), "uid": uid, "gid": gid, "time": start}, f)
+
+    return {
+        "incremental": since is not None,
+        "scanned": scan.scanned,
+        "checked": scan.checked,
+        "fixed": scan.fixed,
+        "errors": scan.errors,
+        "seconds": time.time() - start,
+    }
+
+def chown_written(paths, uid, gid, top):
+    # Files the app (running as root) has just written under `top`: fix them
+    # and the directories between them and `top`, without walking any tree.
+    top = os.path.abspath(top)
+    done = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        while path not in done:
+            done.add(path)
+            try:
+                st = os.lstat(path)
+                if st.st_uid != uid or st.st_gid != gid:
+                    os.lchown(path, uid, gid)
+            except OSError:
+                pass
+            if path == top or not path.startswith(top + os.sep): break
+            path = os.path.dirname(path)
@@ -0,0 +1,132 @@
+import os
+import math
+import time
+import threading
+
+PRESSURE_DIR = "/proc/pressure"
+RESOURCES = ("cpu", "io", "memory")
+
+# Peak RSS of one heavy compile job (gcc LTO, webkit, rustc) is 1.5-2 GiB.
+MEM_PER_JOB = 2 * 1024 ** 3
+# Across a whole build most tasks are not heavy compiles (fetch, unpack,
+# packaging, small C recipes), so the average per running job is lower.
+MEM_PER_THREAD = 1024 ** 3
+
+# Bitbake compares the growth of "some total" (microseconds stalled) per
+# second against these; the floors are the values suggested in the Yocto
+# manual, raised when the idle host is already above them.
+PRESSURE_FLOOR = {"cpu": 15000, "io": 15000, "memory": 1000}
+PRESSURE_MARGIN = {"cpu": 10000, "io": 10000, "memory": 1000}
+PRESSURE_MAX = 1000000
+
+def is_available():
+    return all(os.path.exists(os.path.join(PRESSURE_DIR, r)) for r in RESOURCES)
+
+def read_totals():
+    # {resource: "some total" in microseconds}
+    totals = {}
+    for r in RESOURCES:
+        try:
+            with open(os.path.join(PRESSURE_DIR, r), "r") as f:
+                for line in f:
+                    if line.startswith("some"):
+                        totals[r] = int(line.rsplit("total=", 1)[1])
+        except (OSError, ValueError, IndexError):
+            pass
+    return totals
+
+def sample_rates(interval=1.0, previous=None):
+    # Stall rate per resource in microseconds per second (0..1000000).
+    first = previous or (time.monotonic(), read_totals())
+    if previous is None:
+        time.sleep(interval)
+    now = time.monotonic()
+    totals = read_totals()
+    elapsed = max(1e-3, now - first[0])
+    rates = {r: (totals[r] - first[1][r]) / elapsed for r in totals if r in first[1]}
+    return rates, (now, totals)
+
+def memory_info():
+    info = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("MemTotal", "MemAvailable"):
+                    info[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return info.get("MemTotal", 0), info.get("MemAvailable", 0)
+
+def auto_tune(cores, mem_available):
+    # One task's -j must fit the peak of a heavy compile. Beyond that, run a
+    # task per core as bitbake does by default and leave oversubscription to
+    # "-l cores" and BB_PRESSURE_MAX_*. Only when memory cannot hold one
+    # average job per core is the total (tasks x make jobs) capped by it.
+    if not mem_available:
+        return cores, cores
+    parallel_make = max(1, min(cores, mem_available // MEM_PER_JOB))
+    budget = mem_available // MEM_PER_THREAD
+    if budget >= cores:
+        return cores, parallel_make
+    budget = max(1, budget)
+    bb_threads = max(1, math.isqrt(budget))
+    parallel_make = max(1, min(parallel_make, budget // bb_threads))
+    return max(1, min(cores, budget // parallel_make)), parallel_make
+
+def pressure_limits(baseline):
+    limits = {}
+    for r in RESOURCES:
+        base = baseline.get(r, 0) if baseline else 0
+        limits[r] = int(min(PRESSURE_MAX, max(PRESSURE_FLOOR[r], base + PRESSURE_MARGIN[r])))
+    return limits
+
+def config_lines(bb_threads, parallel_make, cores, baseline=None):
+    lines = [
+        f'BB_NUMBER_THREADS = "{bb_threads}"\n',
+        # -l keeps make/ninja from starting jobs once the load exceeds the cores.
+        f'PARALLEL_MAKE = "-j {parallel_make} -l {cores}"\n',
+    ]
+    if is_available():
+        limits = pressure_limits(baseline)
+        lines.append(f'BB_PRESSURE_MAX_CPU = "{limits["cpu"]}"\n')
+        lines.append(f'BB_PRESSURE_MAX_IO = "{limits["io"]}"\n')
+        lines.append(f'BB_PRESSURE_MAX_MEMORY = "{limits["memory"]}"\n')
+    return lines
+
+def describe(rates, limits=None):
+    limits = limits or pressure_limits(None)
+    parts = [f"{r} {rates.get(r, 0) / 10000:.0f}%" for r in RESOURCES]
+    ratio = {r: rates.get(r, 0) / limits[r] for r in RESOURCES}
+    worst = max(ratio, key=ratio.get)
+    if ratio[worst] >= 1:
+        verdict = f"limited by {worst.upper()}"
+    elif ratio[worst] >= 0.5:
+        verdict = f"approaching {worst.upper()} limit"
+    else:
+        verdict = "not pressure-limited"
+    return "Pressure: " + ", ".join(parts) + " - " + verdict
+
+class PressureMonitor:
+    def __init__(self, callback, interval=2.0, limits=None):
+        self.callback = callback
+        self.interval = interval
+        self.limits = limits
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if not is_available() or self.thread: return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread = None
+
+    def _run(self):
+        state = (time.monotonic(), read_totals())
+        while not self.stop_event.wait(self.interval):
+            rates, state = sample_rates(previous=state)
+            self.callback(rates, describe(rates, self.limits))
@@ -0,0 +1,46 @@
+import os
+import subprocess
+
+import deploy_index
+
+SSH_OPTS = ["-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null"]
+SCP_LOG_MARKERS = ("Sending file modes", "Transferred", "Bytes per second", "Sink")
+
+def find_bundle(deploy_dir, bundle="update-bundle"):
+    index = deploy_index.get(deploy_dir)
+    entry = index.find(bundle, ("raucb",)) or index.newest("raucb")
+    return entry["path"] if entry else None
+
+def deploy_bundle(bundle_file, ip, user, pwd, log):
+    # Returns (ok, message). Copies the bundle to /tmp on the target, then
+    # installs it and reboots into the other slot.
+    file_name = os.path.basename(bundle_file)
+    target_path = f"/tmp/{file_name}"
+
+    log(f"Starting SCP transfer: {file_name} -> {ip}...")
+
+    cmd_scp = ["sshpass", "-p", pwd, "scp", "-v"] + SSH_OPTS + [bundle_file, f"{user}@{ip}:{target_path}"]
+    cmd_install = ["sshpass", "-p", pwd, "ssh"] + SSH_OPTS + [f"{user}@{ip}", f"rauc install {target_path} && reboot"]
+
+    process = subprocess.Popen(cmd_scp, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    for line in process.stdout:
+        line_str = line.strip()
+        if line_str and any(m in line_str for m in SCP_LOG_MARKERS):
+            log(f"[SCP] {line_str}")
+    process.wait()
+
+    if process.returncode != 0:
+        log(f"SCP ERROR: Transfer failed with code {process.returncode}")
+        return False, "Failed to upload the update bundle."
+
+    log(f"SUCCESS: {file_name} uploaded.")
+    log("Installing update & Rebooting. Please wait...")
+    install_process = subprocess.run(cmd_install, capture_output=True, text=True)
+
+    # 255: the connection drops when the target reboots.
+    if install_process.returncode in (0, 255):
+        log(f"[INSTALL] {install_process.stdout.strip()}")
+        return True, "Update installed successfully!\nDevice is rebooting into the new partition."
+
+    log(f"INSTALL ERROR: {install_process.stderr}")
+    return False, f"Update failed during rauc install.\nError: {install_process.stderr}"
@@ -0,0 +1,177 @@
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+import glob
+
+# Each run is stored as <stamp>-<label>.log.gz plus a side index <...>.idx.
+# The log is a series of independent gzip members (one per block of lines),
+# so any line can be read back by seeking to its block and decompressing
+# only that block. The index (JSON lines) records the header, the byte
+# offset and first line of every block, ERROR/WARNING/task marks and the
+# final result.
+
+BLOCK_BYTES = 256 * 1024
+FLUSH_SECONDS = 5
+KEEP_RUNS = 50
+MAX_TOTAL_BYTES = 512 * 1024 * 1024
+
+TASK_RE = re.compile(r': task (do_\w+): (Started|Failed)')
+
+def classify(line):
+    if line.startswith("ERROR:"): return "error"
+    if line.startswith("WARNING:"): return "warning"
+    if TASK_RE.search(line): return "task"
+    return None
+
+def _slug(label):
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', label).strip("-")[:40] or "run"
+
+def rotate(directory, keep=KEEP_RUNS, max_bytes=MAX_TOTAL_BYTES):
+    # Oldest first; never leaves more than `keep` runs or `max_bytes`.
+    logs = sorted(glob.glob(os.path.join(directory, "*.log.gz")))
+    sizes = {}
+    for path in logs:
+        try: sizes[path] = os.path.getsize(path)
+        except OSError: sizes[path] = 0
+    total = sum(sizes.values())
+    while logs and (len(logs) > keep or total > max_bytes):
+        path = logs.pop(0)
+        total -= sizes[path]
+        for p in (path, path[:-len(".log.gz")] + ".idx"):
+            try: os.remove(p)
+            except OSError: pass
+
+class RunLog:
+    def __init__(self, directory, label, cmd=None):
+        os.makedirs(directory, exist_ok=True)
+        rotate(directory, KEEP_RUNS - 1)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+        base = os.path.join(directory, f"{stamp}-{_slug(label)}")
+        self.path = base + ".log.gz"
+        self.index_path = base + ".idx"
+        self.f = open(self.path, "wb")
+        self.idx = open(self.index_path, "w")
+        self.buf = []
+        self.buf_size = 0
+        self.lines = 0
+        self.block_first = 0
+        self.last_flush = now
+        self.counts = {"error": 0, "warning": 0, "task": 0}
+        self._index({"label": label, "cmd": cmd, "started": now})
+
+    def _index(self, record):
+        self.idx.write(json.dumps(record) + "\n")
+
+    def write(self, line):
+        for part in line.split("\n"):
+            kind = classify(part)
+            if kind:
+                self.counts[kind] += 1
+                self._index({"m": kind, "l": self.lines, "t": part[:300]})
+            data = (part + "\n").encode("utf-8", "replace")
+            self.buf.append(data)
+            self.buf_size += len(data)
+            self.lines += 1
+        if self.buf_size >= BLOCK_BYTES or time.time() - self.last_flush >= FLUSH_SECONDS:
+            self._flush_block()
+
+    def _flush_block(self):
+        self.last_flush = time.time()
+        if not self.buf: return
+        offset = self.f.tell()
+        self.f.write(gzip.compress(b"".join(self.buf), compresslevel=6))
+        self._index({"b": offset, "l": self.block_first})
+        self.block_first = self.lines
+        self.buf = []
+        self.buf_size = 0
+        self.f.flush()
+        self.idx.flush()
+
+    def close(self, ok):
+        self._flush_block()
+        self._index({"end": time.time(), "ok": bool(ok), "lines": self.lines, "counts": self.counts})
+        self.f.close()
+        self.idx.close()
+
+class LogReader:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len(".log.gz")] + ".idx"
+        self.header = {}
+        self.end = None
+        self.blocks = []
+        self.marks = []
+        with open(self.index_path, "r") as f:
+            for n, raw in enumerate(f):
+                try: rec = json.loads(raw)
+                except ValueError: continue    # run still being written, or cut short
+                if n == 0: self.header = rec
+                elif "m" in rec: self.marks.append((rec["l"], rec["m"], rec["t"]))
+                elif "b" in rec: self.blocks.append((rec["l"], rec["b"]))
+                elif "end" in rec: self.end = rec
+        self.blocks.sort()
+        self.block_starts = [b[0] for b in self.blocks]
+        self.size = os.path.getsize(path)
+        self.cache = {}
+
+    def _read_block(self, i):
+        if i not in self.cache:
+            offset = self.blocks[i][1]
+            stop = self.blocks[i + 1][1] if i + 1 < len(self.blocks) else self.size
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read(stop - offset)
+            if len(self.cache) > 8: self.cache.clear()
+            self.cache[i] = gzip.decompress(data).decode("utf-8", "replace").split("\n")[:-1]
+        return self.cache[i]
+
+    @property
+    def line_count(self):
+        if self.end: return self.end["lines"]
+        if not self.blocks: return 0
+        return self.blocks[-1][0] + len(self._read_block(len(self.blocks) - 1))
+
+    def lines(self, start, end):
+        # Lines [start, end) decompressing only the blocks that hold them.
+        start = max(0, start)
+        out = []
+        i = max(0, bisect.bisect_right(self.block_starts, start) - 1)
+        while i < len(self.blocks) and self.blocks[i][0] < end:
+            first = self.blocks[i][0]
+            block = self._read_block(i)
+            out.extend(block[max(0, start - first):max(0, end - first)])
+            i += 1
+        return out
+
+def _last_record(index_path):
+    with open(index_path, "rb") as f:
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - 4096))
+        tail = f.read().splitlines()
+    try: return json.loads(tail[-1]) if tail else {}
+    except ValueError: return {}
+
+def list_runs(directory):
+    # Newest first, reading only the first and last record of each index.
+    runs = []
+    for index_path in sorted(glob.glob(os.path.join(directory, "*.idx")), reverse=True):
+        try:
+            with open(index_path, "r") as f:
+                header = json.loads(f.readline())
+            end = _last_record(index_path)
+        except (OSError, ValueError):
+            continue
+        if "end" not in end: end = {}
+        runs.append({
+            "path": index_path[:-len(".idx")] + ".log.gz",
+            "label": header.get("label", ""),
+            "started": header.get("started", 0),
+            "ok": end.get("ok"),
+            "lines": end.get("lines"),
+            "counts": end.get("counts", {}),
+        })
+    return runs
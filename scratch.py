@@ -0,0 +1,259 @@
+import os
+import pwd
+import json
+import shutil
+import subprocess
+import threading
+import collections
+
+import buildstats
+import pressure
+
+# "Fast scratch": TMPDIR on a tmpfs sized from free memory, with rm_work so
+# each recipe's work directory is dropped once it is done. The mount point
+# is always TMPDIR_NAME, so when the build would not fit the same path is
+# simply left on disk. Images are copied to PERSIST_NAME after each build,
+# since the tmpfs does not survive a reboot.
+
+TMPDIR_NAME = "tmp-scratch"
+PERSIST_NAME = "deploy"
+MIN_RESERVE = 4 * 1024 ** 3
+# Smaller than this is not worth mounting (and size=0 means unlimited).
+MIN_SIZE = 8 * 1024 ** 3
+RESERVE_FRACTION = 0.25
+MARGIN = 1.2
+SAMPLE_INTERVAL = 5
+
+def mount_point(build_path):
+    return os.path.join(build_path, TMPDIR_NAME)
+
+def persist_dir(build_path):
+    return os.path.join(build_path, PERSIST_NAME)
+
+def is_mounted(build_path):
+    return os.path.ismount(mount_point(build_path))
+
+def used_bytes(path):
+    st = os.statvfs(path)
+    return (st.f_blocks - st.f_bfree) * st.f_frsize
+
+def tmpfs_size():
+    # What a tmpfs may grow to while leaving room for the compilers
+    # themselves; space already used by our own tmpfs counts as available.
+    total, available = pressure.memory_info()
+    reserve = max(MIN_RESERVE, int(total * RESERVE_FRACTION))
+    return max(0, available - reserve)
+
+def estimate_from_buildstats(tmpdir, rm_work=True):
+    # Peak scratch use of the last build from the per-task "IO write_bytes"
+    # of buildstats: with rm_work a recipe's writes only count while it is
+    # being built, so take the peak of the overlapping recipe intervals.
+    stats_dir = buildstats.latest_dir(tmpdir)
+    if not stats_dir: return 0
+    recipes = collections.defaultdict(lambda: [None, None, 0])
+    try:
+        with os.scandir(stats_dir) as it:
+            for recipe in it:
+                if not recipe.is_dir(): continue
+                r = recipes[recipe.name]
+                with os.scandir(recipe.path) as files:
+                    for entry in files:
+                        if not entry.name.startswith("do_"): continue
+                        with open(entry.path, "r", errors="replace") as f:
+                            for line in f:
+                                key, _, value = line.partition(":")
+                                try:
+                                    if key == "Started":
+                                        v = float(value)
+                                        r[0] = v if r[0] is None else min(r[0], v)
+                                    elif key == "Ended":
+                                        v = float(value)
+                                        r[1] = v if r[1] is None else max(r[1], v)
+                                    elif key == "IO write_bytes":
+                                        r[2] += int(value)
+                                except ValueError:
+                                    pass
+    except OSError:
+        return 0
+    if not rm_work:
+        return sum(r[2] for r in recipes.values())
+    points = []
+    for start, end, written in recipes.values():
+        if start is None or end is None or not written: continue
+        points.append((start, written))
+        points.append((end, -written))
+    peak = current = 0
+    for _, delta in sorted(points):
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+class Scratch:
+    def __init__(self, build_path, cache_dir, user, log, before_remount=None):
+        self.build_path = build_path
+        self.usage_file = os.path.join(cache_dir, "scratch-usage.json")
+        self.user = user
+        self.log = log
+        # Called before mounting or unmounting, to stop a bitbake server
+        # that may have TMPDIR open.
+        self.before_remount = before_remount
+        self.key = None
+        self.peak = 0
+        self.sampler = None
+        self.sampling = threading.Event()
+
+    def _load_usage(self):
+        try:
+            with open(self.usage_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_usage(self, usage):
+        try:
+            os.makedirs(os.path.dirname(self.usage_file), exist_ok=True)
+            tmp = self.usage_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(usage, f, indent=1, sort_keys=True)
+            if os.geteuid() == 0: os.chown(tmp, *self._ids())
+            os.replace(tmp, self.usage_file)
+        except OSError:
+            pass
+
+    def estimate(self, key):
+        recorded = self._load_usage().get(key, 0)
+        from_stats = max(estimate_from_buildstats(mount_point(self.build_path)),
+                         estimate_from_buildstats(os.path.join(self.build_path, "tmp")))
+        return int(max(recorded, from_stats) * MARGIN)
+
+    def _ids(self):
+        try:
+            pw = pwd.getpwnam(self.user)
+            return pw.pw_uid, pw.pw_gid
+        except (KeyError, TypeError):
+            return os.getuid(), os.getgid()
+
+    def _run(self, cmd):
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def unmount(self):
+        if not is_mounted(self.build_path): return True
+        if self.before_remount: self.before_remount()
+        proc = self._run(["umount", mount_point(self.build_path)])
+        if proc.returncode != 0:
+            self.log(f"Could not unmount {mount_point(self.build_path)}: {proc.stderr.strip()}")
+            return False
+        self.log(f"Unmounted scratch tmpfs {mount_point(self.build_path)}.")
+        return True
+
+    def prepare(self, key):
+        # Returns True when TMPDIR is on tmpfs for this build.
+        self.key = key
+        mnt = mount_point(self.build_path)
+        mounted = is_mounted(self.build_path)
+        size = tmpfs_size() + (used_bytes(mnt) if mounted else 0)
+        need = self.estimate(key)
+        gib = 1024 ** 3
+
+        if size < MIN_SIZE:
+            self.log(f"Fast scratch: only {size / gib:.1f} GiB of RAM can be spared; building on disk.")
+            self.unmount()
+            return False
+        if not need:
+            # The disk build leaves buildstats in the same TMPDIR, which gives
+            # the estimate for the next one.
+            self.log(f"Fast scratch: no previous build of {key} to estimate from; building on disk this time.")
+            self.unmount()
+            return False
+        if need > size:
+            self.log(f"Fast scratch: {key} needs about {need / gib:.1f} GiB but only {size / gib:.1f} GiB of RAM can be spared; building on disk.")
+            self.unmount()
+            return False
+        if os.geteuid() != 0:
+            self.log("Fast scratch: mounting a tmpfs needs root; building on disk.")
+            return False
+
+        os.makedirs(mnt, exist_ok=True)
+        uid, gid = self._ids()
+        if mounted:
+            cmd = ["mount", "-o", f"remount,size={size}", mnt]
+        else:
+            if self.before_remount: self.before_remount()
+            cmd = ["mount", "-t", "tmpfs", "-o", f"size={size},mode=0755,uid={uid},gid={gid},noatime", "tmpfs", mnt]
+        proc = self._run(cmd)
+        if proc.returncode != 0 and mounted:
+            self.log(f"Fast scratch: could not resize the tmpfs ({proc.stderr.strip()}); keeping its current size.")
+        elif proc.returncode != 0:
+            self.log(f"Fast scratch: mount failed ({proc.stderr.strip()}); building on disk.")
+            return False
+        else:
+            self.log(f"Fast scratch: TMPDIR on tmpfs ({size / gib:.1f} GiB limit, about {need / gib:.1f} GiB expected).")
+        self._start_sampler()
+        return True
+
+    def _start_sampler(self):
+        self.peak = 0
+        self.sampling.clear()
+        mnt = mount_point(self.build_path)
+
+        def sample():
+            while True:
+                try: self.peak = max(self.peak, used_bytes(mnt))
+                except OSError: pass
+                if self.sampling.wait(SAMPLE_INTERVAL): break
+        self.sampler = threading.Thread(target=sample, daemon=True)
+        self.sampler.start()
+
+    def finish(self, machines):
+        # Record the measured peak and copy the images to persistent storage.
+        if self.sampler:
+            self.sampling.set()
+            self.sampler.join()
+            self.sampler = None
+            usage = self._load_usage()
+            usage[self.key] = max(self.peak, int(usage.get(self.key, 0) * 0.8))
+            self._save_usage(usage)
+            self.log(f"Fast scratch: peak tmpfs use {self.peak / 1024 ** 3:.1f} GiB.")
+        copied = 0
+        for machine in machines:
+            src = os.path.join(mount_point(self.build_path), "deploy", "images", machine)
+            dst = os.path.join(persist_dir(self.build_path), "images", machine)
+            copied += sync_tree(src, dst, *self._ids())
+        if copied:
+            self.log(f"Copied {copied} deploy files to {persist_dir(self.build_path)}.")
+
+def sync_tree(src, dst, uid, gid):
+    # Copy new or changed files and symlinks; nothing is deleted.
+    if not os.path.isdir(src): return 0
+    copied = 0
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        target_dir = os.path.normpath(os.path.join(dst, rel))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir, exist_ok=True)
+            if os.geteuid() == 0: os.chown(target_dir, uid, gid)
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            s = os.path.join(root, name)
+            d = os.path.join(target_dir, name)
+            try:
+                if os.path.islink(s):
+                    link = os.readlink(s)
+                    if os.path.islink(d) and os.readlink(d) == link: continue
+                    if os.path.lexists(d): os.remove(d)
+                    os.symlink(link, d)
+                    if os.geteuid() == 0: os.lchown(d, uid, gid)
+                else:
+                    st = os.stat(s)
+                    try:
+                        dt = os.stat(d)
+                        if dt.st_size == st.st_size and int(dt.st_mtime) == int(st.st_mtime): continue
+                    except OSError:
+                        pass
+                    tmp = os.path.join(target_dir, f".{name}.tmp")
+                    shutil.copy2(s, tmp)
+                    if os.geteuid() == 0: os.chown(tmp, uid, gid)
+                    os.replace(tmp, d)
+                copied += 1
+            except OSError:
+                continue
+    return copied
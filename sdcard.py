@@ -0,0 +1,34 @@
+import os
+import shlex
+import subprocess
+
+import deploy_index
+
+# In order of preference; only formats flash() can write.
+FLASH_TYPES = ("sdimg", "wic.bz2", "wic.zst", "wic.xz", "wic.gz", "wic")
+
+def find_image(deploy_dir, image):
+    entry = deploy_index.get(deploy_dir).find(image, FLASH_TYPES)
+    return entry["path"] if entry else None
+
+def flash(img, dev, progress, log):
+    # progress(percent, line) is called about twice a second while writing.
+    import flash_engine
+    subprocess.run(f"umount {shlex.quote(dev)}*", shell=True, stderr=subprocess.DEVNULL)
+
+    log(f"Flashing {os.path.basename(img)}...")
+
+    def on_progress(s):
+        progress(s["percent"], flash_engine.format_progress(s))
+
+    try:
+        result = flash_engine.flash(img, dev, on_progress)
+    except (OSError, RuntimeError, ValueError, EOFError) as e:
+        log(f"Flash error: {e}")
+        return False
+    log(f"Wrote {result['bytes'] / 1e6:.0f} MB in {result['seconds']:.0f} s ({result['rate'] / 1e6:.1f} MB/s).")
+
+    log("Refreshing partition table...")
+    subprocess.run(f"partprobe {shlex.quote(dev)}", shell=True)
+    subprocess.run("udevadm settle", shell=True)
+    return True
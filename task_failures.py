@@ -0,0 +1,108 @@
+import os
+import re
+import glob
+from concurrent.futures import ThreadPoolExecutor
+
+# Failed tasks are recognised from the bitbake output (knotty text or the
+# event helper); for each one only the tail of its log.do_<task> is read,
+# which may be hundreds of MB for a compile step.
+
+TAIL_BYTES = 16 * 1024
+TAIL_LINES = 80
+MAX_WORKERS = 4
+
+LOGFILE_RE = re.compile(r'Logfile of failure stored in: (\S+)')
+TASK_FAILED_RE = re.compile(r'ERROR: Task \((.+):(do_\w+)\) failed')
+
+def recipe_of_bbfile(fn):
+    # "mc:x:virtual:native:/path/foo_1.0.bb" -> "foo-native"
+    parts = fn.split(":")
+    path = parts[-1]
+    name = os.path.basename(path).rsplit(".bb", 1)[0].split("_")[0]
+    variants = parts[:-1]
+    if "native" in variants: return f"{name}-native"
+    if "nativesdk" in variants: return f"nativesdk-{name}"
+    return name
+
+def task_of_logfile(path):
+    # .../tmp/work/<arch>/<recipe>/<version>/temp/log.do_compile.12345
+    parts = os.path.normpath(path).split(os.sep)
+    base = parts[-1].split(".")
+    task = base[1] if len(base) > 1 else parts[-1]
+    recipe = parts[-4] if len(parts) >= 4 and parts[-2] == "temp" else ""
+    return recipe, task
+
+class FailureCollector:
+    def __init__(self):
+        self.failures = []
+        self.seen = {}
+
+    def _add(self, recipe, task, logfile=None):
+        key = (recipe, task)
+        if key in self.seen:
+            if logfile and not self.seen[key]["logfile"]:
+                self.seen[key]["logfile"] = logfile
+            return
+        entry = {"recipe": recipe, "task": task, "logfile": logfile}
+        self.seen[key] = entry
+        self.failures.append(entry)
+
+    def feed(self, line):
+        m = LOGFILE_RE.search(line)
+        if m:
+            recipe, task = task_of_logfile(m.group(1))
+            self._add(recipe, task, m.group(1))
+            return
+        m = TASK_FAILED_RE.search(line)
+        if m:
+            self._add(recipe_of_bbfile(m.group(1)), m.group(2))
+
+    def feed_event(self, event):
+        d = event.data
+        if event.kind == "task_finished" and d.get("failed"):
+            # The event names the recipe by PF; the log path gives PN.
+            logfile = d.get("logfile")
+            if logfile:
+                self._add(*task_of_logfile(logfile), logfile)
+            else:
+                self._add(d.get("recipe", ""), d.get("task", ""))
+
+def locate_log(tmp_dir, recipe, task):
+    # log.do_<task> is a symlink to the latest run of that task.
+    pattern = os.path.join(tmp_dir, "work", "*", recipe, "*", "temp", f"log.{task}")
+    matches = [p for p in glob.glob(pattern) if os.path.exists(p)]
+    return max(matches, key=os.path.getmtime) if matches else None
+
+def tail_lines(path, max_bytes=TAIL_BYTES, max_lines=TAIL_LINES):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_bytes))
+        data = f.read()
+    lines = data.decode("utf-8", "replace").splitlines()
+    if size > max_bytes and lines:
+        lines = lines[1:]    # partial first line
+    return lines[-max_lines:], size
+
+def _extract_one(failure, tmp_dir):
+    result = dict(failure)
+    logfile = failure["logfile"]
+    if (not logfile or not os.path.exists(logfile)) and tmp_dir and failure["recipe"]:
+        logfile = locate_log(tmp_dir, failure["recipe"], failure["task"]) or logfile
+    result["logfile"] = logfile
+    result["lines"] = []
+    result["size"] = 0
+    result["error"] = None
+    if not logfile:
+        result["error"] = "log file not found"
+        return result
+    try:
+        result["lines"], result["size"] = tail_lines(logfile)
+    except OSError as e:
+        result["error"] = str(e)
+    return result
+
+def extract(failures, tmp_dir=None):
+    if not failures: return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(failures))) as pool:
+        return list(pool.map(lambda f: _extract_one(f, tmp_dir), failures))
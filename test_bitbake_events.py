@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import bitbake_events
+
+class HelperTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_installed_once(self):
+        path = bitbake_events.install_helper(self.dir)
+        self.assertEqual(os.path.dirname(path), self.dir)
+        with open(path) as f:
+            self.assertEqual(f.read(), bitbake_events.HELPER_SCRIPT)
+        os.utime(path, (1, 1))
+        self.assertEqual(bitbake_events.install_helper(self.dir), path)
+        self.assertEqual(os.path.getmtime(path), 1)
+        self.assertEqual(os.listdir(self.dir), [bitbake_events.HELPER_NAME])
+
+    def test_helper_compiles(self):
+        compile(bitbake_events.HELPER_SCRIPT, bitbake_events.HELPER_NAME, "exec")
+
+    def test_command(self):
+        self.assertEqual(bitbake_events.build_helper_cmd("/home/a b/h.py", "core-image-minimal mc:x:y"),
+                         "python3 '/home/a b/h.py' \"\" core-image-minimal mc:x:y")
+        self.assertEqual(bitbake_events.build_helper_cmd("/h.py", ["img"], "cleanall"), "python3 /h.py cleanall img")
+
+class EventTest(unittest.TestCase):
+    def test_parse_and_format(self):
+        self.assertIsNone(bitbake_events.parse_event("NOTE: plain text"))
+        self.assertIsNone(bitbake_events.parse_event("{not json"))
+        event = bitbake_events.parse_event('{"type": "task_finished", "recipe": "zlib", "task": "do_compile", "duration": 2.5, "failed": false}')
+        self.assertEqual(event.kind, "task_finished")
+        self.assertEqual(bitbake_events.format_event(event), "NOTE: recipe zlib: task do_compile: Succeeded (2.5s)")
+
+    def test_progress_never_goes_back(self):
+        tracker = bitbake_events.ProgressTracker()
+        events = [("parse", {"current": 5, "total": 10}), ("cache", {"current": 0, "total": 10}),
+                  ("runqueue", {"completed": 50, "total": 100}), ("setscene", {"completed": 1, "total": 10})]
+        seen = []
+        for kind, data in events:
+            tracker.update(bitbake_events.BuildEvent(kind, data))
+            seen.append(tracker.percent)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(seen[2], 35 + 65 * 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import bitbake_server
+
+class ResidentServerTest(unittest.TestCase):
+    def setUp(self):
+        self.poky = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.poky)
+        self.build_path = os.path.join(self.poky, "build")
+        os.makedirs(os.path.join(self.build_path, "conf"))
+        self.marker = os.path.join(self.poky, "stopped")
+        # `bitbake -m` that takes far longer than closing a window may.
+        with open(os.path.join(self.poky, "oe-init-build-env"), "w") as f:
+            f.write(f'cd "$1"\nbitbake() {{ sleep 2; touch {self.marker}; }}\n')
+
+    def hold_lock(self):
+        # A running server holds bitbake.lock.
+        lock = open(bitbake_server.lock_path(self.build_path), "w")
+        lock.write("4242\n")
+        lock.flush()
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        self.addCleanup(lock.close)
+
+    def test_stop_all_does_not_wait(self):
+        self.hold_lock()
+        self.assertTrue(bitbake_server.is_running(self.build_path))
+        self.assertEqual(bitbake_server.server_pid(self.build_path), 4242)
+        server = bitbake_server.ResidentServer(None, lambda msg: None)
+        server.wrap(self.poky, "build", "bitbake core-image-minimal")
+        started = time.monotonic()
+        server.stop_all()
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(server.servers, {})
+        # The detached `bitbake -m` still runs to completion.
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.marker) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertTrue(os.path.exists(self.marker))
+
+    def test_config_digest_tracks_conf_files(self):
+        digest = bitbake_server.config_digest(self.build_path)
+        os.makedirs(os.path.join(self.build_path, "conf", "multiconfig"))
+        with open(os.path.join(self.build_path, "conf", "multiconfig", "qemux86-64.conf"), "w") as f:
+            f.write('MACHINE = "qemux86-64"\n')
+        self.assertNotEqual(bitbake_server.config_digest(self.build_path), digest)
+
+    def test_clear_stale_lock(self):
+        for name in ("bitbake.lock", "bitbake.sock"):
+            open(os.path.join(self.build_path, name), "w").close()
+        self.assertFalse(bitbake_server.is_running(self.build_path))
+        self.assertEqual(bitbake_server.clear_stale_lock(self.build_path), ["bitbake.lock", "bitbake.sock"])
+
+    def test_held_lock_is_kept(self):
+        self.hold_lock()
+        self.assertEqual(bitbake_server.clear_stale_lock(self.build_path), [])
+
+if __name__ == "__main__":
+    unittest.main()
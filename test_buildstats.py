@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import buildstats
+
+def task(recipe, name, start, end, cpu=0.0, failed=False):
+    return buildstats.Task(recipe, name, start, end, cpu, failed)
+
+class CriticalPathTest(unittest.TestCase):
+    def names(self, tasks):
+        return [(t.recipe, t.task) for t in buildstats.critical_path(tasks)]
+
+    def test_zero_duration_tasks(self):
+        tasks = [task("a", "do_fetch", 0, 5), task("a", "do_unpack", 5, 5), task("a", "do_patch", 5, 9)]
+        # do_unpack starts together with do_patch, so it cannot have blocked it.
+        self.assertEqual(self.names(tasks), [("a", "do_fetch"), ("a", "do_patch")])
+
+    def test_only_zero_duration_tasks(self):
+        tasks = [task("a", "do_%d" % i, 3, 3) for i in range(5)]
+        self.assertEqual(len(buildstats.critical_path(tasks)), 1)
+
+    def test_prefers_same_recipe(self):
+        tasks = [
+            task("a", "do_compile", 0, 10),
+            task("b", "do_compile", 0, 10.5),
+            task("a", "do_install", 11, 20),
+        ]
+        self.assertEqual(self.names(tasks), [("a", "do_compile"), ("a", "do_install")])
+
+    def test_falls_back_to_latest_finisher(self):
+        tasks = [
+            task("a", "do_compile", 0, 5),
+            task("b", "do_compile", 0, 30),
+            task("c", "do_rootfs", 30, 40),
+        ]
+        self.assertEqual(self.names(tasks), [("b", "do_compile"), ("c", "do_rootfs")])
+
+    def test_empty(self):
+        self.assertEqual(buildstats.critical_path([]), [])
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write(self, recipe, name, text):
+        os.makedirs(os.path.join(self.dir, recipe), exist_ok=True)
+        with open(os.path.join(self.dir, recipe, name), "w") as f:
+            f.write(text)
+
+    def test_parse_and_analyze(self):
+        self.write("zlib-1.3", "do_compile", "Event: TaskStarted\nStarted: 100.00\nEnded: 110.00\n"
+                   "rusage ru_utime: 6.0\nrusage ru_stime: 1.0\nChild rusage ru_utime: 2.0\nStatus: PASSED\n")
+        self.write("zlib-1.3", "do_install", "Started: 110.00\nEnded: 110.00\nStatus: FAILED\n")
+        self.write("zlib-1.3", "build_stats", "Started: 1\n")
+        self.write("zlib-1.3", "do_broken", "Started: 120.00\n")
+        tasks = sorted(buildstats.parse(self.dir), key=lambda t: t.task)
+        self.assertEqual([t.task for t in tasks], ["do_compile", "do_install"])
+        self.assertEqual(tasks[0].cpu, 9.0)
+        self.assertTrue(tasks[1].failed)
+
+        result = buildstats.analyze(tasks, threads=4)
+        self.assertEqual(result["tasks"], 2)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(result["wall"], 10.0)
+        self.assertEqual(len(result["critical_path"]), 2)
+        self.assertIn("Build statistics: 2 tasks (1 failed)", buildstats.format_summary(result))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import confgen
+import meta_yoctool
+
+USER_CONF = [
+    '# My settings\n',
+    'DL_DIR = "/srv/downloads"\n',
+    'SSTATE_MIRRORS = "\\\n',
+    '    file://.* file:///srv/sstate/PATH \\\n',
+    '"\n',
+    'TMPDIR = "/fast/tmp"\n',
+    'BB_PRESSURE_MAX_CPU = "20000"\n',
+    'INHERIT += "rm_work"\n',
+    'MACHINE = "qemux86-64"\n',
+]
+
+class RenderLocalConfTest(unittest.TestCase):
+    def render(self, existing, **general):
+        profile = confgen.default_profile()
+        profile["general"].update(general)
+        layer = meta_yoctool.MetaLayer("/nonexistent/poky", lambda msg: None)
+        lines, _, _ = confgen.render_local_conf(existing, profile, layer, "/tmp/yoctool-cache", lambda msg: None)
+        user = lines[:lines.index("\n" + confgen.AUTO_START)]
+        return user, lines
+
+    def test_unmanaged_lines_survive(self):
+        user, _ = self.render(USER_CONF)
+        for line in USER_CONF:
+            if line.startswith("MACHINE"): continue
+            self.assertIn(line, user)
+        # MACHINE is set by the auto block, so the user's line is replaced.
+        self.assertNotIn('MACHINE = "qemux86-64"\n', user)
+
+    def test_enabled_options_replace_user_lines(self):
+        user, _ = self.render(USER_CONF, dl_dir="/data/dl", scratch_tmpfs=True)
+        self.assertNotIn('DL_DIR = "/srv/downloads"\n', user)
+        self.assertNotIn('TMPDIR = "/fast/tmp"\n', user)
+        self.assertNotIn('INHERIT += "rm_work"\n', user)
+        self.assertIn('SSTATE_MIRRORS = "\\\n', user)
+
+    def test_multiline_value_removed_whole(self):
+        user, _ = self.render(USER_CONF, sstate_mirror="file:///mirror")
+        for line in USER_CONF[2:5]:
+            self.assertNotIn(line, user)
+        self.assertIn('TMPDIR = "/fast/tmp"\n', user)
+
+    def test_render_is_idempotent(self):
+        _, first = self.render(USER_CONF)
+        _, second = self.render(first)
+        self.assertEqual(first, second)
+
+class MatrixTest(unittest.TestCase):
+    DISTRO_WIDE = ("DISTRO_FEATURES", "VIRTUAL-RUNTIME_", "LICENSE_FLAGS_ACCEPTED", "INHERIT", "VOLATILE_LOG_DIR")
+
+    def render(self, **general):
+        profile = confgen.default_profile()
+        profile["general"].update(general)
+        profile["managers"][0].update(rpi_username="pi", rpi_enable_wifi=True, rpi_usb_gadget=True)
+        profile["ota"]["enable_rauc"] = True
+        layer = meta_yoctool.MetaLayer("/nonexistent/poky", lambda msg: None)
+        return confgen.render_local_conf([], profile, layer, "/tmp/yoctool-cache", lambda msg: None)
+
+    def test_distro_lines_stay_in_local_conf(self):
+        lines, matrix, board = self.render(machine="raspberrypi4", matrix=True,
+                                           matrix_machines=["raspberrypi4", "qemux86-64"])
+        self.assertEqual(matrix, ["raspberrypi4", "qemux86-64"])
+        self.assertEqual(list(board), ["raspberrypi4"])
+        for line in board["raspberrypi4"]:
+            self.assertFalse(line.startswith(self.DISTRO_WIDE), line)
+        self.assertIn('ENABLE_UART = "1"\n', board["raspberrypi4"])
+        self.assertNotIn('ENABLE_UART = "1"\n', lines)
+        for prefix in self.DISTRO_WIDE:
+            self.assertTrue(any(line.startswith(prefix) for line in lines), prefix)
+
+    def test_single_machine_gets_everything(self):
+        lines, matrix, board = self.render(machine="raspberrypi4")
+        self.assertEqual((matrix, board), ([], {}))
+        self.assertIn('ENABLE_UART = "1"\n', lines)
+        self.assertIn('DISTRO_FEATURES:append = " systemd wifi usrmerge"\n', lines)
+
+class ApplyTest(unittest.TestCase):
+    def setUp(self):
+        self.poky = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.poky)
+        os.makedirs(confgen.conf_dir(self.poky, "build"))
+        self.messages = []
+
+    def apply(self, profile):
+        return confgen.apply(self.poky, "build", profile, os.path.join(self.poky, "cache"), self.messages.append)
+
+    def test_second_apply_writes_nothing(self):
+        profile = confgen.default_profile()
+        written, removed = self.apply(profile)
+        self.assertIn("local.conf", written)
+        self.assertIn("yoctool.conf", written)
+
+        del self.messages[:]
+        self.assertEqual(self.apply(profile), ([], []))
+        self.assertEqual(self.messages, ["Configuration unchanged; nothing written."])
+
+        profile["general"]["dl_dir"] = "/srv/downloads"
+        written, _ = self.apply(profile)
+        self.assertEqual(written, ["local.conf", "yoctool.conf"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import deploy_index
+
+MACHINE = "raspberrypi4"
+
+class DeployIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.dir = os.path.join(self.root, "images", MACHINE)
+        os.makedirs(self.dir)
+        self.index = deploy_index.DeployIndex(self.dir)
+        self.addCleanup(self.index.close)
+
+    def write(self, name, content=b"image", mtime=None):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def link(self, name, target):
+        tmp = os.path.join(self.dir, f".{name}.tmp")
+        os.symlink(target, tmp)
+        os.replace(tmp, os.path.join(self.dir, name))
+
+    def add_image(self, image, stamp, fstypes=("wic.bz2", "ext4"), mtime=None):
+        name = f"{image}-{MACHINE}-{stamp}"
+        link_name = f"{image}-{MACHINE}"
+        for fstype in fstypes:
+            self.write(f"{name}.rootfs.{fstype}", mtime=mtime)
+            self.link(f"{link_name}.rootfs.{fstype}", f"{name}.rootfs.{fstype}")
+        testdata = {"IMAGE_BASENAME": image, "MACHINE": MACHINE, "IMAGE_LINK_NAME": link_name,
+                    "IMAGE_NAME": name, "IMAGE_NAME_SUFFIX": ".rootfs", "IMAGE_FSTYPES": " ".join(fstypes)}
+        self.write(f"{name}.rootfs.testdata.json", json.dumps(testdata).encode())
+        self.link(f"{link_name}.rootfs.testdata.json", f"{name}.rootfs.testdata.json")
+        return os.path.join(self.dir, f"{name}.rootfs.{fstypes[0]}")
+
+    def test_exact_image_name(self):
+        minimal = self.add_image("core-image-minimal", "1")
+        dev = self.add_image("core-image-minimal-dev", "1")
+        self.assertEqual(self.index.find("core-image-minimal", ["wic.bz2"])["path"], minimal)
+        self.assertEqual(self.index.find("core-image-minimal-dev", ["wic.bz2"])["path"], dev)
+        self.assertIsNone(self.index.find("core-image-base", ["wic.bz2"]))
+
+    def test_fstype_preference(self):
+        self.add_image("core-image-minimal", "1")
+        entry = self.index.find("core-image-minimal", ["wic.gz", "ext4", "wic.bz2"])
+        self.assertEqual(entry["fstype"], "ext4")
+
+    def check_new_build_is_picked_up(self):
+        self.add_image("core-image-minimal", "1", mtime=1000)
+        self.index.find("core-image-minimal", ["wic.bz2"])
+        newer = self.add_image("core-image-minimal", "2", mtime=2000)
+        self.write(f"update-bundle-{MACHINE}-2.raucb")
+        self.link(f"update-bundle-{MACHINE}.raucb", f"update-bundle-{MACHINE}-2.raucb")
+        self.assertEqual(self.index.find("core-image-minimal", ["wic.bz2"])["path"], newer)
+        self.assertEqual(self.index.newest("raucb")["image"], "update-bundle")
+
+    def test_new_build_with_inotify(self):
+        if not deploy_index._inotify():
+            self.skipTest("inotify not available")
+        self.check_new_build_is_picked_up()
+        self.assertIsNotNone(self.index.wd)
+
+    def test_new_build_without_inotify(self):
+        with mock.patch.object(deploy_index, "_inotify", return_value=None):
+            self.check_new_build_is_picked_up()
+        self.assertIsNone(self.index.wd)
+
+    def test_directory_recreated(self):
+        self.add_image("core-image-minimal", "1")
+        self.assertIsNotNone(self.index.find("core-image-minimal", ["wic.bz2"]))
+        shutil.rmtree(self.dir)
+        self.assertIsNone(self.index.find("core-image-minimal", ["wic.bz2"]))
+        os.makedirs(self.dir)
+        self.add_image("core-image-minimal", "2")
+        self.assertIsNotNone(self.index.find("core-image-minimal", ["wic.bz2"]))
+
+    def test_checksum(self):
+        path = self.add_image("core-image-minimal", "1")
+        entry = self.index.find("core-image-minimal", ["wic.bz2"])
+        self.assertEqual(self.index.checksum(entry), "6105d6cc76af400325e94d588ce511be5bfdbb73b437dc51eca43917d7a43e3d")
+        with open(path + ".sha256sum", "w") as f:
+            f.write("f" * 64 + "  " + os.path.basename(path) + "\n")
+        # Cached per (path, size, mtime).
+        self.assertEqual(self.index.checksum(entry), "6105d6cc76af400325e94d588ce511be5bfdbb73b437dc51eca43917d7a43e3d")
+        self.index.checksums.clear()
+        self.assertEqual(self.index.checksum(entry), "f" * 64)
+
+if __name__ == "__main__":
+    unittest.main()
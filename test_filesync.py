@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import filesync
+
+class SyncFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_identical_content_is_not_rewritten(self):
+        path = os.path.join(self.dir, "conf", "local.conf")
+        self.assertTrue(filesync.sync_file(path, 'MACHINE = "qemux86-64"\n'))
+        os.utime(path, ns=(1, 1))
+        self.assertFalse(filesync.sync_file(path, 'MACHINE = "qemux86-64"\n'))
+        self.assertEqual(os.stat(path).st_mtime_ns, 1)
+        self.assertTrue(filesync.sync_file(path, 'MACHINE = "raspberrypi4"\n'))
+        with open(path) as f:
+            self.assertEqual(f.read(), 'MACHINE = "raspberrypi4"\n')
+
+    def test_keeps_mode_and_leaves_no_temporary(self):
+        path = os.path.join(self.dir, "run.sh")
+        filesync.sync_file(path, "#!/bin/sh\n")
+        os.chmod(path, 0o755)
+        filesync.sync_file(path, "#!/bin/sh\ntrue\n")
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o755)
+        self.assertEqual(os.listdir(self.dir), ["run.sh"])
+
+class FileTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def tree(self, files):
+        tree = filesync.FileTree()
+        for rel, content in files.items():
+            tree.add(rel, content)
+        return tree
+
+    def test_second_sync_changes_nothing(self):
+        files = {"conf/layer.conf": "BBPATH .= \":${LAYERDIR}\"\n", "recipes-core/a/a.bb": "LICENSE = \"MIT\"\n"}
+        result = self.tree(files).sync(self.dir)
+        self.assertEqual(result["written"], sorted(files))
+        manifest = os.path.join(self.dir, filesync.MANIFEST_NAME)
+        os.utime(manifest, ns=(1, 1))
+
+        result = self.tree(files).sync(self.dir)
+        self.assertEqual(result, {"written": [], "removed": [], "kept": [], "unchanged": 2})
+        self.assertEqual(os.stat(manifest).st_mtime_ns, 1)
+
+    def test_dropped_files_are_removed_unless_edited(self):
+        self.tree({"a/x.bb": "x\n", "b/y.bb": "y\n", "keep.bb": "k\n"}).sync(self.dir)
+        with open(os.path.join(self.dir, "b", "y.bb"), "w") as f:
+            f.write("edited by hand\n")
+
+        result = self.tree({"keep.bb": "k\n"}).sync(self.dir)
+        self.assertEqual(result["removed"], ["a/x.bb"])
+        self.assertEqual(result["kept"], ["b/y.bb"])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "a")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "b", "y.bb")))
+
+    def test_obsolete_files_from_older_versions(self):
+        with open(os.path.join(self.dir, "old.conf"), "w") as f:
+            f.write("old\n")
+        tree = self.tree({"new.conf": "new\n"})
+        tree.remove("old.conf")
+        self.assertEqual(tree.sync(self.dir)["removed"], ["old.conf"])
+
+if __name__ == "__main__":
+    unittest.main()
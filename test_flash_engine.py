@@ -0,0 +1,73 @@
+import os
+import bz2
+import gzip
+import lzma
+import shutil
+import tempfile
+import unittest
+
+import flash_engine
+
+class FlashTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        # Larger than one write buffer, with an unaligned tail.
+        self.data = os.urandom(1024 * 1024) + bytes(flash_engine.BUF_SIZE) + b"tail" * 1000
+
+    def image(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def flash(self, src, **kwargs):
+        dst = os.path.join(self.dir, "disk.img")
+        result = flash_engine.flash(src, dst, direct=False, **kwargs)
+        with open(dst, "rb") as f:
+            return result, f.read()
+
+    def check(self, name, content, fmt):
+        result, written = self.flash(self.image(name, content))
+        self.assertEqual(result["format"], fmt)
+        self.assertEqual(result["bytes"], len(self.data))
+        self.assertEqual(written, self.data)
+
+    def test_raw(self):
+        self.check("core-image.wic", self.data, "raw")
+
+    def test_gz(self):
+        self.check("core-image.wic.gz", gzip.compress(self.data), "gz")
+
+    def test_xz(self):
+        self.check("core-image.wic.xz", lzma.compress(self.data), "xz")
+
+    def test_bz2_single_stream(self):
+        self.check("core-image.wic.bz2", bz2.compress(self.data), "bz2")
+
+    def test_bz2_multistream(self):
+        # pbzip2 layout: independent streams, decoded in parallel.
+        step = 256 * 1024
+        content = b"".join(bz2.compress(self.data[i:i + step]) for i in range(0, len(self.data), step))
+        with open(self.image("probe.bz2", content), "rb") as f:
+            self.assertTrue(flash_engine._bz2_multistream(f))
+        _, written = self.flash(self.image("core-image.wic.bz2", content), workers=4)
+        self.assertEqual(written, self.data)
+
+    def test_concatenated_gz_members(self):
+        half = len(self.data) // 2
+        self.check("core-image.wic.gz", gzip.compress(self.data[:half]) + gzip.compress(self.data[half:]), "gz")
+
+    def test_truncated_image_fails(self):
+        content = gzip.compress(self.data)
+        with self.assertRaises(EOFError):
+            self.flash(self.image("core-image.wic.gz", content[:len(content) // 2]))
+
+    def test_progress_reaches_the_end(self):
+        reports = []
+        self.flash(self.image("core-image.wic.xz", lzma.compress(self.data)), progress_cb=reports.append)
+        self.assertEqual(reports[-1]["percent"], 100)
+        self.assertEqual(reports[-1]["written"], len(self.data))
+
+if __name__ == "__main__":
+    unittest.main()
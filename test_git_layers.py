@@ -0,0 +1,99 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+
+import git_layers
+
+BRANCH = "scarthgap"
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com",
+                           "-c", "init.defaultBranch=master"] + list(args), cwd=cwd, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True).stdout.strip()
+
+class MirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.upstream = os.path.join(self.dir, "upstream", "meta-test.git")
+        self.url = "file://" + self.upstream
+        self.mirrors = os.path.join(self.dir, "mirrors")
+        self.work = os.path.join(self.dir, "work")
+        self.messages = []
+        git("init", "--bare", self.upstream)
+        git("clone", self.upstream, self.work)
+        git("checkout", "-b", BRANCH, cwd=self.work)
+        self.commit("first")
+
+    def log(self, msg):
+        self.messages.append(msg)
+
+    def commit(self, text):
+        with open(os.path.join(self.work, "layer.conf"), "w") as f:
+            f.write(text + "\n")
+        git("add", "layer.conf", cwd=self.work)
+        git("commit", "-m", text, cwd=self.work)
+        git("push", "origin", "HEAD", cwd=self.work)
+        return git("rev-parse", "HEAD", cwd=self.work)
+
+    def mirror_head(self):
+        return git("--git-dir", git_layers.mirror_path(self.mirrors, self.url), "rev-parse", f"refs/heads/{BRANCH}")
+
+    def test_first_clone_goes_through_mirror(self):
+        path = os.path.join(self.dir, "poky", "meta-test")
+        self.assertTrue(git_layers.clone_layer("meta-test", self.url, BRANCH, path, self.log, mirror_dir=self.mirrors))
+        self.assertTrue(os.path.isdir(git_layers.mirror_path(self.mirrors, self.url)))
+        # Objects are borrowed from the mirror, and origin points upstream.
+        self.assertTrue(os.path.exists(os.path.join(path, ".git", "objects", "info", "alternates")))
+        self.assertEqual(git("remote", "get-url", "origin", cwd=path), self.url)
+        self.assertEqual(git("rev-parse", "--abbrev-ref", "HEAD", cwd=path), BRANCH)
+        with open(os.path.join(path, "layer.conf")) as f:
+            self.assertEqual(f.read(), "first\n")
+        self.assertFalse(any("cloning from network" in m for m in self.messages))
+
+    def test_existing_mirror_is_refreshed_when_stale(self):
+        mirror = git_layers.update_mirror(self.mirrors, "meta-test", self.url, BRANCH, self.log)
+        old = self.mirror_head()
+        new = self.commit("second")
+
+        # Fresh enough: used as-is.
+        self.assertEqual(git_layers.update_mirror(self.mirrors, "meta-test", self.url, BRANCH, self.log), mirror)
+        self.assertEqual(self.mirror_head(), old)
+
+        self.assertEqual(git_layers.update_mirror(self.mirrors, "meta-test", self.url, BRANCH, self.log, max_age=0), mirror)
+        self.assertEqual(self.mirror_head(), new)
+
+    def test_missing_branch_is_fetched(self):
+        git_layers.update_mirror(self.mirrors, "meta-test", self.url, BRANCH, self.log)
+        git("checkout", "-b", "styhead", cwd=self.work)
+        self.commit("styhead")
+        self.assertIsNotNone(git_layers.update_mirror(self.mirrors, "meta-test", self.url, "styhead", self.log))
+
+    def test_broken_mirror_falls_back_to_network(self):
+        broken = git_layers.mirror_path(self.mirrors, self.url)
+        os.makedirs(broken)
+        with open(os.path.join(broken, "HEAD"), "w") as f:
+            f.write("garbage\n")
+        path = os.path.join(self.dir, "poky", "meta-test")
+        self.assertTrue(git_layers.clone_layer("meta-test", self.url, BRANCH, path, self.log, mirror_dir=self.mirrors))
+        self.assertTrue(any("cloning from network" in m for m in self.messages))
+        self.assertFalse(os.path.exists(os.path.join(path, ".git", "objects", "info", "alternates")))
+        with open(os.path.join(path, "layer.conf")) as f:
+            self.assertEqual(f.read(), "first\n")
+
+    def test_concurrent_updates_create_one_mirror(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+                       git_layers.update_mirror(self.mirrors, "meta-test", self.url, BRANCH, self.log)))
+                   for _ in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertIsNotNone(results[0])
+        self.assertEqual(sum(1 for m in self.messages if "Creating mirror" in m), 1)
+
+if __name__ == "__main__":
+    unittest.main()
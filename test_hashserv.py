@@ -0,0 +1,56 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import bitbake_events
+import hashserv
+
+def event(kind, **data):
+    return bitbake_events.BuildEvent(kind, data)
+
+class SstateSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.db = hashserv.db_path(self.dir)
+        db = sqlite3.connect(self.db)
+        db.execute("CREATE TABLE unihashes_v3 (method TEXT, taskhash TEXT, unihash TEXT, gc_mark TEXT)")
+        db.executemany("INSERT INTO unihashes_v3 VALUES ('m', ?, ?, '')",
+                       [("a", "a"), ("b", "a"), ("c", "c"), ("d", "x")])
+        db.commit()
+        db.close()
+
+    def test_counts_remapped_setscene_tasks(self):
+        summary = hashserv.SstateSummary()
+        summary.feed("NOTE: Tasks Summary: Attempted 10 tasks of which 6 didn't need to be rerun and all succeeded.")
+        for h in ("a", "b", "c", "d", "unknown"):
+            summary.feed_event(event("setscene_done", task="r:do_x_setscene", taskhash=h))
+        summary.feed_event(event("setscene", task="r:do_y_setscene", total=3))
+        summary.resolve(self.db)
+        self.assertEqual(summary.equivalent, 2)
+        self.assertEqual(summary.format(), "Build summary: 6/10 tasks skipped, 2 skipped thanks to hash equivalence")
+
+    def test_no_events_no_count(self):
+        summary = hashserv.SstateSummary()
+        summary.feed("Sstate summary: Wanted 4 Local 1 Mirrors 1 Missed 2 Current 0")
+        summary.resolve(self.db)
+        self.assertIsNone(summary.equivalent)
+        self.assertEqual(summary.format(), "Build summary: sstate reused 2/4 (local 1, mirrors 1, missed 2, current 0)")
+
+    def test_missing_database(self):
+        self.assertIsNone(hashserv.equivalent_count(os.path.join(self.dir, "none.db"), ["a"]))
+        self.assertEqual(hashserv.equivalent_count(self.db, []), 0)
+
+    def test_older_schema(self):
+        path = os.path.join(self.dir, "old.db")
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE unihashes_v2 (method TEXT, taskhash TEXT, unihash TEXT)")
+        db.execute("INSERT INTO unihashes_v2 VALUES ('m', 'b', 'a')")
+        db.commit()
+        db.close()
+        self.assertEqual(hashserv.equivalent_count(path, ["b", "b"]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
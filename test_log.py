@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+import unittest
+from array import array
+
+import manager_log
+
+class FakeRoot:
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, func):
+        self.next_id += 1
+        self.jobs[self.next_id] = func
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_pending(self):
+        jobs, self.jobs = self.jobs, {}
+        for func in jobs.values():
+            func()
+
+class FakeTerminal:
+    def __init__(self):
+        self.batches = []
+
+    def append(self, lines, replace_last=False):
+        self.batches.append((replace_last, list(lines)))
+
+class FakeApp:
+    def __init__(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.root = FakeRoot()
+        self.terminal = FakeTerminal()
+
+class LogManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.app = FakeApp()
+        self.addCleanup(shutil.rmtree, self.app.cache_dir)
+        self.log = manager_log.LogManager(self.app)
+        self.log.start()
+
+    def flush(self):
+        self.app.root.run_pending()
+        batches, self.app.terminal.batches = self.app.terminal.batches, []
+        return batches
+
+    def test_lines_are_batched_per_flush(self):
+        for i in range(3):
+            self.log.write(f"line {i}")
+        self.assertEqual(self.app.terminal.batches, [])
+        self.assertEqual(self.flush(), [(False, ["line 0", "line 1", "line 2"])])
+        # The flush reschedules itself, and an empty flush renders nothing.
+        self.assertEqual(len(self.app.root.jobs), 1)
+        self.assertEqual(self.flush(), [])
+
+    def test_progress_lines_are_merged(self):
+        self.log.overwrite("10%")
+        self.log.overwrite("20%")
+        self.log.overwrite("30%")
+        self.assertEqual(self.flush(), [(True, ["30%"])])
+        self.log.write("done")
+        self.log.overwrite("40%")
+        self.assertEqual(self.flush(), [(False, ["40%"])])
+        self.assertEqual(self.log.get_stats()["merged"], 3)
+
+    def test_backpressure_drops_oldest_lines(self):
+        self.log.MAX_PENDING_LINES = 3
+        since = self.log.get_stats()
+        self.log.overwrite("progress")
+        for i in range(5):
+            self.log.write(f"line {i}")
+        # A dropped head can no longer replace the line on screen.
+        self.assertEqual(self.flush(), [(False, ["[log] 3 lines dropped under backpressure", "line 2", "line 3", "line 4"])])
+        self.assertEqual(self.log.get_stats(), {"lines": 6, "merged": 0, "dropped": 3, "pending": 0})
+        self.log.report(since)
+        self.assertEqual(self.flush(), [(False, ["[log] 6 lines received, 0 merged, 3 dropped under backpressure"])])
+
+    def test_stop_cancels_the_flush(self):
+        self.log.write("line")
+        self.log.stop()
+        self.assertEqual(self.flush(), [])
+        self.log.start()
+        self.assertEqual(self.flush(), [(False, ["line"])])
+
+class SpillTest(unittest.TestCase):
+    # The spill file behind TerminalView, without a Tk widget.
+    def setUp(self):
+        self.view = manager_log.TerminalView.__new__(manager_log.TerminalView)
+        self.view.spill = None
+        self.view.spill_size = 0
+        self.view.spilled = 0
+        self.view.spill_chunks = array('Q')
+        self.addCleanup(lambda: self.view.spill and self.view.spill.close())
+
+    def test_lines_read_back_from_any_offset(self):
+        chunk = manager_log.TerminalView.SPILL_CHUNK
+        lines = [f"NOTE: line {i} ✓" for i in range(chunk * 3 + 17)]
+        for start in range(0, len(lines), 100):
+            self.view._spill_lines(lines[start:start + 100])
+        self.assertEqual(self.view.spilled, len(lines))
+        self.assertEqual(len(self.view.spill_chunks), 4)
+        for start, end in ((0, 10), (chunk - 3, chunk + 3), (chunk * 3, len(lines)), (500, 700)):
+            self.assertEqual(self.view._read_spill(start, end), lines[start:end])
+
+if __name__ == "__main__":
+    unittest.main()
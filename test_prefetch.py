@@ -0,0 +1,71 @@
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+import confgen
+import manager_prefetch
+
+class Var:
+    def __init__(self, value=""): self.value = value
+    def get(self): return self.value
+    def set(self, value): self.value = value
+
+class FakeSession:
+    def __init__(self, build_path, gate=None):
+        self.build_path = build_path
+        self.gate = gate
+        self.commands = []
+
+    def fetch_layers(self, profile):
+        if self.gate: self.gate.wait(10)
+        return []
+
+    def shell_command(self, general, cmd):
+        self.commands.append(cmd)
+        return "true"
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        self.build_path = tempfile.mkdtemp()
+        self.sessions = []
+        app = SimpleNamespace(poky_path=Var("/poky"), build_dir_name=Var("build"), prefetch_text=Var(),
+                              log=lambda msg: None, root=SimpleNamespace(after=lambda ms, fn, *a: fn(*a)))
+        app.mgr_setup = SimpleNamespace(get_profile=confgen.default_profile)
+        app.mgr_build = SimpleNamespace(session=lambda: self.sessions.pop(0))
+        self.mgr = manager_prefetch.PrefetchManager(app)
+
+    def test_busy_as_soon_as_started(self):
+        gate = threading.Event()
+        session = FakeSession(self.build_path, gate)
+        self.sessions.append(session)
+        self.mgr.start()
+        # No wait for the worker thread: a build started now must wait.
+        self.assertTrue(self.mgr.is_running())
+        gate.set()
+        self.assertTrue(self.mgr.idle.wait(10))
+        self.assertEqual(len(session.commands), 2)
+
+    def test_newer_start_replaces_older(self):
+        gate = threading.Event()
+        first, second = FakeSession(self.build_path, gate), FakeSession(self.build_path)
+        self.sessions += [first, second]
+        self.mgr.start()
+        self.mgr.start()
+        gate.set()
+        self.assertTrue(self.mgr.idle.wait(10))
+        self.assertEqual(first.commands, [])
+        self.assertEqual(len(second.commands), 2)
+
+    def test_cancel(self):
+        gate = threading.Event()
+        session = FakeSession(self.build_path, gate)
+        self.sessions.append(session)
+        self.mgr.start()
+        threading.Timer(0.2, gate.set).start()
+        self.mgr.cancel()
+        self.assertFalse(self.mgr.is_running())
+        self.assertEqual(session.commands, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import pressure
+
+GIB = 1024 ** 3
+
+class AutoTuneTest(unittest.TestCase):
+    def test_make_jobs_fit_memory(self):
+        for cores in (1, 2, 4, 8, 16, 32, 64, 128):
+            for mem in (2, 4, 8, 16, 32, 64, 256):
+                bb_threads, parallel_make = pressure.auto_tune(cores, mem * GIB)
+                self.assertGreaterEqual(bb_threads, 1)
+                self.assertGreaterEqual(parallel_make, 1)
+                self.assertLessEqual(bb_threads, cores)
+                self.assertLessEqual(parallel_make, cores)
+                # A single heavy recipe never runs more compilers than fit.
+                self.assertLessEqual(parallel_make, max(1, mem * GIB // pressure.MEM_PER_JOB), (cores, mem))
+
+    def test_ample_memory_uses_every_core(self):
+        # 64 cores / 64 GiB: a task per core, not 5 tasks x -j 6.
+        self.assertEqual(pressure.auto_tune(64, 64 * GIB), (64, 32))
+        self.assertEqual(pressure.auto_tune(32, 64 * GIB), (32, 32))
+        self.assertEqual(pressure.auto_tune(16, 256 * GIB), (16, 16))
+
+    def test_memory_bound_host_caps_product(self):
+        for cores, mem in ((64, 16), (32, 8), (128, 64), (8, 2)):
+            bb_threads, parallel_make = pressure.auto_tune(cores, mem * GIB)
+            budget = mem * GIB // pressure.MEM_PER_THREAD
+            self.assertLessEqual(bb_threads * parallel_make, budget, (cores, mem))
+            # The budget is not wasted either.
+            self.assertGreater(bb_threads * parallel_make, budget // 2, (cores, mem))
+
+    def test_unknown_memory(self):
+        self.assertEqual(pressure.auto_tune(8, 0), (8, 8))
+
+if __name__ == "__main__":
+    unittest.main()
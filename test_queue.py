@@ -0,0 +1,61 @@
+import unittest
+
+import manager_queue
+
+def job(id, kind="image", target="core-image-minimal", status="pending", poky="/poky", build_dir="build"):
+    return {"id": id, "kind": kind, "target": target, "status": status, "poky": poky, "build_dir": build_dir,
+            "started": None, "finished": None}
+
+class PlanTest(unittest.TestCase):
+    def test_merges_builds_but_not_cleans(self):
+        jobs = [job(1), job(2, "sdk"), job(3, "clean"), job(4)]
+        batch = manager_queue.plan_next_batch(jobs, "/poky", "build")
+        self.assertEqual([j["id"] for j in batch], [1, 2])
+        self.assertEqual(manager_queue.batch_targets(batch), ["core-image-minimal", "core-image-minimal:do_populate_sdk"])
+
+    def test_skips_other_workspaces_and_paused(self):
+        jobs = [job(1, poky="/other"), job(2, status="paused"), job(3, "clean")]
+        self.assertEqual([j["id"] for j in manager_queue.plan_next_batch(jobs, "/poky", "build")], [3])
+        self.assertEqual([j["id"] for j in manager_queue.other_workspace_jobs(jobs, "/poky", "build")], [1])
+
+    def test_restored_jobs_are_paused(self):
+        jobs = manager_queue.restore_jobs([job(1, status="running"), job(2, "clean"), job(3, status="done")])
+        self.assertEqual([j["status"] for j in jobs], ["paused", "paused", "done"])
+        self.assertEqual(manager_queue.plan_next_batch(jobs, "/poky", "build"), [])
+
+class RunBatchTest(unittest.TestCase):
+    def run_batch(self, batch, results, stop_after=None):
+        calls = []
+        def run(kind, targets):
+            calls.append(targets)
+            return results(targets)
+        def set_status(jobs, status):
+            for j in jobs: j["status"] = status
+        stopping = lambda: stop_after is not None and len(calls) >= stop_after
+        manager_queue.run_batch(batch, run, stopping, set_status, lambda msg: None)
+        return calls
+
+    def test_success_runs_once(self):
+        batch = [job(1, target="a"), job(2, target="b")]
+        calls = self.run_batch(batch, lambda targets: True)
+        self.assertEqual(calls, [["a", "b"]])
+        self.assertEqual([j["status"] for j in batch], ["done", "done"])
+
+    def test_failed_batch_gets_per_job_outcome(self):
+        batch = [job(1, target="a"), job(2, target="b"), job(3, target="c")]
+        calls = self.run_batch(batch, lambda targets: "b" not in targets)
+        self.assertEqual(calls, [["a", "b", "c"], ["a"], ["b"], ["c"]])
+        self.assertEqual([j["status"] for j in batch], ["done", "failed", "done"])
+
+    def test_stop_during_retries(self):
+        batch = [job(1, target="a"), job(2, target="b"), job(3, target="c")]
+        self.run_batch(batch, lambda targets: False, stop_after=2)
+        self.assertEqual([j["status"] for j in batch], ["stopped", "stopped", "stopped"])
+
+    def test_single_job_failure(self):
+        batch = [job(1, "clean", target="a")]
+        self.assertEqual(self.run_batch(batch, lambda targets: False), [["a"]])
+        self.assertEqual(batch[0]["status"], "failed")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import scratch
+
+GIB = 1024 ** 3
+
+class PrepareTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.messages = []
+        self.scratch = scratch.Scratch(os.path.join(self.dir, "build"), os.path.join(self.dir, "cache"),
+                                       None, self.messages.append)
+        self.commands = []
+        self.scratch._run = lambda cmd: self.commands.append(cmd) or mock.Mock(returncode=0, stderr="")
+        self.scratch._start_sampler = lambda: None
+
+    def prepare(self, total, available, need):
+        with mock.patch("pressure.memory_info", return_value=(total, available)), \
+             mock.patch.object(self.scratch, "estimate", return_value=need), \
+             mock.patch("os.geteuid", return_value=0):
+            return self.scratch.prepare("qemux86-64/core-image-minimal")
+
+    def test_low_memory_builds_on_disk(self):
+        # available < reserve used to mount with size=0, which is unlimited.
+        self.assertFalse(self.prepare(16 * GIB, 2 * GIB, 0))
+        self.assertFalse(self.prepare(16 * GIB, 2 * GIB, 1 * GIB))
+        self.assertEqual(self.commands, [])
+
+    def test_no_estimate_builds_on_disk(self):
+        self.assertFalse(self.prepare(128 * GIB, 100 * GIB, 0))
+        self.assertEqual(self.commands, [])
+
+    def test_estimate_too_large(self):
+        self.assertFalse(self.prepare(64 * GIB, 40 * GIB, 50 * GIB))
+        self.assertEqual(self.commands, [])
+
+    def test_mounts_with_bounded_size(self):
+        self.assertTrue(self.prepare(128 * GIB, 100 * GIB, 20 * GIB))
+        self.assertEqual(len(self.commands), 1)
+        options = self.commands[0][self.commands[0].index("-o") + 1]
+        size = int(options.split(",")[0].split("=")[1])
+        self.assertEqual(size, 68 * GIB)
+
+class SyncTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.src = os.path.join(self.dir, "src")
+        self.dst = os.path.join(self.dir, "dst")
+        os.makedirs(os.path.join(self.src, "sub"))
+        with open(os.path.join(self.src, "image.wic"), "w") as f: f.write("image")
+        with open(os.path.join(self.src, "sub", "Image"), "w") as f: f.write("kernel")
+        os.symlink("image.wic", os.path.join(self.src, "latest.wic"))
+
+    def sync(self):
+        return scratch.sync_tree(self.src, self.dst, os.getuid(), os.getgid())
+
+    def test_copies_then_is_idempotent(self):
+        self.assertEqual(self.sync(), 3)
+        self.assertEqual(os.readlink(os.path.join(self.dst, "latest.wic")), "image.wic")
+        with open(os.path.join(self.dst, "sub", "Image")) as f:
+            self.assertEqual(f.read(), "kernel")
+        self.assertEqual(self.sync(), 0)
+
+    def test_copies_changed_files_only(self):
+        self.sync()
+        path = os.path.join(self.src, "image.wic")
+        with open(path, "w") as f: f.write("new image")
+        os.utime(path, (0, 1000))
+        self.assertEqual(self.sync(), 1)
+        with open(os.path.join(self.dst, "image.wic")) as f:
+            self.assertEqual(f.read(), "new image")
+
+    def test_missing_source(self):
+        self.assertEqual(scratch.sync_tree(os.path.join(self.dir, "none"), self.dst, 0, 0), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,6 @@ import sys
 import tempfile
 import shutil
 import zipfile
-import requests
 import subprocess
 import threading
 import tkinter as tk
@@ -37,6 +36,9 @@ def check_for_update(parent_window, current_version):
 
 def _check_update_thread(root, current_version):
     try:
+        # Imported here: requests (and its TLS stack) is slow to load and
+        # only needed when an update check actually runs.
+        import requests
         resp = requests.get(GITHUB_RELEASE_URL, headers=GITHUB_HEADERS, timeout=5)
         
         if resp.status_code == 404:
@@ -96,6 +98,7 @@ def download_popup(parent, download_url, version):
 
 def _download_worker(url, version, top, pb, lbl):
     try:
+        import requests
         tmp_dir = tempfile.gettempdir()
         tmp_zip = os.path.join(tmp_dir, f"yoctool_update_{version}.zip")
         extract_dir = os.path.join(tmp_dir, f"yoctool_extract_{version}")
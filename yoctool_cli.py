@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import pwd
+import shutil
+import sys
+import threading
+import time
+
+import build_session
+import confgen
+import rauc_deploy
+import sdcard
+
+# Headless front end for CI builders: same profile (yoctool.conf) and the
+# same generated configuration as the GUI, without importing tkinter.
+# Everything is reported on stdout as one JSON object per line.
+
+_emit_lock = threading.Lock()
+
+def emit(kind, **data):
+    data["type"] = kind
+    data["time"] = round(time.time(), 3)
+    with _emit_lock:
+        sys.stdout.write(json.dumps(data) + "\n")
+        sys.stdout.flush()
+
+def log(msg):
+    emit("log", msg=msg)
+
+class Session:
+    def __init__(self, args):
+        poky = os.path.abspath(args.poky)
+        self.profile_path = args.profile or os.path.join(confgen.conf_dir(poky, args.build_dir), "yoctool.conf")
+        self.skip_deps = args.skip_deps
+
+        # Run bitbake as the invoking user when started through sudo, like the GUI.
+        user = os.environ.get("SUDO_USER") if os.geteuid() == 0 else None
+        home = pwd.getpwnam(user).pw_dir if user else os.path.expanduser("~")
+        self.build = build_session.BuildSession(poky, args.build_dir, user, os.path.join(home, ".cache", "yoctool"), log)
+        self.build_path = self.build.build_path
+
+        if os.path.exists(self.profile_path):
+            self.profile = confgen.load_profile(self.profile_path)
+        else:
+            log(f"No profile at {self.profile_path}; using defaults.")
+            self.profile = confgen.default_profile()
+        self.general = self.profile["general"]
+
+    def close(self):
+        self.build.hashserv.stop()
+
+    def apply(self):
+        self.build.apply(self.profile)
+
+    def prepare(self):
+        self.apply()
+        self.build.prepare(self.profile, skip_deps=self.skip_deps, strict=True)
+
+    def execute(self, cmd, events=False):
+        def on_progress(percent, text):
+            emit("progress", percent=round(percent, 1), text=text)
+
+        output = build_session.BuildOutput(events, log, on_progress)
+        proc = self.build.run(self.general, cmd, output)
+        text = output.summary.format()
+        if text: log(text)
+        if proc.returncode != 0:
+            for r in self.build.failure_details(self.general, output.failures.failures):
+                emit("failed_task", recipe=r["recipe"], task=r["task"], logfile=r["logfile"],
+                     size=r["size"], tail=r["lines"], error=r["error"])
+        return proc.returncode == 0
+
+    def bitbake(self, target):
+        ok, result = self.build.build(self.general, target, self.execute)
+        if result:
+            emit("buildstats", **result)
+        return ok
+
+def cmd_apply(session, args):
+    session.apply()
+    return True
+
+def cmd_build(session, args):
+    session.prepare()
+    return session.bitbake(" ".join(args.targets) or session.general["image"])
+
+def cmd_bundle(session, args):
+    if not session.profile["ota"]["enable_rauc"]:
+        raise RuntimeError("RAUC is not enabled in the profile.")
+    session.prepare()
+    return session.bitbake("update-bundle")
+
+def cmd_flash(session, args):
+    if os.geteuid() != 0:
+        raise RuntimeError("Flashing needs root.")
+    img = args.image
+    if not img:
+        deploy = confgen.deploy_dir(session.general, session.build_path)
+        img = sdcard.find_image(deploy, session.general["image"])
+        if not img:
+            raise RuntimeError(f"No image (.sdimg or .wic) found for {session.general['image']} in {deploy}")
+    state = {"percent": -1}
+    def on_progress(percent, line):
+        if percent is not None and int(percent) != state["percent"]:
+            state["percent"] = int(percent)
+            emit("progress", percent=round(percent, 1), text=line)
+
+    log(f"Flashing {img} to {args.device}")
+    return sdcard.flash(img, args.device, on_progress, log)
+
+def cmd_deploy(session, args):
+    if shutil.which("sshpass") is None:
+        raise RuntimeError("sshpass is not installed.")
+    deploy = confgen.deploy_dir(session.general, session.build_path)
+    bundle = rauc_deploy.find_bundle(deploy)
+    if not bundle:
+        raise RuntimeError(f"No .raucb file found in {deploy}. Run 'bundle' first.")
+    ota = session.profile["ota"]
+    ok, msg = rauc_deploy.deploy_bundle(bundle, args.host or ota["target_ip"], args.user or ota["target_user"],
+                                        os.environ.get("YOCTOOL_TARGET_PASS", "root"), log)
+    log(msg)
+    return ok
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Yoctool headless mode: apply a saved profile and build without a display.")
+    parser.add_argument("--poky", required=True, help="Poky checkout")
+    parser.add_argument("--build-dir", default="build", help="build directory name inside Poky (default: build)")
+    parser.add_argument("--profile", help="yoctool.conf to use (default: <poky>/<build-dir>/conf/yoctool.conf)")
+    parser.add_argument("--skip-deps", action="store_true", help="do not check/install host packages")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("apply", help="write local.conf, bblayers.conf and meta-yoctool from the profile").set_defaults(func=cmd_apply)
+
+    p = sub.add_parser("build", help="apply the profile, fetch layers and run bitbake")
+    p.add_argument("targets", nargs="*", help="bitbake targets (default: the profile's image)")
+    p.set_defaults(func=cmd_build)
+
+    sub.add_parser("bundle", help="build the RAUC update bundle").set_defaults(func=cmd_bundle)
+
+    p = sub.add_parser("flash", help="write the latest image to a device")
+    p.add_argument("--device", required=True, help="target block device, e.g. /dev/sdb")
+    p.add_argument("--image", help="image file (default: newest .sdimg/.wic of the profile's image)")
+    p.set_defaults(func=cmd_flash)
+
+    p = sub.add_parser("deploy", help="copy the latest bundle to a target and install it (password from YOCTOOL_TARGET_PASS)")
+    p.add_argument("--host", help="target address (default: profile target_ip)")
+    p.add_argument("--user", help="target user (default: profile target_user)")
+    p.set_defaults(func=cmd_deploy)
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.time()
+    session = None
+    try:
+        session = Session(args)
+        ok = bool(args.func(session, args))
+    except Exception as e:
+        log(f"ERROR: {e}")
+        ok = False
+    finally:
+        if session: session.close()
+    emit("result", command=args.command, ok=ok, seconds=round(time.time() - started, 1))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())